@@ -0,0 +1,257 @@
+from datetime import datetime, time, timedelta
+import heapq
+import struct
+import unicodedata
+
+# Nomes dos dias da semana na ordem de date.weekday(), em que 0 é segunda-feira
+DIAS_SEMANA = ("Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado", "Domingo")
+
+def _normalizar_texto(texto):
+    # Remove acentos e diferenças de caixa e de espaçamento
+    sem_acentos = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return " ".join(sem_acentos.lower().replace("-", " ").split())
+
+# Grafias aceitas para cada dia: nome completo, nome sem "feira" e abreviação de três letras
+_NUMEROS_DIAS_SEMANA = {}
+for _numero, _nome in enumerate(DIAS_SEMANA):
+    _normalizado = _normalizar_texto(_nome)
+    _curto = _normalizado.replace(" feira", "")
+    for _grafia in (_normalizado, _curto, _curto[:3]):
+        _NUMEROS_DIAS_SEMANA[_grafia] = _numero
+
+MINUTOS_DIA = 24 * 60
+
+# Rótulos "HH:MM" de todos os minutos do dia, evitando um strftime por slot
+_ROTULOS_MINUTO = tuple(f"{minuto // 60:02d}:{minuto % 60:02d}" for minuto in range(MINUTOS_DIA + 1))
+
+def numero_dia_semana(dia_semana):
+    """
+    Converte um dia da semana para o número usado por date.weekday().
+
+    Aceita o número ou o nome do dia, com ou sem acentos e o sufixo "feira" ("Segunda-feira", "segunda", "sáb").
+    """
+    if isinstance(dia_semana, int):
+        numero = dia_semana
+    elif str(dia_semana).strip().isdigit():
+        numero = int(str(dia_semana).strip())
+    else:
+        numero = _NUMEROS_DIAS_SEMANA.get(_normalizar_texto(str(dia_semana)))
+
+    if numero is None or not 0 <= numero < len(DIAS_SEMANA):
+        raise ValueError(f"Dia da semana inválido: {dia_semana}")
+
+    return numero
+
+def nome_dia_semana(numero):
+    """Retorna o nome do dia da semana a partir do número usado por date.weekday()"""
+    return DIAS_SEMANA[numero]
+
+def indexar_agendamentos(agendamentos):
+    """
+    Ordena os agendamentos por início para a varredura de slots.
+
+    Retorna uma lista de tuplas (inicio, fim, id), que é o formato esperado por gerar_slots_agenda.
+    """
+    return sorted((agendamento.inicio, agendamento.fim, agendamento.id) for agendamento in agendamentos)
+
+def periodos_horario(horario):
+    """Retorna os períodos (manhã e tarde) de atendimento de um horário do médico"""
+    return (
+        (horario.hora_inicio_manha, horario.hora_fim_manha),
+        (horario.hora_inicio_tarde, horario.hora_fim_tarde)
+    )
+
+def gerar_agenda(horarios_medico, agendamentos, duracao_consulta, data_obj):
+    """
+    Gera a agenda de um médico para um dia.
+
+    Combina os horários de atendimento com os agendamentos do dia, indexados uma única vez.
+    """
+    data = data_obj.date() if isinstance(data_obj, datetime) else data_obj
+    indice = indexar_agendamentos(agendamentos)
+
+    agenda = []
+    for horario in horarios_medico:
+        for hora_inicio, hora_fim in periodos_horario(horario):
+            # Ignora períodos não preenchidos
+            if hora_inicio is None or hora_fim is None:
+                continue
+
+            inicio = datetime.combine(data, hora_inicio)
+            fim = datetime.combine(data, hora_fim)
+            agenda += gerar_slots_agenda(inicio, fim, duracao_consulta, indice)
+
+    return agenda
+
+def _varrer_slots(inicio, fim, duracao_consulta, agendamentos):
+    """
+    Percorre os slots de `inicio` a `fim`, gerando o início de cada slot e o id de um agendamento que o ocupa.
+
+    Os `agendamentos` devem estar indexados por indexar_agendamentos. A varredura percorre slots e agendamentos
+    uma única vez, mantendo em um heap os agendamentos que ainda podem se sobrepor ao slot atual. Um slot fica
+    ocupado quando qualquer agendamento se sobrepõe a ele, mesmo que parcialmente; nos livres, o id é None.
+    """
+    passo = timedelta(minutes=duracao_consulta)
+    slot_inicio = inicio
+    slot_fim = inicio + passo
+
+    ativos = []
+    proximo = 0
+    total = len(agendamentos)
+
+    while slot_fim <= fim:
+        # Entram no heap os agendamentos que começam antes do fim do slot
+        while proximo < total and agendamentos[proximo][0] < slot_fim:
+            agendamento_inicio, agendamento_fim, agendamento_id = agendamentos[proximo]
+            heapq.heappush(ativos, (agendamento_fim, agendamento_id))
+            proximo += 1
+
+        # Saem do heap os agendamentos que terminam até o início do slot
+        while ativos and ativos[0][0] <= slot_inicio:
+            heapq.heappop(ativos)
+
+        yield slot_inicio, ativos[0][1] if ativos else None
+
+        slot_inicio = slot_fim
+        slot_fim += passo
+
+def gerar_slots_agenda(inicio, fim, duracao_consulta, agendamentos):
+    """
+    Gera os slots de horários para consultas.
+
+    Os `agendamentos` devem estar indexados por indexar_agendamentos.
+    """
+    if not duracao_consulta or duracao_consulta <= 0:
+        return []
+
+    minuto = inicio.hour * 60 + inicio.minute
+
+    slots = []
+    for _, agendamento_id in _varrer_slots(inicio, fim, duracao_consulta, agendamentos):
+        slots.append({
+            "inicio": _ROTULOS_MINUTO[minuto],
+            "fim": _ROTULOS_MINUTO[minuto + duracao_consulta],
+            "ocupado": agendamento_id is not None,
+            "agendamentoId": agendamento_id
+        })
+        minuto += duracao_consulta
+
+    return slots
+
+class DisponibilidadeDia:
+    """
+    Disponibilidade de um médico em um dia, com um bit por minuto ocupado por algum agendamento.
+
+    Os períodos de atendimento e os agendamentos ficam em minutos desde a meia-noite. O mapa de bits responde se um
+    slot está livre com uma única operação; os agendamentos (inicio, fim, id), compactados em bytes, são consultados
+    apenas para identificar o agendamento de um slot ocupado. As instâncias não são alteradas depois de criadas, o
+    que permite compartilhá-las entre as requisições.
+    """
+
+    __slots__ = ("duracao_consulta", "periodos", "ocupado", "agendamentos")
+
+    def __init__(self, duracao_consulta, periodos, agendamentos=()):
+        self.duracao_consulta = duracao_consulta
+        self.periodos = periodos
+        self.agendamentos = b"".join(_AGENDAMENTO.pack(*agendamento) for agendamento in agendamentos)
+        self.ocupado = 0
+        for inicio, fim, _ in agendamentos:
+            self.ocupado |= _mascara(inicio, fim)
+
+    def com_agendamento(self, inicio, fim, agendamento_id):
+        """Retorna a disponibilidade com mais um agendamento, sem alterar a atual"""
+        if any(agendamento[2] == agendamento_id for agendamento in _AGENDAMENTO.iter_unpack(self.agendamentos)):
+            return self
+        dia = DisponibilidadeDia(self.duracao_consulta, self.periodos)
+        dia.agendamentos = self.agendamentos + _AGENDAMENTO.pack(inicio, fim, agendamento_id)
+        dia.ocupado = self.ocupado | _mascara(inicio, fim)
+        return dia
+
+    def _slots(self, periodos):
+        # Gera o início de cada slot dos períodos e se ele se sobrepõe a algum agendamento
+        duracao = self.duracao_consulta
+        if not duracao or duracao <= 0:
+            return
+        mascara = (1 << duracao) - 1
+        for inicio, fim in periodos:
+            for minuto in range(inicio, fim - duracao + 1, duracao):
+                yield minuto, (self.ocupado >> minuto) & mascara != 0
+
+    def _agendamento_em(self, inicio, fim):
+        # Entre os agendamentos que se sobrepõem ao slot, o que termina primeiro, como na varredura de gerar_agenda
+        return min(
+            (agendamento_fim, agendamento_id)
+            for agendamento_inicio, agendamento_fim, agendamento_id in _AGENDAMENTO.iter_unpack(self.agendamentos)
+            if agendamento_inicio < fim and agendamento_fim > inicio
+        )[1]
+
+    def agenda(self):
+        """Gera a agenda do dia no mesmo formato de gerar_agenda"""
+        duracao = self.duracao_consulta
+        agenda = []
+        for minuto, ocupado in self._slots(self.periodos):
+            agendamento_id = self._agendamento_em(minuto, minuto + duracao) if ocupado else None
+            agenda.append({
+                "inicio": _ROTULOS_MINUTO[minuto],
+                "fim": _ROTULOS_MINUTO[minuto + duracao],
+                "ocupado": ocupado,
+                "agendamentoId": agendamento_id
+            })
+        return agenda
+
+    def horarios_livres(self, medico_id, data, a_partir_de=None):
+        """
+        Gera os slots livres do dia, em ordem de início, como tuplas (inicio, medico_id, fim).
+
+        Os slots são gerados sob demanda, para que a busca possa parar assim que encontrar o suficiente.
+        Slots que começam antes de `a_partir_de` são ignorados.
+        """
+        meia_noite = datetime.combine(data, time.min)
+        passo = timedelta(minutes=self.duracao_consulta or 0)
+
+        # Percorre os períodos do dia em ordem, mesmo que venham de horários cadastrados separadamente
+        fim_ultimo = a_partir_de
+        for minuto, ocupado in self._slots(sorted(self.periodos)):
+            slot_inicio = meia_noite + timedelta(minutes=minuto)
+            # Ignora os slots ocupados, os já passados e os que se sobrepõem a um slot já gerado
+            if not ocupado and (fim_ultimo is None or slot_inicio >= fim_ultimo):
+                fim_ultimo = slot_inicio + passo
+                yield slot_inicio, medico_id, fim_ultimo
+
+# Início e fim em minutos e id de cada agendamento, em 16 bytes
+_AGENDAMENTO = struct.Struct("<iiq")
+
+def _mascara(inicio, fim):
+    # Bits dos minutos de `inicio` a `fim`, limitados ao dia
+    inicio, fim = max(inicio, 0), min(fim, MINUTOS_DIA)
+    return ((1 << (fim - inicio)) - 1) << inicio if fim > inicio else 0
+
+def gerar_agendas_periodo(medicos, horarios, agendamentos, datas):
+    """
+    Gera as agendas de vários médicos em vários dias a partir de dados já carregados.
+
+    `medicos` é uma sequência de pares (id, duracao_consulta). Retorna uma agenda por médico e por dia,
+    na ordem recebida.
+    """
+    # Agrupa horários por médico e agendamentos por médico e dia em uma única passada
+    horarios_por_medico = {}
+    for horario in horarios:
+        horarios_por_medico.setdefault(horario.medico_id, []).append(horario)
+
+    agendamentos_por_dia = {}
+    for agendamento in agendamentos:
+        agendamentos_por_dia.setdefault((agendamento.medico_id, agendamento.inicio.date()), []).append(agendamento)
+
+    agendas = []
+    for medico_id, duracao_consulta in medicos:
+        horarios_medico = horarios_por_medico.get(medico_id, [])
+        for data in datas:
+            horarios_dia = [horario for horario in horarios_medico if horario.dia_semana == data.weekday()]
+            agendamentos_dia = agendamentos_por_dia.get((medico_id, data), [])
+            agendas.append({
+                "medico_id": medico_id,
+                "data": data.isoformat(),
+                "agenda": gerar_agenda(horarios_dia, agendamentos_dia, duracao_consulta, data)
+            })
+
+    return agendas
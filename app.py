@@ -1,17 +1,25 @@
 from flask_openapi3 import Info, OpenAPI, Tag
 from flask_cors import CORS
-from flask import jsonify, request
+from flask import Response, g, request, stream_with_context
 from schema import *
 from model import *
 from constants import ErrorMessages
-from logger import logger
+from agenda import numero_dia_semana
+from consultas import AgendamentoConflitanteError, buscar_agendamento_conflitante, buscar_horarios_livres, carregar_agenda_dia, carregar_agendas_periodo, filtrar_por_nome, listar_agendamentos, listar_pagina, mensagem_unicidade_violada, resolver_id_por_nome, exportar_ndjson
+from cache import agendas, chave_agenda, ids_medicos_por_nome, ids_pacientes_por_nome, invalidar_agendas_medico, versoes_agenda
+from disponibilidade import registrar_agendamento
+from importacao import ler_registros, importar_medicos, importar_pacientes, importar_horarios
+from serializacao import jsonify, linhas_para_dicionarios, serializar
+import config
+import metricas
+from logger import obter_logger
 from sqlalchemy.exc import IntegrityError
 from urllib.parse import unquote
-from sqlalchemy import func
-import calendar
-import locale
+from sqlalchemy.orm import aliased
 from datetime import datetime, timedelta
 
+logger = obter_logger(__name__)
+
 info = Info(
     title="Med Meet API",
     version="1.0.0",
@@ -21,33 +29,77 @@ info = Info(
 app = OpenAPI(__name__, info=info)
 CORS(app)
 
+# Prepara o banco de dados configurado
+inicializar_banco()
+
 medico_tag = Tag(name="Médico", description="Cadastro e visualização de médicos")
 paciente_tag = Tag(name="Paciente", description="Cadastro e visualização de pacientes")
 agendamento_tag = Tag(name="Agendamento", description="Cadastro e visualização de agendamentos")
+dashboard_tag = Tag(name="Painel", description="Contagens do painel")
+monitoramento_tag = Tag(name="Monitoramento", description="Métricas de funcionamento da API")
+
+@app.before_request
+def iniciar_medicao():
+    """Mede a duração e os comandos SQL de cada requisição, agrupados pelo modelo do caminho da rota"""
+    rota = request.url_rule.rule if request.url_rule else "desconhecida"
+    g.medicao = metricas.MedicaoRequisicao(request.method, rota).iniciar()
+
+@app.after_request
+def registrar_medicao(resposta):
+    """Registra as métricas da requisição com o status da resposta"""
+    medicao = g.pop("medicao", None)
+    if medicao is None:
+        return resposta
+
+    # O corpo das exportações é gerado depois do after_request; a medição continua ativa enquanto ele é gerado
+    # e é registrada quando o servidor fecha a resposta
+    if resposta.is_streamed:
+        status = resposta.status_code
+        resposta.call_on_close(lambda: medicao.finalizar(status))
+    else:
+        medicao.finalizar(resposta.status_code)
+    return resposta
+
+@app.teardown_appcontext
+def encerrar_sessao(excecao=None):
+    """Desfaz o que não foi confirmado e devolve a conexão ao pool ao final de cada requisição"""
+    sessao.remove()
 
 @app.get('/medicos', tags=[medico_tag],
          responses={"200": ListagemMedicosSchema, "400": ErrorSchema})
-def listar_medicos():
+def listar_medicos(query: PaginacaoBuscaSchema):
     """
-    Obtenha a lista completa de médicos cadastrados
+    Obtenha a lista paginada de médicos cadastrados
 
-    Retorna informações como nome, especialidade, CRM, duração das consultas e horários de atendimento de todos os médicos cadastrados
+    Retorna informações como nome, especialidade e CRM dos médicos cadastrados, em páginas de até `limit` itens.
+    Use o `proximo_cursor` retornado como `cursor` para obter a página seguinte e `fields` para escolher os campos
     """
-    session = Session()
+    session = sessao()
     try:
-        # Lista todos os médicos cadastrados
-        medicos = session.query(Medico).all()
+        # Lista a página de médicos com as colunas pedidas, a partir do cursor
+        medicos_dto, proximo_cursor = listar_pagina(session, Medico, CAMPOS_MEDICO, query)
 
-        # Converte a lista de médicos para DTO
-        medicos_dto = [retornar_medico(medico) for medico in medicos]
-
-        # Retorna em formato JSON a lista de médicos 
-        return jsonify(medicos_dto), 200
+        # Retorna em formato JSON a página de médicos
+        return jsonify({"medicos": medicos_dto, "proximo_cursor": proximo_cursor}), 200
     except Exception as e:
-        logger.error(f"Erro ao listar médicos: {str(e)}")
+        logger.error("Erro ao listar médicos: %s", e)
         return jsonify({"message": str(e)}), 400
-    finally:
-        session.close()
+
+@app.get('/medicos/exportar', tags=[medico_tag], responses={"400": ErrorSchema})
+def exportar_medicos():
+    """
+    Exporte todos os médicos cadastrados em NDJSON
+
+    Retorna um médico por linha, enviando as linhas à medida que são lidas do banco
+    """
+    session = sessao()
+
+    # Monta a consulta com as colunas exportadas, sem carregar as linhas ainda
+    consulta = session.query(*[coluna.label(nome) for nome, coluna in CAMPOS_MEDICO.items()]) \
+        .select_from(Medico).join(Medico.usuario).order_by(Medico.id)
+
+    # Retorna as linhas em streaming; a sessão é fechada ao final da exportação
+    return Response(stream_with_context(exportar_ndjson(session, consulta)), mimetype='application/x-ndjson')
 
 @app.post('/medicos', tags=[medico_tag],
           responses={"200": VisualizarMedicoSchema, "400": ErrorSchema})
@@ -57,49 +109,59 @@ def cadastrar_medico(form: CadastrarMedicoSchema):
 
     É necessário fornecer nome, email, especialidade, CRM e duração da consulta. O CRM e o email devem ser únicos
     """
-    session = Session()
     try:
-        # Verifica se o email já está em uso
-        if session.query(Usuario).filter_by(email=form.email).first():
-            logger.info(f"O email {form.email} já está em uso.")
-            raise ValueError(ErrorMessages.ERRO_EMAIL_DUPLICADO)
-        
-        # Verifica se o CRM já está em uso
-        if session.query(Medico).filter_by(crm=form.crm).first():
-            logger.info(f"O CRM {form.crm} já está em uso.")
-            raise ValueError(ErrorMessages.ERRO_CRM_DUPLICADO)
+        with unidade_de_trabalho() as session:
+            # Cria o usuário e o médico relacionado; as restrições únicas do banco recusam email e CRM já em uso
+            usuario = Usuario(nome=form.nome, email=form.email)
+            medico = Medico(especialidade=form.especialidade, duracao_consulta=form.duracao_consulta, crm=form.crm, usuario=usuario)
+            session.add(medico)
+            session.flush()
 
-        # Cria um novo usuário
-        usuario = Usuario(nome=form.nome, email=form.email)
-        session.add(usuario)
-        session.flush()
+            # Atualiza a contagem de médicos na mesma transação do cadastro
+            Contador.incrementar(session, "medicos")
 
-        # Cria um novo médico relacionando com o usuário
-        medico = Medico(especialidade=form.especialidade, duracao_consulta=form.duracao_consulta, crm=form.crm, usuario_id=usuario.id)
-        session.add(medico)
-        session.flush()
+            # Monta a resposta antes de confirmar, pois a confirmação expira os dados carregados na sessão
+            resposta = retornar_medico(medico)
 
-        # Confirma as operações no banco
-        session.commit()
+        # Descarta a resolução em cache do nome cadastrado
+        ids_medicos_por_nome.invalidar(form.nome)
 
         # Retorna em formato JSON os dados do médico cadastrado 
-        return jsonify(retornar_medico(medico)), 200
+        return jsonify(resposta), 200
 
     except IntegrityError as e:
-        session.rollback()
-        logger.error(f"Erro ao cadastrar médico: {e}")
-        return jsonify({"message": ErrorMessages.ERRO_DADOS_INVALIDOS}), 400
+        logger.info("Cadastro de médico recusado: %s", e.orig)
+        return jsonify({"message": mensagem_unicidade_violada(e)}), 400
+    except ValueError as e:
+        logger.error("Erro ao cadastrar médico: %s", e)
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        logger.error("Erro inesperado ao cadastrar médico: %s", e)
+        return jsonify({"message": str(e)}), 400
+
+@app.post('/medicos/lote', tags=[medico_tag], responses={"200": ResultadoImportacaoSchema, "400": ErrorSchema})
+def importar_medicos_lote():
+    """
+    Importe médicos em lote
+
+    Envie no corpo uma lista JSON, NDJSON ou CSV com cabeçalho, ou o arquivo no campo `arquivo` de um formulário,
+    com os mesmos campos do cadastro individual. Retorna o total importado e o erro de cada linha recusada
+    """
+    try:
+        # Importa os registros em lotes, à medida que são lidos da requisição
+        resultado = importar_medicos(ler_registros(request))
+        logger.info("Importação de médicos: %s importados, %s recusados.", resultado['importados'], len(resultado['erros']))
+
+        # Retorna em formato JSON o resultado da importação
+        return jsonify(resultado), 200
+
     except ValueError as e:
-        session.rollback()
-        logger.error(f"Erro ao cadastrar médico: {str(e)}")
+        logger.error("Erro ao importar médicos: %s", e)
         return jsonify({"message": str(e)}), 400
     except Exception as e:
-        session.rollback()
-        logger.error(f"Erro inesperado ao cadastrar médico: {str(e)}")
+        logger.error("Erro inesperado ao importar médicos: %s", e)
         return jsonify({"message": str(e)}), 400
-    finally:
-        session.close()
-        print("Sessão fechada.")
+
 
 @app.post('/medicos/horarios', tags=[medico_tag], responses={"200": VisualizarHorarioSchema, "400": ErrorSchema})
 def cadastrar_horario_medico(form: CadastrarHorarioSchema):
@@ -108,165 +170,203 @@ def cadastrar_horario_medico(form: CadastrarHorarioSchema):
 
     Associe os horários de atendimento ao médico com base no ID fornecido
     """
-    session = Session()
     try:
-        # Verifica se o médico existe no banco
-        medico = session.query(Medico).filter_by(id=form.medico_id).first()
-        if not medico:
-            logger.info(f"Médico com o ID {form.medico_id} não existe.")
-            raise ValueError("Médico não encontrado.")
-
-        # Cria um novo horário para o médico com base nos dados do form
-        horario_medico = HorarioMedico(
-            dia_semana=form.dia_semana,
-            hora_inicio_manha=form.hora_inicio_manha,
-            hora_fim_manha=form.hora_fim_manha,
-            hora_inicio_tarde=form.hora_inicio_tarde,
-            hora_fim_tarde=form.hora_fim_tarde,
-            medico_id=medico.id
-        )
-
-        # Adiciona e confirma as operações do horário do médico no banco 
-        session.add(horario_medico)
-        session.commit()
+        with unidade_de_trabalho() as session:
+            # Verifica se o médico existe no banco
+            medico = session.query(Medico).filter_by(id=form.medico_id).first()
+            if not medico:
+                logger.info("Médico com o ID %s não existe.", form.medico_id)
+                raise ValueError("Médico não encontrado.")
+
+            # Cria um novo horário para o médico com base nos dados do form
+            horario_medico = HorarioMedico(
+                dia_semana=numero_dia_semana(form.dia_semana),
+                hora_inicio_manha=form.hora_inicio_manha,
+                hora_fim_manha=form.hora_fim_manha,
+                hora_inicio_tarde=form.hora_inicio_tarde,
+                hora_fim_tarde=form.hora_fim_tarde,
+                medico_id=medico.id
+            )
+
+            # Adiciona o horário do médico, confirmado ao final do bloco
+            session.add(horario_medico)
+
+        # Os novos horários mudam todas as agendas do médico; o horário já está gravado, então uma falha do cache
+        # é apenas registrada, sem transformar o cadastro em erro para o cliente
+        try:
+            invalidar_agendas_medico(form.medico_id)
+        except Exception as e:
+            logger.error("Erro ao invalidar as agendas do médico %s no cache: %s", form.medico_id, e)
 
         # Retorna em formato JSON uma mensagem de sucesso
         return jsonify({"message": "Horário cadastrado com sucesso"}), 200
 
     except ValueError as e:
-        session.rollback()
-        logger.error(f"Erro ao cadastrar horário: {str(e)}")
+        logger.error("Erro ao cadastrar horário: %s", e)
         return jsonify({"message": str(e)}), 400
     except Exception as e:
-        session.rollback()
-        logger.error(f"Erro inesperado ao cadastrar horário: {str(e)}")
+        logger.error("Erro inesperado ao cadastrar horário: %s", e)
         return jsonify({"message": str(e)}), 400
-    finally:
-        session.close()
-        print("Sessão fechada.")
 
 
+@app.post('/medicos/horarios/lote', tags=[medico_tag], responses={"200": ResultadoImportacaoSchema, "400": ErrorSchema})
+def importar_horarios_lote():
+    """
+    Importe horários de atendimento em lote
+
+    Envie no corpo uma lista JSON, NDJSON ou CSV com cabeçalho, ou o arquivo no campo `arquivo` de um formulário,
+    com os mesmos campos do cadastro individual. Retorna o total importado e o erro de cada linha recusada
+    """
+    try:
+        # Importa os registros em lotes, à medida que são lidos da requisição
+        resultado = importar_horarios(ler_registros(request))
+        logger.info("Importação de horários: %s importados, %s recusados.", resultado['importados'], len(resultado['erros']))
+
+        # Retorna em formato JSON o resultado da importação
+        return jsonify(resultado), 200
+
+    except ValueError as e:
+        logger.error("Erro ao importar horários: %s", e)
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        logger.error("Erro inesperado ao importar horários: %s", e)
+        return jsonify({"message": str(e)}), 400
+
+
+def _responder_agenda(corpo):
+    """Monta a resposta da agenda com o ETag do conteúdo, respondendo 304 se o cliente já tiver essa versão"""
+    resposta = Response(corpo, mimetype="application/json")
+    resposta.add_etag()
+    return resposta.make_conditional(request)
+
 @app.get('/medicos/agenda', tags=[medico_tag],
          responses={"200": VisualizarAgendamentoSchema, "400": ErrorSchema})
 def visualizar_agenda_medico(query: MedicoBuscaSchema):
     """
     Visualize a agenda de um médico para um dia específico
 
-    Retorna a agenda completa, mostrando horários disponíveis e ocupados.
+    Retorna a agenda completa, mostrando horários disponíveis e ocupados. Responde 304 quando a agenda não mudou
+    desde a versão informada em `If-None-Match`.
     """
-    try:
-        # Define a formatação de datas em português
-        locale.setlocale(locale.LC_TIME, 'pt_BR.utf8')
-    except locale.Error:
-        # Retorna em formato JSON um erro caso a localidade não seja suportada
-        return jsonify({"error": "Locale pt_BR.utf8 não suportado no sistema."}), 500
-    
     # Descodifica e formata o ID do médico e a data
     medico_id = unquote(unquote(query.medico_id))
     data = unquote(unquote(query.data))
     data_obj = datetime.strptime(data, '%Y-%m-%d')
-    dia_semana = calendar.day_name[data_obj.weekday()]
 
-    session = Session()
+    session = sessao()
 
     try:
-        # Verifica se o médico existe no banco
-        medico = session.query(Medico).filter_by(id=medico_id).one()
-
-        # Busca os horários disponíveis do médico para o dia específico
-        horarios_medico = session.query(HorarioMedico).filter(
-            HorarioMedico.medico_id == medico_id,
-            func.lower(HorarioMedico.dia_semana).like(f"%{dia_semana.lower()}%")
-        ).all()
+        # Devolve a agenda do cache enquanto nenhum agendamento do dia ou horário do médico for alterado
+        versoes = versoes_agenda(int(medico_id), data_obj.date())
+        chave = chave_agenda(int(medico_id), data_obj.date(), versoes)
+        corpo = agendas.obter(chave)
+        if corpo is not None:
+            return _responder_agenda(corpo)
 
-        logger.info(f"horarios_medico: {horarios_medico}")
+        # Gera a agenda completa do médico, combinando horários e agendamentos, com as versões da chave
+        agenda = carregar_agenda_dia(session, int(medico_id), data_obj.date(), versoes)
 
-        # Busca os agendamentos do médico para a data específica
-        agendamentos = session.query(Agendamento).filter(
-            Agendamento.medico_id == medico_id,
-            func.date(Agendamento.inicio) == data_obj.date()
-        ).all()
-
-        # Gera a agenda completa do médico, combinando horários e agendamentos
-        agenda = gerar_agenda(horarios_medico, agendamentos, medico.duracao_consulta, data_obj)
+        # Guarda a agenda serializada para as próximas consultas
+        corpo = serializar(agenda).decode()
+        agendas.guardar(chave, corpo, config.CACHE_AGENDA_TTL)
 
         # Retorna em formato JSON a agenda completa 
-        return jsonify(agenda), 200
+        return _responder_agenda(corpo)
     except Exception as e:
-        logger.error(f"Erro ao visualizar agenda: {str(e)}")
+        logger.error("Erro ao visualizar agenda: %s", e)
         return jsonify({"error": str(e)}), 500
-    finally:
-        session.close()
 
-def gerar_agenda(horarios_medico, agendamentos, duracao_consulta, data_obj):
-    agenda = []
-    for horario in horarios_medico:
-         # Gera slots para o período da manhã
-        inicio = datetime.combine(data_obj.date(), horario.hora_inicio_manha)
-        fim = datetime.combine(data_obj.date(), horario.hora_fim_manha)
-        agenda += gerar_slots_agenda(inicio, fim, duracao_consulta, agendamentos)
+@app.get('/medicos/agendas', tags=[medico_tag],
+         responses={"200": VisualizarAgendamentoSchema, "400": ErrorSchema})
+def visualizar_agendas_periodo(query: AgendaPeriodoBuscaSchema):
+    """
+    Visualize as agendas de vários médicos em um período
 
-        # Gera slots para o período da tarde
-        inicio = datetime.combine(data_obj.date(), horario.hora_inicio_tarde)
-        fim = datetime.combine(data_obj.date(), horario.hora_fim_tarde)
-        agenda += gerar_slots_agenda(inicio, fim, duracao_consulta, agendamentos)
+    Retorna a agenda de cada médico informado em `medico_ids` (separados por vírgula) para cada dia entre
+    `data_inicio` e `data_fim`, com no máximo 31 dias e 100 médicos por busca
+    """
+    session = sessao()
+    try:
+        # Gera as agendas de cada médico em cada dia do período
+        agendas = carregar_agendas_periodo(session, query)
 
-    return agenda
+        # Retorna em formato JSON as agendas do período
+        return jsonify(agendas), 200
+    except ValueError as e:
+        logger.error("Erro ao visualizar agendas: %s", e)
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        logger.error("Erro ao visualizar agendas: %s", e)
+        return jsonify({"error": str(e)}), 500
 
-def gerar_slots_agenda(inicio, fim, duracao_consulta, agendamentos):
+@app.get('/medicos/horarios-livres', tags=[medico_tag],
+         responses={"200": ListagemHorariosLivresSchema, "400": ErrorSchema})
+def buscar_horarios_livres_especialidade(query: HorariosLivresBuscaSchema):
     """
-    Gera os slots de horários para consultas.
+    Busque os primeiros horários livres de uma especialidade
 
-    Cria slots de tempo para consultas médicas e verifica se estão disponíveis ou ocupados.
+    Retorna, em ordem de início, até `limit` horários livres dos médicos da especialidade entre `data_inicio` e
+    `data_fim`, com no máximo 31 dias. Sem datas, busca a partir de agora nos próximos 31 dias
     """
-    slots = []
-    while inicio + timedelta(minutes=duracao_consulta) <= fim:
-        slot_inicio = inicio
-        slot_fim = inicio + timedelta(minutes=duracao_consulta)
-
-        slot = {
-            "inicio": slot_inicio.time().strftime('%H:%M'),
-            "fim": slot_fim.time().strftime('%H:%M'),
-            "ocupado": False,
-            "agendamentoId": None
-        }
+    session = sessao()
+    try:
+        # Busca os horários livres a partir do momento atual, parando ao encontrar o suficiente
+        horarios = buscar_horarios_livres(session, query, datetime.now())
 
-        for agendamento in agendamentos:
-            agendamento_inicio = agendamento.inicio
-            agendamento_fim = agendamento.fim
+        # Retorna em formato JSON os horários livres encontrados
+        return jsonify({"horarios": horarios}), 200
+    except ValueError as e:
+        logger.error("Erro ao buscar horários livres: %s", e)
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        logger.error("Erro inesperado ao buscar horários livres: %s", e)
+        return jsonify({"message": str(e)}), 400
 
-            if agendamento_inicio <= slot_inicio and agendamento_fim >= slot_fim:
-                slot['ocupado'] = True
-                slot['agendamentoId'] = agendamento.id
-                break
+@app.get('/medicos/<int:medico_id>/agendamentos', tags=[medico_tag],
+         responses={"200": ListagemAgendamentosSchema, "400": ErrorSchema, "404": ErrorSchema})
+def listar_agendamentos_medico(path: MedicoIdSchema, query: AgendamentosBuscaSchema):
+    """
+    Liste os agendamentos de um médico
 
-        slots.append(slot)
-        inicio += timedelta(minutes=duracao_consulta)
-    
-    return slots
+    Retorna os agendamentos do médico em ordem de início, filtrados pelos dias entre `data_inicio` e `data_fim` e pelo
+    `status`, em páginas de até `limit` itens. Use o `proximo_cursor` retornado como `cursor` para obter a página seguinte
+    """
+    return _listar_agendamentos(Medico, Agendamento.medico_id, path.medico_id, query, "Médico não encontrado.")
 
 @app.get('/pacientes', tags=[paciente_tag],
          responses={"200": ListagemPacientesSchema, "400": ErrorSchema})
-def listar_pacientes():
+def listar_pacientes(query: PaginacaoBuscaSchema):
     """
-    Obtenha a lista completa de pacientes cadastrados
+    Obtenha a lista paginada de pacientes cadastrados
 
-    Retorna informações como nome, CPF e endereço de todos os pacientes cadastrados
+    Retorna informações como nome, CPF e endereço dos pacientes cadastrados, em páginas de até `limit` itens.
+    Use o `proximo_cursor` retornado como `cursor` para obter a página seguinte e `fields` para escolher os campos
     """
-    session = Session()
+    session = sessao()
     try:
-        # Lista todos os pacientes cadastrados
-        pacientes = session.query(Paciente).all()
+        # Lista a página de pacientes com as colunas pedidas, a partir do cursor
+        pacientes_dto, proximo_cursor = listar_pagina(session, Paciente, CAMPOS_PACIENTE, query)
 
-        # Converte a lista de pacientes para DTO
-        pacientes_dto = [retornar_paciente(paciente) for paciente in pacientes]
-
-        # Retorna em formato JSON a lista de pacientes 
-        return jsonify(pacientes_dto), 200
+        # Retorna em formato JSON a página de pacientes
+        return jsonify({"pacientes": pacientes_dto, "proximo_cursor": proximo_cursor}), 200
     except Exception as e:
         return jsonify({"message": str(e)}), 400
-    finally:
-        session.close()
+
+@app.get('/pacientes/exportar', tags=[paciente_tag], responses={"400": ErrorSchema})
+def exportar_pacientes():
+    """
+    Exporte todos os pacientes cadastrados em NDJSON
+
+    Retorna um paciente por linha, enviando as linhas à medida que são lidas do banco
+    """
+    session = sessao()
+
+    # Monta a consulta com as colunas exportadas, sem carregar as linhas ainda
+    consulta = session.query(*[coluna.label(nome) for nome, coluna in CAMPOS_PACIENTE.items()]) \
+        .select_from(Paciente).join(Paciente.usuario).order_by(Paciente.id)
+
+    # Retorna as linhas em streaming; a sessão é fechada ao final da exportação
+    return Response(stream_with_context(exportar_ndjson(session, consulta)), mimetype='application/x-ndjson')
 
 @app.post('/pacientes', tags=[paciente_tag],
           responses={"200": VisualizarPacienteSchema, "400": ErrorSchema})
@@ -276,49 +376,59 @@ def cadastrar_paciente(form: CadastrarPacienteSchema):
 
     É necessário fornecer nome, email, CPF e endereço. O CPF e o email devem ser únicos
     """
-    session = Session()
     try:
-        # Verifica se o email já está em uso
-        if session.query(Usuario).filter_by(email=form.email).first():
-            logger.info(f"O email {form.email} já está em uso.")
-            raise ValueError(ErrorMessages.ERRO_EMAIL_DUPLICADO)
-        
-        # Verifica se o CPF já está em uso
-        if session.query(Paciente).filter_by(cpf=form.cpf).first():
-            logger.info(f"O CPF {form.cpf} já está em uso.")
-            raise ValueError(ErrorMessages.ERRO_CPF_DUPLICADO)
+        with unidade_de_trabalho() as session:
+            # Cria o usuário e o paciente relacionado; as restrições únicas do banco recusam email e CPF já em uso
+            usuario = Usuario(nome=form.nome, email=form.email)
+            paciente = Paciente(cpf=form.cpf, endereco=form.endereco, usuario=usuario)
+            session.add(paciente)
+            session.flush()
 
-        # Cria um novo usuário
-        usuario = Usuario(nome=form.nome, email=form.email)
-        session.add(usuario)
-        session.flush()
-        print("Usuário criado com sucesso:", usuario)
+            # Atualiza a contagem de pacientes na mesma transação do cadastro
+            Contador.incrementar(session, "pacientes")
 
-        # Cria um novo paciente relacionando com o usuário
-        paciente = Paciente(cpf=form.cpf, endereco=form.endereco, usuario_id=usuario.id)
-        session.add(paciente)
+            # Monta a resposta antes de confirmar, pois a confirmação expira os dados carregados na sessão
+            resposta = retornar_paciente(paciente)
 
-        # Confirma as operações no banco
-        session.commit()
+        # Descarta a resolução em cache do nome cadastrado
+        ids_pacientes_por_nome.invalidar(form.nome)
 
         # Retorna em formato JSON os dados do paciente cadastrado 
-        return retornar_paciente(paciente), 200
+        return jsonify(resposta), 200
     
     except IntegrityError as e:
-        session.rollback()
-        logger.error(f"Erro ao cadastrar paciente: {ErrorMessages.ERRO_DADOS_INVALIDOS}")
-        return jsonify({"message": ErrorMessages.ERRO_DADOS_INVALIDOS}), 400
+        logger.info("Cadastro de paciente recusado: %s", e.orig)
+        return jsonify({"message": mensagem_unicidade_violada(e)}), 400
+    except ValueError as e:
+        logger.error("Erro ao cadastrar paciente: %s", e)
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        logger.error("Erro inesperado ao cadastrar paciente: %s", e)
+        return jsonify({"message": str(e)}), 400
+
+
+@app.post('/pacientes/lote', tags=[paciente_tag], responses={"200": ResultadoImportacaoSchema, "400": ErrorSchema})
+def importar_pacientes_lote():
+    """
+    Importe pacientes em lote
+
+    Envie no corpo uma lista JSON, NDJSON ou CSV com cabeçalho, ou o arquivo no campo `arquivo` de um formulário,
+    com os mesmos campos do cadastro individual. Retorna o total importado e o erro de cada linha recusada
+    """
+    try:
+        # Importa os registros em lotes, à medida que são lidos da requisição
+        resultado = importar_pacientes(ler_registros(request))
+        logger.info("Importação de pacientes: %s importados, %s recusados.", resultado['importados'], len(resultado['erros']))
+
+        # Retorna em formato JSON o resultado da importação
+        return jsonify(resultado), 200
+
     except ValueError as e:
-        session.rollback()
-        logger.error(f"Erro ao cadastrar paciente: {str(e)}")
+        logger.error("Erro ao importar pacientes: %s", e)
         return jsonify({"message": str(e)}), 400
     except Exception as e:
-        session.rollback()
-        logger.error(f"Erro inesperado ao cadastrar paciente: {str(e)}")
+        logger.error("Erro inesperado ao importar pacientes: %s", e)
         return jsonify({"message": str(e)}), 400
-    finally:
-        session.close()
-        print("Sessão fechada.")
 
 
 @app.get('/pacientes/buscar', tags=[paciente_tag],
@@ -327,7 +437,8 @@ def buscar_paciente_por_nome():
     """
     Busca paciente por nome.
     
-    Permite buscar pacientes cadastrados no sistema com através do nome
+    Permite buscar pacientes cadastrados no sistema com através do nome. Retorna até 10 pacientes, dos nomes mais
+    curtos para os mais longos; no SQLite, apenas os 500 nomes mais curtos que correspondem à busca são considerados
     """
 
     # Extrai o nome do paciente a partir do parâmetros da requisição
@@ -337,81 +448,160 @@ def buscar_paciente_por_nome():
     if len(nome) < 1:
         return jsonify([]), 200 
 
-    session = Session()
+    session = sessao()
 
     try:
-        # Busca pacientes por nome
-        pacientes = session.query(Paciente).join(Usuario).filter(
-            Usuario.nome.ilike(f"%{nome}%")
-        ).limit(10).all()
+        # Busca pacientes por nome no índice de busca, selecionando apenas as colunas da resposta
+        consulta = session.query(*[coluna.label(nome_campo) for nome_campo, coluna in CAMPOS_PACIENTE.items()]) \
+            .select_from(Paciente).join(Paciente.usuario)
+        pacientes = filtrar_por_nome(session, consulta, Paciente.usuario_id, nome).limit(10).all()
         
         # Verifica se algum paciente foi encontrado
         if not pacientes:
-            logger.info(f"Nenhum paciente encontrado com o nome: {nome}")
+            logger.info("Nenhum paciente encontrado com o nome: %s", nome)
         
-        # Converte os resultados em uma lista de dicionários para retorno
-        resultados = [retornar_paciente(paciente) for paciente in pacientes]
+        # Converte as linhas em uma lista de dicionários para retorno
+        resultados = linhas_para_dicionarios(pacientes)
 
         # Retorna em formato JSON a lista de pacientes encontrados 
         return jsonify(resultados), 200
     
     except Exception as e:
-        logger.error(f"Erro ao buscar pacientes: {str(e)}")
+        logger.error("Erro ao buscar pacientes: %s", e)
+        return jsonify({"message": str(e)}), 400
+
+@app.get('/pacientes/<int:paciente_id>/agendamentos', tags=[paciente_tag],
+         responses={"200": ListagemAgendamentosSchema, "400": ErrorSchema, "404": ErrorSchema})
+def listar_agendamentos_paciente(path: PacienteIdSchema, query: AgendamentosBuscaSchema):
+    """
+    Liste os agendamentos de um paciente
+
+    Retorna os agendamentos do paciente em ordem de início, filtrados pelos dias entre `data_inicio` e `data_fim` e
+    pelo `status`, em páginas de até `limit` itens. Use o `proximo_cursor` retornado como `cursor` para obter a página seguinte
+    """
+    return _listar_agendamentos(Paciente, Agendamento.paciente_id, path.paciente_id, query, "Paciente não encontrado.")
+
+def _listar_agendamentos(modelo, coluna_dono, dono_id, query, mensagem_nao_encontrado):
+    # Lista os agendamentos de um paciente ou de um médico
+    session = sessao()
+    try:
+        # Lista a página de agendamentos a partir do cursor, com os nomes do paciente e do médico
+        agendamentos, proximo_cursor = listar_agendamentos(session, coluna_dono, dono_id, query)
+
+        # Sem agendamentos, verifica se o paciente ou o médico existe
+        if not agendamentos and session.query(modelo.id).filter_by(id=dono_id).first() is None:
+            return jsonify({"message": mensagem_nao_encontrado}), 404
+
+        # Retorna em formato JSON a página de agendamentos
+        return jsonify({
+            "agendamentos": [retornar_agendamento(agendamento) for agendamento in agendamentos],
+            "proximo_cursor": proximo_cursor
+        }), 200
+    except ValueError as e:
+        logger.error("Erro ao listar agendamentos: %s", e)
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        logger.error("Erro inesperado ao listar agendamentos: %s", e)
         return jsonify({"message": str(e)}), 400
-    finally:
-        session.close()
 
 @app.post('/agendamentos', tags=[agendamento_tag],
-          responses={"200": VisualizarAgendamentoSchema, "400": ErrorSchema})
+          responses={"200": VisualizarAgendamentoSchema, "400": ErrorSchema, "409": ErrorSchema})
 def cadastrar_agendamento(form: CadastrarAgendamentoSchema):
     """
     Cadastre um novo agendamento
     
-    Forneça o nome do paciente, nome do médico, data e horário do agendamento
+    Forneça o paciente e o médico pelo id ou pelo nome, além da data e do horário do agendamento
     """
-    session = Session()
     try:
-        # Verifica se o paciente existe
-        paciente = session.query(Paciente).join(Usuario).filter(Usuario.nome == form.paciente_nome).first()
-        if not paciente:
-            logger.info(f"Paciente com o nome {form.paciente_nome} não existe.")
-            raise ValueError(f"Paciente '{form.paciente_nome}' não encontrado.")
-
-        # Verifica se o médico existe
-        medico = session.query(Medico).join(Usuario).filter(Usuario.nome == form.medico_nome).first()
-        if not medico:
-            logger.info(f"Médico com o nome {form.medico_nome} não existe.")
-            raise ValueError(f"Médico '{form.medico_nome}' não encontrado.")
-
-        # Converte data e horário em um objeto datetime
-        data_hora = datetime.strptime(f"{form.data} {form.horario}", "%Y-%m-%d %H:%M")
-
-        # Cria um novo agendamento relacionando médico e paciente
-        agendamento = Agendamento(
-            inicio=data_hora,
-            fim=data_hora + timedelta(minutes=medico.duracao_consulta),
-            medico_id=medico.id,
-            paciente_id=paciente.id
-        )
-
-        # Adiciona e confirma as operações do agendamento no banco 
-        session.add(agendamento)
-        session.commit()
+        with unidade_de_trabalho() as session:
+            if form.paciente_id is None and not form.paciente_nome:
+                raise ValueError("Informe o id ou o nome do paciente.")
+            if form.medico_id is None and not form.medico_nome:
+                raise ValueError("Informe o id ou o nome do médico.")
+
+            # Resolve os nomes informados para ids, usando o cache antes de consultar o banco
+            paciente_id = form.paciente_id
+            if paciente_id is None:
+                paciente_id = resolver_id_por_nome(session, Paciente, form.paciente_nome, ids_pacientes_por_nome)
+            medico_id = form.medico_id
+            if medico_id is None:
+                medico_id = resolver_id_por_nome(session, Medico, form.medico_nome, ids_medicos_por_nome)
+
+            # Verifica se o paciente existe
+            paciente = session.get(Paciente, paciente_id) if paciente_id is not None else None
+            if not paciente:
+                identificacao = paciente_id if paciente_id is not None else form.paciente_nome
+                logger.info("Paciente %s não existe.", identificacao)
+                raise ValueError(f"Paciente '{identificacao}' não encontrado.")
+
+            # Verifica se o médico existe
+            medico = session.get(Medico, medico_id) if medico_id is not None else None
+            if not medico:
+                identificacao = medico_id if medico_id is not None else form.medico_nome
+                logger.info("Médico %s não existe.", identificacao)
+                raise ValueError(f"Médico '{identificacao}' não encontrado.")
+
+            # Converte data e horário em um objeto datetime
+            data_hora = datetime.strptime(f"{form.data} {form.horario}", "%Y-%m-%d %H:%M")
+
+            # Cria um novo agendamento relacionando médico e paciente
+            agendamento = Agendamento(
+                inicio=data_hora,
+                fim=data_hora + timedelta(minutes=medico.duracao_consulta),
+                medico_id=medico.id,
+                paciente_id=paciente.id
+            )
+
+            # Insere o agendamento; a restrição única do banco recusa o mesmo médico no mesmo início
+            session.add(agendamento)
+            session.flush()
+
+            # No PostgreSQL a restrição de exclusão recusa qualquer sobreposição. Nos demais bancos a sobreposição
+            # parcial é verificada depois da inserção, enquanto a transação ainda detém o bloqueio de escrita
+            if session.get_bind().dialect.name != 'postgresql' and buscar_agendamento_conflitante(session, agendamento):
+                raise AgendamentoConflitanteError(f"médico {medico.id} às {data_hora}")
+
+            # Atualiza a contagem de agendamentos do dia na mesma transação do agendamento
+            Contador.incrementar(session, Contador.chave_agendamentos(data_hora.date()))
+            agendado = (agendamento.medico_id, agendamento.inicio, agendamento.fim, agendamento.id)
+
+        # O novo agendamento muda a agenda do médico no dia e ocupa o horário na disponibilidade em memória; o
+        # agendamento já está confirmado, então uma falha do cache é apenas registrada, sem que o cliente tente de novo
+        try:
+            registrar_agendamento(*agendado)
+        except Exception as e:
+            logger.error("Erro ao registrar o agendamento %s no cache: %s", agendado[3], e)
 
         # Retorna em formato JSON uma mensagem de sucesso
         return jsonify({"message": "Agendamento realizado com sucesso."}), 200
 
+    except (IntegrityError, AgendamentoConflitanteError) as e:
+        logger.info("Agendamento recusado por conflito de horário: %s", getattr(e, 'orig', e))
+        return jsonify({"message": ErrorMessages.ERRO_HORARIO_OCUPADO}), 409
     except ValueError as ve:
-        session.rollback()
-        print(f"Erro ao cadastrar agendamento: {str(ve)}")
+        logger.error("Erro ao cadastrar agendamento: %s", ve)
         return jsonify({"message": str(ve)}), 400
     except Exception as e:
-        session.rollback()
+        logger.error("Erro inesperado ao cadastrar agendamento: %s", e)
         return jsonify({"message": f"Erro ao criar agendamento: {str(e)}"}), 400
-    finally:
-        session.close()
 
 
+@app.get('/agendamentos/exportar', tags=[agendamento_tag], responses={"400": ErrorSchema})
+def exportar_agendamentos():
+    """
+    Exporte todos os agendamentos em NDJSON
+
+    Retorna um agendamento por linha, enviando as linhas à medida que são lidas do banco
+    """
+    session = sessao()
+
+    # Monta a consulta com as colunas exportadas, sem carregar as linhas ainda
+    consulta = session.query(*[coluna.label(nome) for nome, coluna in CAMPOS_AGENDAMENTO.items()]) \
+        .order_by(Agendamento.id)
+
+    # Retorna as linhas em streaming; a sessão é fechada ao final da exportação
+    return Response(stream_with_context(exportar_ndjson(session, consulta)), mimetype='application/x-ndjson')
+
 @app.post('/agendamentos/ver', tags=[agendamento_tag], responses={"200": VisualizarAgendamentoSchema, "400": ErrorSchema})
 def ver_agendamento():
     """
@@ -426,25 +616,29 @@ def ver_agendamento():
     if not agendamento_id:
         return jsonify({"message": "ID do agendamento não fornecido"}), 400
 
-    session = Session()
+    session = sessao()
     try:
-        # Busca o agendamento no banco de dados pelo ID
-        agendamento = session.query(Agendamento).filter_by(id=agendamento_id).first()
+        # Busca o agendamento pelo ID com os nomes do paciente e do médico em uma única consulta
+        usuario_paciente = aliased(Usuario)
+        usuario_medico = aliased(Usuario)
+        agendamento = session.query(
+            usuario_paciente.nome.label("paciente_nome"),
+            usuario_medico.nome.label("medico_nome"),
+            Agendamento.inicio,
+            Agendamento.fim
+        ).select_from(Agendamento) \
+            .join(Paciente, Agendamento.paciente_id == Paciente.id) \
+            .join(usuario_paciente, Paciente.usuario_id == usuario_paciente.id) \
+            .join(Medico, Agendamento.medico_id == Medico.id) \
+            .join(usuario_medico, Medico.usuario_id == usuario_medico.id) \
+            .filter(Agendamento.id == agendamento_id).first()
         if not agendamento:
             return jsonify({"message": "Agendamento não encontrado"}), 404
 
-        # Retorna em formato JSON os detalhes do agendamento 
-        return jsonify({
-            "paciente_nome": agendamento.paciente.usuario.nome,
-            "medico_nome": agendamento.medico.usuario.nome,
-            "inicio": agendamento.inicio.isoformat(),
-            "fim": agendamento.fim.isoformat(),
-        }), 200
+        # Retorna em formato JSON os detalhes do agendamento, com as datas no formato ISO 8601
+        return jsonify(agendamento._asdict()), 200
     except Exception as e:
-        session.rollback()
         return jsonify({"message": f"Erro ao obter agendamento: {str(e)}"}), 500
-    finally:
-        session.close()
 
 @app.get('/medicos/contagem', tags=[medico_tag], responses={"200": VisualizarContagemMedicosSchema, "400": ErrorSchema})
 def contagem_medicos():
@@ -453,15 +647,13 @@ def contagem_medicos():
 
     Retorna a contagem total de médicos registrados no sistema
     """
-    session = Session()
-    try:
-        # Consulta o total de médicos cadastrados no banco
-        total_medicos = session.query(Medico).count()
+    session = sessao()
 
-        # Retorna em formato JSON a contagem de médicos 
-        return jsonify({"contagem": total_medicos})
-    finally:
-        session.close()
+    # Lê o total de médicos mantido a cada cadastro
+    total_medicos = Contador.ler(session, "medicos")["medicos"]
+
+    # Retorna em formato JSON a contagem de médicos 
+    return jsonify({"contagem": total_medicos})
 
 @app.get('/pacientes/contagem', tags=[paciente_tag], responses={"200": VisualizarContagemPacientesSchema, "400": ErrorSchema})
 def contagem_pacientes():
@@ -470,15 +662,13 @@ def contagem_pacientes():
 
     Retorna a contagem total de pacientes registrados no sistema
     """
-    session = Session()
-    try:
-        # Consulta o total de pacientes cadastrados no banco
-        total_pacientes = session.query(Paciente).count()
+    session = sessao()
 
-        # Retorna em formato JSON a contagem de pacientes 
-        return jsonify({"contagem": total_pacientes})
-    finally:
-        session.close()
+    # Lê o total de pacientes mantido a cada cadastro
+    total_pacientes = Contador.ler(session, "pacientes")["pacientes"]
+
+    # Retorna em formato JSON a contagem de pacientes 
+    return jsonify({"contagem": total_pacientes})
 
 @app.get('/agendamentos/hoje/contagem', tags=[agendamento_tag], responses={"200": VisualizarContagemAgendamentosSchema, "400": ErrorSchema})
 def contagem_agendamentos_hoje():
@@ -487,15 +677,69 @@ def contagem_agendamentos_hoje():
 
     Retorna a contagem de agendamentos realizados para o dia atual
     """
-    session = Session()
-    try:
-        # Pega a data atual
-        today = datetime.today().date()
+    session = sessao()
+
+    # Pega a data atual
+    today = datetime.today().date()
 
-        # Consulta o total de agendamentos para a data de hoje no banco de dados
-        total_agendamentos = session.query(Agendamento).filter(func.date(Agendamento.inicio) == today).count()
+    # Lê o total de agendamentos de hoje mantido a cada agendamento
+    chave = Contador.chave_agendamentos(today)
+    total_agendamentos = Contador.ler(session, chave)[chave]
 
-        # Retorna em formato JSON a contagem de agendamentos
-        return jsonify({"contagem": total_agendamentos})
-    finally:
-        session.close()
+    # Retorna em formato JSON a contagem de agendamentos
+    return jsonify({"contagem": total_agendamentos})
+
+@app.get('/dashboard', tags=[dashboard_tag], responses={"200": VisualizarDashboardSchema, "400": ErrorSchema})
+def visualizar_dashboard():
+    """
+    Obtenha as contagens do painel
+
+    Retorna o total de médicos, o total de pacientes e o total de agendamentos para hoje em uma única consulta
+    """
+    session = sessao()
+
+    # Lê as três contagens mantidas a cada cadastro
+    chave_hoje = Contador.chave_agendamentos(datetime.today().date())
+    contagens = Contador.ler(session, "medicos", "pacientes", chave_hoje)
+
+    # Retorna em formato JSON as contagens do painel
+    return jsonify({
+        "medicos": contagens["medicos"],
+        "pacientes": contagens["pacientes"],
+        "agendamentos_hoje": contagens[chave_hoje]
+    })
+
+@app.get('/metricas/pool', tags=[monitoramento_tag])
+def visualizar_metricas_pool():
+    """
+    Obtenha as métricas do pool de conexões do banco
+
+    Retorna o estado atual do pool e a distribuição do tempo de espera por uma conexão desde o início do processo.
+    Com vários processos, cada um mantém seu próprio pool e suas próprias métricas
+    """
+    # Retorna em formato JSON o estado do pool e as esperas por conexão
+    return jsonify({**_estado_pool(), "espera_checkout": metricas.espera_checkout.resumo()})
+
+@app.get('/metrics', tags=[monitoramento_tag])
+def exportar_metricas():
+    """
+    Obtenha as métricas da API no formato do Prometheus
+
+    Retorna, por rota, as requisições por status e os histogramas de duração, de comandos SQL e de tempo em SQL por
+    requisição, além da duração dos comandos SQL, das consultas lentas e do estado do pool de conexões. Com vários
+    processos, cada um mantém suas próprias métricas
+    """
+    return Response(metricas.exportar_prometheus(_estado_pool()), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _estado_pool():
+    # Estado atual do pool de conexões; pools sem fila, como o do SQLite em memória, não têm contagens
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    return {
+        "tamanho": pool.size(),
+        "em_uso": pool.checkedout(),
+        "disponiveis": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": config.DB_MAX_OVERFLOW
+    }
@@ -0,0 +1,168 @@
+"""
+Ponto de entrada ASGI da API.
+
+As leituras que o front-end dispara em paralelo (agenda do dia, agendas do período e listagens de médicos e
+pacientes) são atendidas por rotas assíncronas com a engine assíncrona do SQLAlchemy, sem ocupar um worker por
+consulta. As demais rotas, incluindo a documentação OpenAPI, são repassadas à aplicação Flask.
+
+Requer os pacotes starlette, uvicorn, a2wsgi e aiosqlite (ou asyncpg no PostgreSQL).
+
+Uso: uvicorn asgi:app --workers 2
+"""
+from a2wsgi import WSGIMiddleware
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from urllib.parse import unquote
+from werkzeug.http import generate_etag, parse_etags
+
+import config
+import metricas
+from app import app as app_flask
+from cache import CacheLRU, agendas, chave_agenda, versoes_agenda
+from consultas import carregar_agenda_dia, carregar_agendas_periodo, listar_pagina
+from logger import obter_logger
+from model import Medico, Paciente, criar_engine_assincrona
+from schema import AgendaPeriodoBuscaSchema, MedicoBuscaSchema, PaginacaoBuscaSchema, CAMPOS_MEDICO, CAMPOS_PACIENTE
+from serializacao import serializar
+
+logger = obter_logger(__name__)
+
+engine_assincrona = criar_engine_assincrona()
+
+SessaoAssincrona = sessionmaker(engine_assincrona, class_=AsyncSession, expire_on_commit=False)
+
+def _responder_json(dados, status=200):
+    return Response(serializar(dados), status_code=status, media_type="application/json")
+
+def _erro_validacao(erro):
+    # Mesma resposta do flask-openapi3 para parâmetros inválidos
+    return Response(erro.json(), status_code=422, media_type="application/json")
+
+async def _no_cache(operacao, *args):
+    # O cache compartilhado faz E/S de rede, que não pode bloquear o laço de eventos
+    if isinstance(agendas, CacheLRU):
+        return operacao(*args)
+    return await run_in_threadpool(operacao, *args)
+
+def _responder_agenda(request, corpo):
+    """Monta a resposta da agenda com o ETag do conteúdo, respondendo 304 se o cliente já tiver essa versão"""
+    etag = generate_etag(corpo.encode())
+    cabecalhos = {"ETag": f'"{etag}"'}
+    if parse_etags(request.headers.get("if-none-match")).contains_weak(etag):
+        return Response(status_code=304, headers=cabecalhos)
+    return Response(corpo, media_type="application/json", headers=cabecalhos)
+
+async def visualizar_agenda_medico(request):
+    """Visualiza a agenda de um médico para um dia específico, como GET /medicos/agenda da aplicação Flask"""
+    try:
+        query = MedicoBuscaSchema(**request.query_params)
+    except ValidationError as e:
+        return _erro_validacao(e)
+
+    try:
+        # Descodifica e formata o ID do médico e a data
+        medico_id = int(unquote(unquote(query.medico_id)))
+        data = datetime.strptime(unquote(unquote(query.data)), '%Y-%m-%d').date()
+
+        # Devolve a agenda do cache enquanto nenhum agendamento do dia ou horário do médico for alterado
+        versoes = await _no_cache(versoes_agenda, medico_id, data)
+        chave = chave_agenda(medico_id, data, versoes)
+        corpo = await _no_cache(agendas.obter, chave)
+        if corpo is not None:
+            return _responder_agenda(request, corpo)
+
+        # Gera a agenda com as mesmas consultas da rota síncrona, executadas pela sessão assíncrona. As versões
+        # já lidas são repassadas, pois o run_sync roda no laço de eventos e não pode consultar o cache compartilhado
+        async with SessaoAssincrona() as session:
+            agenda = await session.run_sync(carregar_agenda_dia, medico_id, data, versoes)
+
+        # Guarda a agenda serializada para as próximas consultas
+        corpo = serializar(agenda).decode()
+        await _no_cache(agendas.guardar, chave, corpo, config.CACHE_AGENDA_TTL)
+
+        return _responder_agenda(request, corpo)
+    except Exception as e:
+        logger.error("Erro ao visualizar agenda: %s", e)
+        return _responder_json({"error": str(e)}, 500)
+
+async def visualizar_agendas_periodo(request):
+    """Visualiza as agendas de vários médicos em um período, como GET /medicos/agendas da aplicação Flask"""
+    try:
+        query = AgendaPeriodoBuscaSchema(**request.query_params)
+    except ValidationError as e:
+        return _erro_validacao(e)
+
+    try:
+        async with SessaoAssincrona() as session:
+            agendas_periodo = await session.run_sync(carregar_agendas_periodo, query)
+        return _responder_json(agendas_periodo)
+    except ValueError as e:
+        logger.error("Erro ao visualizar agendas: %s", e)
+        return _responder_json({"message": str(e)}, 400)
+    except Exception as e:
+        logger.error("Erro ao visualizar agendas: %s", e)
+        return _responder_json({"error": str(e)}, 500)
+
+async def _listar(request, modelo, campos_disponiveis, nome_lista):
+    # Lista uma página de médicos ou pacientes, como as listagens da aplicação Flask
+    try:
+        query = PaginacaoBuscaSchema(**request.query_params)
+    except ValidationError as e:
+        return _erro_validacao(e)
+
+    try:
+        async with SessaoAssincrona() as session:
+            registros, proximo_cursor = await session.run_sync(listar_pagina, modelo, campos_disponiveis, query)
+        return _responder_json({nome_lista: registros, "proximo_cursor": proximo_cursor})
+    except Exception as e:
+        logger.error("Erro ao listar %s: %s", nome_lista, e)
+        return _responder_json({"message": str(e)}, 400)
+
+async def listar_medicos(request):
+    """Lista os médicos cadastrados em páginas, como GET /medicos da aplicação Flask"""
+    return await _listar(request, Medico, CAMPOS_MEDICO, "medicos")
+
+async def listar_pacientes(request):
+    """Lista os pacientes cadastrados em páginas, como GET /pacientes da aplicação Flask"""
+    return await _listar(request, Paciente, CAMPOS_PACIENTE, "pacientes")
+
+def _medido(rota, endpoint):
+    # Mede as rotas assíncronas como a aplicação Flask mede as suas, com o mesmo modelo de caminho
+    async def medir(request):
+        medicao = metricas.MedicaoRequisicao(request.method, rota).iniciar()
+        status = 500
+        try:
+            resposta = await endpoint(request)
+            status = resposta.status_code
+            return resposta
+        finally:
+            medicao.finalizar(status)
+    return medir
+
+@asynccontextmanager
+async def ciclo_de_vida(aplicacao):
+    # Fecha as conexões assíncronas ao encerrar o servidor
+    yield
+    await engine_assincrona.dispose()
+
+# As rotas assíncronas atendem apenas GET; os demais métodos dos mesmos caminhos seguem para a aplicação Flask
+app = Starlette(
+    routes=[
+        Route('/medicos/agenda', _medido('/medicos/agenda', visualizar_agenda_medico), methods=["GET"]),
+        Route('/medicos/agendas', _medido('/medicos/agendas', visualizar_agendas_periodo), methods=["GET"]),
+        Route('/medicos', _medido('/medicos', listar_medicos), methods=["GET"]),
+        Route('/pacientes', _medido('/pacientes', listar_pacientes), methods=["GET"]),
+        Mount('/', WSGIMiddleware(app_flask)),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=ciclo_de_vida,
+)
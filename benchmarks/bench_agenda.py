@@ -0,0 +1,94 @@
+"""
+Compara o motor de slots de agenda.py com a implementação anterior de gerar_agenda.
+
+Uso: python benchmarks/bench_agenda.py --agendamentos 10000 --duracao 1
+"""
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agenda import gerar_agenda
+
+
+def gerar_agenda_anterior(horarios_medico, agendamentos, duracao_consulta, data_obj):
+    # Implementação anterior, mantida aqui apenas como referência de desempenho
+    agenda = []
+    for horario in horarios_medico:
+        inicio = datetime.combine(data_obj.date(), horario.hora_inicio_manha)
+        fim = datetime.combine(data_obj.date(), horario.hora_fim_manha)
+        agenda += gerar_slots_agenda_anterior(inicio, fim, duracao_consulta, agendamentos)
+
+        inicio = datetime.combine(data_obj.date(), horario.hora_inicio_tarde)
+        fim = datetime.combine(data_obj.date(), horario.hora_fim_tarde)
+        agenda += gerar_slots_agenda_anterior(inicio, fim, duracao_consulta, agendamentos)
+
+    return agenda
+
+def gerar_slots_agenda_anterior(inicio, fim, duracao_consulta, agendamentos):
+    slots = []
+    while inicio + timedelta(minutes=duracao_consulta) <= fim:
+        slot_inicio = inicio
+        slot_fim = inicio + timedelta(minutes=duracao_consulta)
+
+        slot = {
+            "inicio": slot_inicio.time().strftime('%H:%M'),
+            "fim": slot_fim.time().strftime('%H:%M'),
+            "ocupado": False,
+            "agendamentoId": None
+        }
+
+        for agendamento in agendamentos:
+            if agendamento.inicio <= slot_inicio and agendamento.fim >= slot_fim:
+                slot['ocupado'] = True
+                slot['agendamentoId'] = agendamento.id
+                break
+
+        slots.append(slot)
+        inicio += timedelta(minutes=duracao_consulta)
+
+    return slots
+
+def gerar_cenario(total_agendamentos, duracao, semente):
+    """Gera um dia com expediente integral e agendamentos alinhados aos slots"""
+    aleatorio = random.Random(semente)
+    data_obj = datetime(2024, 8, 26)
+    horario = SimpleNamespace(
+        hora_inicio_manha=time(0, 0), hora_fim_manha=time(12, 0),
+        hora_inicio_tarde=time(12, 0), hora_fim_tarde=time(23, 59)
+    )
+
+    total_slots = (24 * 60 - 1) // duracao
+    agendamentos = []
+    for id_agendamento in range(1, total_agendamentos + 1):
+        inicio = data_obj + timedelta(minutes=aleatorio.randrange(total_slots) * duracao)
+        agendamentos.append(SimpleNamespace(id=id_agendamento, inicio=inicio, fim=inicio + timedelta(minutes=duracao)))
+
+    return [horario], agendamentos, data_obj
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agendamentos", type=int, default=10000)
+    parser.add_argument("--duracao", type=int, default=1, help="duração da consulta em minutos")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    horarios, agendamentos, data_obj = gerar_cenario(args.agendamentos, args.duracao, args.semente)
+
+    # Com agendamentos alinhados, as duas implementações marcam os mesmos slots como ocupados
+    novo = gerar_agenda(horarios, agendamentos, args.duracao, data_obj)
+    anterior = gerar_agenda_anterior(horarios, agendamentos, args.duracao, data_obj)
+    assert [(s["inicio"], s["ocupado"]) for s in novo] == [(s["inicio"], s["ocupado"]) for s in anterior]
+
+    for nome, funcao in (("anterior", gerar_agenda_anterior), ("agenda.py", gerar_agenda)):
+        tempos = timeit.repeat(lambda: funcao(horarios, agendamentos, args.duracao, data_obj), number=1, repeat=args.repeticoes)
+        print(f"{nome:>10}: {min(tempos) * 1000:10.2f} ms ({len(novo)} slots, {len(agendamentos)} agendamentos)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Mede a latência da busca de pacientes por nome usada em /pacientes/buscar.
+
+Cria um banco SQLite temporário com o índice de busca textual, popula com pacientes sintéticos e
+reporta p50 e p99 de cada termo buscado.
+
+Uso: python benchmarks/bench_busca_nome.py --pacientes 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import contains_eager, sessionmaker
+
+from model import Base, Paciente
+from model.migracoes import aplicar_migracoes
+from consultas import filtrar_por_nome
+
+NOMES = ["Maria", "José", "Ana", "João", "Antônio", "Francisco", "Carlos", "Paulo", "Pedro", "Lucas",
+         "Luiz", "Marcos", "Gabriel", "Rafael", "Francisca", "Antônia", "Adriana", "Juliana", "Márcia", "Fernanda"]
+SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+              "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes", "Soares", "Conceição", "Vieira", "Barbosa"]
+TERMOS = ["ma", "maria", "maria sil", "JOSE", "conceicao", "joao carv", "zz"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pacientes", type=int, default=1000000)
+    parser.add_argument("--repeticoes", type=int, default=100)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    aleatorio = random.Random(args.semente)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        engine = create_engine(f"sqlite:///{os.path.join(diretorio, 'bench.sqlite3')}")
+        Base.metadata.create_all(engine)
+        aplicar_migracoes(engine)
+
+        # Os gatilhos do índice de busca são acionados pelas inserções, como no cadastro
+        inicio = time.perf_counter()
+        with engine.begin() as conexao:
+            conexao.execute(
+                text("INSERT INTO usuario (id, nome, email) VALUES (:id, :nome, :email)"),
+                [{
+                    "id": i,
+                    "nome": f"{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)} {aleatorio.choice(SOBRENOMES)}",
+                    "email": f"paciente{i}@medmeet.com"
+                } for i in range(1, args.pacientes + 1)]
+            )
+            conexao.execute(
+                text("INSERT INTO paciente (id, cpf, endereco, usuario_id) VALUES (:id, :id, 'Rua A', :id)"),
+                [{"id": i} for i in range(1, args.pacientes + 1)]
+            )
+        print(f"Banco populado com {args.pacientes} pacientes em {time.perf_counter() - inicio:.1f} s")
+
+        session = sessionmaker(bind=engine)()
+        for termo in TERMOS:
+            tempos = []
+            for _ in range(args.repeticoes):
+                inicio = time.perf_counter()
+                consulta = session.query(Paciente).join(Paciente.usuario).options(contains_eager(Paciente.usuario))
+                filtrar_por_nome(session, consulta, Paciente.usuario_id, termo).limit(10).all()
+                tempos.append(time.perf_counter() - inicio)
+
+            tempos.sort()
+            p50 = tempos[len(tempos) // 2] * 1000
+            p99 = tempos[min(len(tempos) - 1, int(len(tempos) * 0.99))] * 1000
+            print(f"  {termo!r:<14} p50 {p50:8.2f} ms   p99 {p99:8.2f} ms")
+
+        session.close()
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
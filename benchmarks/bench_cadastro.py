@@ -0,0 +1,78 @@
+"""
+Mede a vazão e a quantidade de comandos SQL dos cadastros individuais em POST /pacientes e POST /medicos.
+
+Cria um banco temporário e cadastra pacientes e médicos um a um, incluindo uma parcela de cadastros com email
+ou CPF/CRM repetidos, reportando as requisições por segundo e os comandos SQL por requisição.
+
+Uso: python benchmarks/bench_cadastro.py --cadastros 2000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def medir(cliente, engine, rota, cadastros):
+    """Envia os cadastros para a rota e reporta a vazão, os comandos SQL e as respostas por status"""
+    from sqlalchemy import event
+
+    comandos = []
+    contar = lambda *args: comandos.append(1)
+    event.listen(engine, "before_cursor_execute", contar)
+
+    status = {}
+    inicio = time.perf_counter()
+    for dados in cadastros:
+        codigo = cliente.post(rota, data=dados).status_code
+        status[codigo] = status.get(codigo, 0) + 1
+    duracao = time.perf_counter() - inicio
+
+    event.remove(engine, "before_cursor_execute", contar)
+    print(f"  {rota:<11} {len(cadastros) / duracao:8.0f} req/s   {len(comandos) / len(cadastros):5.2f} comandos SQL/req   "
+          f"status {dict(sorted(status.items()))}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cadastros", type=int, default=2000)
+    parser.add_argument("--repetidos", type=int, default=10, help="percentual de cadastros com dados já em uso")
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix="medmeet-cadastro-")
+    os.chdir(diretorio)
+    os.environ["MEDMEET_DATABASE_URL"] = f"sqlite:///{os.path.join(diretorio, 'cadastro.sqlite3')}"
+
+    # A aplicação é importada depois de apontar o banco para o diretório temporário
+    from app import app
+    from model import engine
+
+    logging.disable(logging.CRITICAL)
+    cliente = app.test_client()
+
+    # A cada `passo` cadastros, um repete o email ou o documento de um cadastro anterior
+    passo = max(1, 100 // args.repetidos) if args.repetidos else args.cadastros + 1
+    def repetido(i):
+        return i and i % passo == 0
+
+    pacientes = [{
+        "nome": f"Paciente {i}",
+        "email": f"paciente{i - 1 if repetido(i) and i % 2 else i}@medmeet.com",
+        "cpf": f"{i - 1 if repetido(i) and not i % 2 else i}",
+        "endereco": "Rua A"
+    } for i in range(args.cadastros)]
+    medicos = [{
+        "nome": f"Médico {i}",
+        "email": f"medico{i - 1 if repetido(i) and i % 2 else i}@medmeet.com",
+        "especialidade": "Clínica",
+        "crm": f"{i - 1 if repetido(i) and not i % 2 else i}",
+        "duracao_consulta": 30
+    } for i in range(args.cadastros)]
+
+    print(f"{args.cadastros} cadastros por rota, {args.repetidos}% com dados já em uso:")
+    medir(cliente, engine, '/pacientes', pacientes)
+    medir(cliente, engine, '/medicos', medicos)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Compara a geração das agendas e a busca de horários livres a partir do banco com a disponibilidade em mapa de bits.
+
+Cria um banco temporário com médicos de uma especialidade, atendendo de segunda a sexta, e agendamentos em
+todos os dias úteis do período. Mede a agenda diária de cada médico pelo caminho anterior (horários e agendamentos
+consultados a cada leitura), com a disponibilidade ainda não montada e com ela em memória, a busca de horários
+livres nos dois estados e a memória ocupada pela disponibilidade de um médico em um mês.
+
+Uso: python benchmarks/bench_disponibilidade.py --medicos 50 --dias 30 --agendamentos-dia 8
+"""
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DATA_BASE = date(2030, 1, 7)
+
+def popular_banco(medicos, dias, agendamentos_dia, semente):
+    """Cadastra os médicos com horários de segunda a sexta e agendamentos aleatórios nos dias úteis"""
+    from sqlalchemy import insert
+
+    from importacao import importar_horarios, importar_medicos, importar_pacientes
+    from model import Agendamento, unidade_de_trabalho
+
+    importar_pacientes([{"nome": "Paciente Carga", "email": "paciente@carga.com", "cpf": "1", "endereco": "Rua A"}])
+    importar_medicos([
+        {"nome": f"Médico {i}", "email": f"medico{i}@carga.com", "especialidade": "Clínica", "crm": str(i),
+         "duracao_consulta": 30}
+        for i in range(medicos)
+    ])
+    importar_horarios([
+        {"medico_id": medico_id, "dia_semana": dia_semana, "hora_inicio_manha": "08:00", "hora_fim_manha": "12:00",
+         "hora_inicio_tarde": "13:00", "hora_fim_tarde": "18:00"}
+        for medico_id in range(1, medicos + 1) for dia_semana in range(5)
+    ])
+
+    aleatorio = random.Random(semente)
+    slots = [time(8 + minutos // 60, minutos % 60) for minutos in range(0, 4 * 60, 30)] + \
+            [time(13 + minutos // 60, minutos % 60) for minutos in range(0, 5 * 60, 30)]
+    with unidade_de_trabalho() as session:
+        session.execute(insert(Agendamento), [
+            {"medico_id": medico_id, "paciente_id": 1, "inicio": inicio, "fim": inicio + timedelta(minutes=30),
+             "status": "confirmado"}
+            for medico_id in range(1, medicos + 1)
+            for dia in range(dias) if (DATA_BASE + timedelta(days=dia)).weekday() < 5
+            for inicio in (datetime.combine(DATA_BASE + timedelta(days=dia), slot)
+                           for slot in aleatorio.sample(slots, agendamentos_dia))
+        ])
+
+def carregar_agenda_dia_anterior(session, medico_id, data):
+    # Implementação anterior, mantida aqui apenas como referência de desempenho
+    from agenda import gerar_agenda
+    from consultas import _COLUNAS_AGENDAMENTO, _COLUNAS_HORARIO, filtro_dia
+    from model import Agendamento, HorarioMedico, Medico
+
+    medico = session.query(Medico.duracao_consulta).filter_by(id=medico_id).one()
+    horarios_medico = session.query(*_COLUNAS_HORARIO).filter(
+        HorarioMedico.medico_id == medico_id,
+        HorarioMedico.dia_semana == data.weekday()
+    ).all()
+    agendamentos = session.query(*_COLUNAS_AGENDAMENTO).filter(
+        Agendamento.medico_id == medico_id,
+        filtro_dia(Agendamento.inicio, data)
+    ).all()
+    return gerar_agenda(horarios_medico, agendamentos, medico.duracao_consulta, data)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--medicos", type=int, default=50)
+    parser.add_argument("--dias", type=int, default=30)
+    parser.add_argument("--agendamentos-dia", type=int, default=8, help="agendamentos por médico em cada dia útil")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix="medmeet-disponibilidade-")
+    os.chdir(diretorio)
+    os.environ["MEDMEET_DATABASE_URL"] = f"sqlite:///{os.path.join(diretorio, 'disponibilidade.sqlite3')}"
+
+    # A aplicação é importada depois de apontar o banco para o diretório temporário
+    import disponibilidade
+    from consultas import buscar_horarios_livres, carregar_agenda_dia
+    from model import inicializar_banco, sessao
+
+    logging.disable(logging.CRITICAL)
+    inicializar_banco()
+    popular_banco(args.medicos, args.dias, args.agendamentos_dia, args.semente)
+    session = sessao()
+
+    pares = [(medico_id, DATA_BASE + timedelta(days=dia))
+             for dia in range(args.dias) for medico_id in range(1, args.medicos + 1)]
+
+    def limpar():
+        disponibilidade._dias.limpar()
+        disponibilidade._semanas.limpar()
+
+    # As duas implementações geram as mesmas agendas
+    limpar()
+    assert all(carregar_agenda_dia(session, *par) == carregar_agenda_dia_anterior(session, *par) for par in pares)
+
+    def medir(nome, funcao, quantidade, preparar=None):
+        tempos = timeit.repeat(funcao, setup=preparar or (lambda: None), number=1, repeat=3)
+        print(f"  {nome:<34} {min(tempos) * 1000:9.1f} ms   {min(tempos) * 1e6 / quantidade:8.1f} µs cada")
+
+    print(f"Agendas diárias ({len(pares)} pares de médico e dia):")
+    medir("anterior (consultas a cada leitura)",
+          lambda: [carregar_agenda_dia_anterior(session, *par) for par in pares], len(pares))
+    medir("disponibilidade, não montada",
+          lambda: [carregar_agenda_dia(session, *par) for par in pares], len(pares), limpar)
+    medir("disponibilidade, em memória",
+          lambda: [carregar_agenda_dia(session, *par) for par in pares], len(pares))
+
+    # Busca em todo o período, sem parada antecipada, a partir do primeiro dia
+    query = SimpleNamespace(especialidade="Clínica", data_inicio=DATA_BASE.isoformat(),
+                            data_fim=(DATA_BASE + timedelta(days=min(args.dias, 31) - 1)).isoformat(), limit=100000)
+    agora = datetime.combine(DATA_BASE, time.min)
+    print("Busca de horários livres (período inteiro):")
+    medir("disponibilidade, não montada", lambda: buscar_horarios_livres(session, query, agora), 1, limpar)
+    medir("disponibilidade, em memória", lambda: buscar_horarios_livres(session, query, agora), 1)
+
+    # Memória ocupada pelos dias montados, sem as chaves do cache
+    limpar()
+    tracemalloc.start()
+    inicio = tracemalloc.take_snapshot()
+    dias = [disponibilidade.obter_disponibilidades(session, [medico_id], data)[medico_id] for medico_id, data in pares]
+    memoria = sum(estatistica.size_diff for estatistica in tracemalloc.take_snapshot().compare_to(inicio, "filename")
+                  if estatistica.traceback[0].filename.endswith("agenda.py"))
+    tracemalloc.stop()
+    print(f"Memória por médico em {args.dias} dias: {memoria / args.medicos / 1024:.1f} KB ({len(dias)} dias montados)")
+
+if __name__ == "__main__":
+    main()
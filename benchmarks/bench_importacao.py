@@ -0,0 +1,58 @@
+"""
+Compara a importação em lote de pacientes com o cadastro individual em POST /pacientes.
+
+Cria um banco temporário, cadastra uma amostra de pacientes um a um e importa o restante em CSV pelo
+POST /pacientes/lote, reportando a vazão de cada forma.
+
+Uso: python benchmarks/bench_importacao.py --pacientes 100000 --amostra 1000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pacientes", type=int, default=100000)
+    parser.add_argument("--amostra", type=int, default=1000, help="pacientes cadastrados um a um")
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix="medmeet-importacao-")
+    os.chdir(diretorio)
+    os.environ["MEDMEET_DATABASE_URL"] = f"sqlite:///{os.path.join(diretorio, 'importacao.sqlite3')}"
+
+    # A aplicação é importada depois de apontar o banco para o diretório temporário
+    from app import app
+
+    logging.disable(logging.CRITICAL)
+    cliente = app.test_client()
+
+    inicio = time.perf_counter()
+    for i in range(args.amostra):
+        cliente.post('/pacientes', data={"nome": f"Paciente {i}", "email": f"individual{i}@medmeet.com",
+                                         "cpf": f"individual{i}", "endereco": "Rua A"})
+    individual = args.amostra / (time.perf_counter() - inicio)
+    print(f"Cadastro individual: {args.amostra} pacientes, {individual:.0f} pacientes/s")
+
+    linhas = ["nome,email,cpf,endereco"] + [
+        f"Paciente {i},lote{i}@medmeet.com,lote{i},Rua A" for i in range(args.pacientes)
+    ]
+    corpo = "\n".join(linhas).encode()
+
+    inicio = time.perf_counter()
+    resposta = cliente.post('/pacientes/lote', data=corpo, content_type="text/csv")
+    duracao = time.perf_counter() - inicio
+    resultado = resposta.get_json()
+
+    print(f"Importação em lote: {resultado['importados']} pacientes em {duracao:.1f} s, "
+          f"{resultado['importados'] / duracao:.0f} pacientes/s ({len(resultado['erros'])} recusados)")
+    print(f"Estimativa para {args.pacientes} pacientes um a um: {args.pacientes / individual / 60:.0f} min")
+
+    sys.exit(0 if resultado["importados"] == args.pacientes else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Mostra os planos de consulta e os tempos das consultas críticas antes e depois dos índices.
+
+Cria um banco SQLite temporário sem os índices, popula com agendamentos sintéticos, mede as consultas,
+aplica a migração de índices e mede novamente.
+
+Uso: python benchmarks/bench_indices.py --agendamentos 1000000
+"""
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, select, text
+
+from model import Base, Agendamento, HorarioMedico, Usuario
+from model.migracoes import criar_indices_consultas
+from consultas import filtro_dia
+
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S.%f"
+DATA_BASE = datetime(2024, 1, 1, 8, 0)
+
+# Consultas medidas; as de agendamentos por dia usam o mesmo filtro das rotas da API
+CONSULTAS = {
+    "agenda do médico no dia": lambda dia: select(Agendamento).where(
+        Agendamento.medico_id == 7, filtro_dia(Agendamento.inicio, dia)
+    ),
+    "histórico do paciente": lambda dia: select(Agendamento).where(
+        Agendamento.paciente_id == 42
+    ).order_by(Agendamento.inicio),
+    "agendamentos do dia": lambda dia: select(func.count()).select_from(Agendamento).where(
+        filtro_dia(Agendamento.inicio, dia)
+    ),
+    "horários do médico no dia da semana": lambda dia: select(HorarioMedico).where(
+        HorarioMedico.medico_id == 7, HorarioMedico.dia_semana == dia.weekday()
+    ),
+    "usuário pelo nome": lambda dia: select(Usuario).where(Usuario.nome == "Usuário 4242"),
+}
+
+def popular(engine, total_medicos, total_pacientes, total_agendamentos, semente):
+    """Popula o banco com dados sintéticos usando inserções em lote"""
+    aleatorio = random.Random(semente)
+    total_usuarios = total_medicos + total_pacientes
+
+    with engine.begin() as conexao:
+        conexao.execute(
+            text("INSERT INTO usuario (id, nome, email) VALUES (:id, :nome, :email)"),
+            [{"id": i, "nome": f"Usuário {i}", "email": f"usuario{i}@medmeet.com"} for i in range(1, total_usuarios + 1)]
+        )
+        conexao.execute(
+            text("INSERT INTO medico (id, especialidade, crm, duracao_consulta, usuario_id) VALUES (:id, 'Clínica', :crm, 30, :id)"),
+            [{"id": i, "crm": str(i)} for i in range(1, total_medicos + 1)]
+        )
+        conexao.execute(
+            text("INSERT INTO paciente (id, cpf, endereco, usuario_id) VALUES (:id, :cpf, 'Rua A', :usuario_id)"),
+            [{"id": i, "cpf": str(i), "usuario_id": total_medicos + i} for i in range(1, total_pacientes + 1)]
+        )
+        conexao.execute(
+            text("INSERT INTO horario_medico (dia_semana, hora_inicio_manha, hora_fim_manha, hora_inicio_tarde, hora_fim_tarde, medico_id) "
+                 "VALUES (:dia, '08:00:00.000000', '12:00:00.000000', '13:00:00.000000', '17:00:00.000000', :medico_id)"),
+            [{"dia": dia, "medico_id": i} for i in range(1, total_medicos + 1) for dia in range(5)]
+        )
+
+    lote = 50000
+    for inicio_lote in range(0, total_agendamentos, lote):
+        linhas = []
+        for _ in range(inicio_lote, min(inicio_lote + lote, total_agendamentos)):
+            inicio = DATA_BASE + timedelta(days=aleatorio.randrange(365), minutes=30 * aleatorio.randrange(18))
+            linhas.append({
+                "medico_id": aleatorio.randint(1, total_medicos),
+                "paciente_id": aleatorio.randint(1, total_pacientes),
+                "inicio": inicio.strftime(FORMATO_DATA),
+                "fim": (inicio + timedelta(minutes=30)).strftime(FORMATO_DATA)
+            })
+        with engine.begin() as conexao:
+            conexao.execute(
+                text("INSERT INTO agendamento (medico_id, paciente_id, inicio, fim, status) VALUES (:medico_id, :paciente_id, :inicio, :fim, 'confirmado')"),
+                linhas
+            )
+
+def medir(engine, repeticoes):
+    """Exibe o plano e o tempo médio de cada consulta e retorna os planos por consulta"""
+    planos = {}
+    dia = DATA_BASE.date() + timedelta(days=100)
+    with engine.connect() as conexao:
+        for nome, consulta in CONSULTAS.items():
+            sql = str(consulta(dia).compile(engine, compile_kwargs={"literal_binds": True}))
+            plano = " | ".join(linha[-1] for linha in conexao.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+            planos[nome] = plano
+
+            inicio = time.perf_counter()
+            for _ in range(repeticoes):
+                conexao.execute(text(sql)).all()
+            duracao = (time.perf_counter() - inicio) / repeticoes
+
+            print(f"  {nome:<38} {duracao * 1000:10.3f} ms  {plano}")
+
+    return planos
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agendamentos", type=int, default=1000000)
+    parser.add_argument("--medicos", type=int, default=200)
+    parser.add_argument("--pacientes", type=int, default=50000)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        engine = create_engine(f"sqlite:///{os.path.join(diretorio, 'bench.sqlite3')}")
+
+        # Cria as tabelas como em um banco antigo, sem os índices secundários
+        Base.metadata.create_all(engine)
+        with engine.begin() as conexao:
+            for tabela in Base.metadata.sorted_tables:
+                for indice in tabela.indexes:
+                    indice.drop(conexao, checkfirst=True)
+
+        inicio = time.perf_counter()
+        popular(engine, args.medicos, args.pacientes, args.agendamentos, args.semente)
+        print(f"Banco populado com {args.agendamentos} agendamentos em {time.perf_counter() - inicio:.1f} s")
+
+        print("Sem índices:")
+        medir(engine, args.repeticoes)
+
+        with engine.begin() as conexao:
+            criar_indices_consultas(conexao)
+            conexao.execute(text("ANALYZE"))
+
+        print("Com índices:")
+        planos = medir(engine, args.repeticoes)
+
+        engine.dispose()
+
+    # Falha se alguma consulta ainda percorrer a tabela inteira depois dos índices
+    sem_indice = [nome for nome, plano in planos.items() if "SCAN" in plano]
+    if sem_indice:
+        print(f"Consultas sem uso de índice: {', '.join(sem_indice)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Mede o custo de serialização das respostas da listagem de pacientes e da agenda, por 10 mil linhas.
+
+Compara o caminho anterior (Row._mapping e flask.jsonify) com o serializador da API, usando o orjson e o
+módulo json da biblioteca padrão, que é usado quando o orjson não está instalado.
+
+Uso: python benchmarks/bench_serializacao.py --linhas 10000
+"""
+from collections import namedtuple
+from datetime import date, time, timedelta
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+Horario = namedtuple("Horario", "hora_inicio_manha hora_fim_manha hora_inicio_tarde hora_fim_tarde")
+
+def medir(nome, funcao, linhas, repeticoes):
+    """Reporta o menor tempo entre as repetições, normalizado para 10 mil linhas"""
+    melhor = min(timeit.repeat(funcao, number=1, repeat=repeticoes))
+    print(f"  {nome:<38} {melhor * 1000 * 10000 / linhas:8.2f} ms por 10 mil linhas")
+    return melhor
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=10000)
+    parser.add_argument("--repeticoes", type=int, default=10)
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix="medmeet-serializacao-")
+    os.chdir(diretorio)
+    os.environ["MEDMEET_DATABASE_URL"] = f"sqlite:///{os.path.join(diretorio, 'serializacao.sqlite3')}"
+
+    # A aplicação é importada depois de apontar o banco para o diretório temporário
+    from flask import jsonify as jsonify_flask
+    from app import app
+    from agenda import gerar_agenda
+    from importacao import importar_pacientes
+    from model import Paciente, sessao
+    from schema import CAMPOS_PACIENTE
+    import serializacao
+
+    logging.disable(logging.CRITICAL)
+
+    importar_pacientes([
+        {"nome": f"Paciente {i}", "email": f"paciente{i}@medmeet.com", "cpf": str(i), "endereco": "Rua São João, 100"}
+        for i in range(args.linhas)
+    ])
+    linhas = sessao().query(*[coluna.label(nome) for nome, coluna in CAMPOS_PACIENTE.items()]) \
+        .select_from(Paciente).join(Paciente.usuario).order_by(Paciente.id).all()
+
+    # Slots de um minuto em dias seguidos até completar as linhas pedidas
+    horario = Horario(time(0, 0), time(12, 0), time(12, 0), time(23, 59))
+    slots = []
+    dia = date(2030, 1, 1)
+    while len(slots) < args.linhas:
+        slots += gerar_agenda([horario], [], 1, dia)
+        dia += timedelta(days=1)
+    slots = slots[:args.linhas]
+
+    with app.app_context():
+        print(f"Listagem de pacientes ({len(linhas)} linhas):")
+        anterior = medir("Row._mapping + flask.jsonify",
+                         lambda: jsonify_flask({"pacientes": [dict(linha._mapping) for linha in linhas]}).get_data(),
+                         len(linhas), args.repeticoes)
+        medir("linhas_para_dicionarios + json",
+              lambda: serializacao._serializar_json({"pacientes": serializacao.linhas_para_dicionarios(linhas)}),
+              len(linhas), args.repeticoes)
+        if serializacao.orjson is not None:
+            atual = medir("linhas_para_dicionarios + orjson",
+                          lambda: serializacao._serializar_orjson({"pacientes": serializacao.linhas_para_dicionarios(linhas)}),
+                          len(linhas), args.repeticoes)
+            print(f"  {anterior / atual:.1f}x mais rápido")
+
+        print(f"Agenda ({len(slots)} slots):")
+        anterior = medir("flask.jsonify", lambda: jsonify_flask(slots).get_data(), len(slots), args.repeticoes)
+        medir("json", lambda: serializacao._serializar_json(slots), len(slots), args.repeticoes)
+        if serializacao.orjson is not None:
+            atual = medir("orjson", lambda: serializacao._serializar_orjson(slots), len(slots), args.repeticoes)
+            print(f"  {anterior / atual:.1f}x mais rápido")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Teste de carga com vários escritores simultâneos em POST /agendamentos.
+
+Cria um banco temporário, cadastra um médico e um paciente e dispara agendamentos em horários distintos
+a partir de vários processos, como os workers do gunicorn, contando as respostas de sucesso e as falhas
+"database is locked".
+
+Com --mesmo-horario, todos os agendamentos disputam o mesmo horário do médico e apenas um deve ser aceito;
+os demais devem ser recusados com 409.
+
+Com --escalonado, os agendamentos começam um minuto depois do outro a partir das 08:00, todos dentro da duração
+de uma consulta (30 minutos), e se sobrepõem sem ter o mesmo início; apenas um deve ser aceito e os demais devem
+ser recusados com 409 pela verificação de sobreposição feita depois do flush.
+
+Uso: python benchmarks/carga_agendamentos.py --processos 8 --agendamentos 50 [--mesmo-horario | --escalonado]
+     python benchmarks/carga_agendamentos.py --processos 25 --agendamentos 1 --escalonado
+"""
+from datetime import datetime, timedelta
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+INICIO_BASE = datetime(2030, 1, 1, 0, 0)
+INICIO_ESCALONADO = datetime(2030, 1, 1, 8, 0)
+DURACAO_CONSULTA = 30
+
+def inicio_agendamento(modo, processo, total, indice):
+    """Retorna o início do agendamento conforme o modo: horários exclusivos, o mesmo horário ou escalonados"""
+    sequencia = processo * total + indice
+    if modo == "mesmo_horario":
+        return INICIO_BASE
+    if modo == "escalonado":
+        return INICIO_ESCALONADO + timedelta(minutes=sequencia)
+    return INICIO_BASE + timedelta(minutes=DURACAO_CONSULTA * sequencia)
+
+def agendar(processo, total, modo, barreira, resultados):
+    """Dispara `total` agendamentos, com os inícios definidos pelo modo"""
+    # Cada processo importa a aplicação e abre suas próprias conexões, como um worker
+    from app import app
+
+    cliente = app.test_client()
+
+    # Todos os processos começam a escrever ao mesmo tempo
+    barreira.wait()
+
+    respostas = []
+    for indice in range(total):
+        inicio = inicio_agendamento(modo, processo, total, indice)
+        resposta = cliente.post('/agendamentos', data={
+            "paciente_nome": "Paciente Carga",
+            "medico_nome": "Médico Carga",
+            "data": inicio.strftime("%Y-%m-%d"),
+            "horario": inicio.strftime("%H:%M")
+        })
+        respostas.append((resposta.status_code, resposta.get_json().get("message", "")))
+    resultados.put(respostas)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processos", type=int, default=8)
+    parser.add_argument("--agendamentos", type=int, default=50, help="agendamentos por processo")
+    modos = parser.add_mutually_exclusive_group()
+    modos.add_argument("--mesmo-horario", action="store_true", help="todos os agendamentos no mesmo horário")
+    modos.add_argument("--escalonado", action="store_true",
+                       help="inícios um minuto depois do outro, todos dentro da duração de uma consulta")
+    args = parser.parse_args()
+
+    modo = "mesmo_horario" if args.mesmo_horario else "escalonado" if args.escalonado else "exclusivo"
+    if args.escalonado and args.processos * args.agendamentos > DURACAO_CONSULTA:
+        parser.error(f"--escalonado aceita no máximo {DURACAO_CONSULTA} agendamentos no total, "
+                     f"para que todos se sobreponham")
+
+    diretorio = tempfile.mkdtemp(prefix="medmeet-carga-")
+    os.chdir(diretorio)
+    os.environ["MEDMEET_DATABASE_URL"] = f"sqlite:///{os.path.join(diretorio, 'carga.sqlite3')}"
+
+    # A aplicação é importada depois de apontar o banco para o diretório temporário
+    from app import app
+
+    cliente = app.test_client()
+    cliente.post('/medicos', data={"nome": "Médico Carga", "email": "medico@carga.com", "especialidade": "Clínica",
+                                   "crm": "1", "duracao_consulta": DURACAO_CONSULTA})
+    cliente.post('/pacientes', data={"nome": "Paciente Carga", "email": "paciente@carga.com", "cpf": "1",
+                                     "endereco": "Rua A"})
+
+    contexto = multiprocessing.get_context("spawn")
+    barreira = contexto.Barrier(args.processos + 1)
+    resultados = contexto.Queue()
+    processos = [
+        contexto.Process(target=agendar, args=(processo, args.agendamentos, modo, barreira, resultados))
+        for processo in range(args.processos)
+    ]
+    for processo in processos:
+        processo.start()
+
+    # A medição começa quando todos os processos estão prontos
+    barreira.wait()
+    inicio = time.perf_counter()
+    respostas = [resposta for _ in processos for resposta in resultados.get()]
+    duracao = time.perf_counter() - inicio
+
+    for processo in processos:
+        processo.join()
+
+    sucessos = sum(1 for status, _ in respostas if status == 200)
+    conflitos = sum(1 for status, _ in respostas if status == 409)
+    bloqueios = sum(1 for _, mensagem in respostas if "locked" in mensagem)
+    outras = len(respostas) - sucessos - conflitos - bloqueios
+
+    print(f"{len(respostas)} agendamentos com {args.processos} processos em {duracao:.2f} s "
+          f"({len(respostas) / duracao:.0f} req/s)")
+    print(f"  sucesso: {sucessos}   conflito (409): {conflitos}   database is locked: {bloqueios}   outras falhas: {outras}")
+
+    esperado = len(respostas) if modo == "exclusivo" else 1
+    sys.exit(1 if sucessos != esperado or bloqueios or outras else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Compara o modo síncrono (gunicorn, app:app) com o modo assíncrono (uvicorn, asgi:app) com a mesma memória.
+
+Cria um banco temporário com médicos, horários e agendamentos e dispara GET /medicos/agenda para todos os pares
+de médico e dia, com várias requisições simultâneas, como o front-end faz ao abrir as agendas de vários médicos.
+Para cada servidor, mede primeiro a memória do processo principal e de cada worker e inicia quantos workers
+couberem em --memoria-mb, reportando a vazão, as latências p50/p99 e a memória total ocupada.
+
+O gerador de carga roda na mesma máquina; em máquinas com poucos núcleos, compare apenas os resultados
+de uma mesma execução. Requer os pacotes gunicorn, uvicorn, starlette, a2wsgi, aiosqlite e httpx.
+
+Uso: python benchmarks/carga_asgi.py --medicos 200 --dias 30 --concorrencia 64 --memoria-mb 400
+"""
+from datetime import date, datetime, time as hora, timedelta
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+DATA_BASE = date(2030, 1, 7)
+
+def popular_banco(medicos, dias):
+    """Cadastra os médicos com horários em todos os dias da semana e agendamentos em metade dos dias"""
+    from sqlalchemy import insert
+
+    from importacao import importar_horarios, importar_medicos, importar_pacientes
+    from model import Agendamento, unidade_de_trabalho
+
+    importar_pacientes([{"nome": "Paciente Carga", "email": "paciente@carga.com", "cpf": "1", "endereco": "Rua A"}])
+    importar_medicos([
+        {"nome": f"Médico {i}", "email": f"medico{i}@carga.com", "especialidade": "Clínica", "crm": str(i),
+         "duracao_consulta": 30}
+        for i in range(medicos)
+    ])
+    importar_horarios([
+        {"medico_id": medico_id, "dia_semana": dia_semana, "hora_inicio_manha": "08:00", "hora_fim_manha": "12:00",
+         "hora_inicio_tarde": "13:00", "hora_fim_tarde": "18:00"}
+        for medico_id in range(1, medicos + 1) for dia_semana in range(7)
+    ])
+
+    with unidade_de_trabalho() as session:
+        session.execute(insert(Agendamento), [
+            {"medico_id": medico_id, "paciente_id": 1, "inicio": inicio, "fim": inicio + timedelta(minutes=30),
+             "status": "confirmado"}
+            for medico_id in range(1, medicos + 1)
+            for dia in range(0, dias, 2)
+            for inicio in (datetime.combine(DATA_BASE + timedelta(days=dia), hora(9)),
+                           datetime.combine(DATA_BASE + timedelta(days=dia), hora(14)))
+        ])
+
+def porta_livre():
+    with socket.socket() as conexao:
+        conexao.bind(("127.0.0.1", 0))
+        return conexao.getsockname()[1]
+
+def memoria_mb(pid, descendentes=True):
+    """Retorna a memória residente do processo e, se pedido, a de todos os seus descendentes, em MB"""
+    filhos = {}
+    for entrada in os.listdir("/proc"):
+        if entrada.isdigit():
+            try:
+                with open(f"/proc/{entrada}/stat") as arquivo:
+                    filhos.setdefault(int(arquivo.read().rsplit(")", 1)[1].split()[1]), []).append(int(entrada))
+            except OSError:
+                continue
+
+    total = 0
+    pendentes = [pid]
+    while pendentes:
+        atual = pendentes.pop()
+        if descendentes:
+            pendentes += filhos.get(atual, [])
+        try:
+            with open(f"/proc/{atual}/status") as arquivo:
+                total += next(int(linha.split()[1]) for linha in arquivo if linha.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            continue
+    return total / 1024
+
+def iniciar_servidor(modo, workers, porta, diretorio):
+    """Inicia o servidor no modo pedido e aguarda até que ele responda"""
+    if modo == "sync":
+        comando = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{porta}", "app:app"]
+    else:
+        comando = [sys.executable, "-m", "uvicorn", "asgi:app", "--workers", str(workers), "--port", str(porta),
+                   "--log-level", "warning"]
+
+    ambiente = {**os.environ, "PYTHONPATH": RAIZ}
+    processo = subprocess.Popen(comando, cwd=diretorio, env=ambiente,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    import httpx
+    for _ in range(300):
+        try:
+            if httpx.get(f"http://127.0.0.1:{porta}/medicos/contagem").status_code == 200:
+                return processo
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    processo.kill()
+    raise RuntimeError(f"O servidor {modo} não respondeu")
+
+def encerrar_servidor(processo):
+    processo.terminate()
+    try:
+        processo.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        processo.kill()
+
+async def disparar(porta, rotas, concorrencia):
+    """Dispara as rotas com `concorrencia` requisições simultâneas, retornando as latências e os status"""
+    import httpx
+
+    latencias = []
+    status = {}
+    fila = iter(rotas)
+
+    async def cliente(sessao):
+        for rota in fila:
+            inicio = time.perf_counter()
+            try:
+                codigo = (await sessao.get(rota)).status_code
+            except httpx.HTTPError:
+                codigo = "falha"
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            status[codigo] = status.get(codigo, 0) + 1
+
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{porta}", limits=limites, timeout=60) as sessao:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente(sessao) for _ in range(concorrencia)))
+        duracao = time.perf_counter() - inicio
+
+    return sorted(latencias), status, duracao
+
+def medir(modo, rotas, args, diretorio):
+    """Calcula os workers que cabem na memória disponível e mede o servidor com eles"""
+    # Mede a memória do processo principal e a de cada worker com dois workers que já atenderam algumas agendas
+    processo = iniciar_servidor(modo, 2, porta := porta_livre(), diretorio)
+    asyncio.run(disparar(porta, rotas[:100], 8))
+    memoria_principal = memoria_mb(processo.pid, descendentes=False)
+    memoria_worker = (memoria_mb(processo.pid) - memoria_principal) / 2
+    encerrar_servidor(processo)
+
+    workers = max(1, int((args.memoria_mb - memoria_principal) // memoria_worker))
+    processo = iniciar_servidor(modo, workers, porta := porta_livre(), diretorio)
+    try:
+        latencias, status, duracao = asyncio.run(disparar(porta, rotas, args.concorrencia))
+        memoria = memoria_mb(processo.pid)
+    finally:
+        encerrar_servidor(processo)
+
+    percentil = lambda p: latencias[min(len(latencias) - 1, int(len(latencias) * p / 100))]
+    print(f"  {modo:<5} {workers:>2} workers {memoria:6.0f} MB   {len(rotas) / duracao:7.0f} req/s   "
+          f"p50 {percentil(50):7.1f} ms   p99 {percentil(99):7.1f} ms   status {status}")
+    return status.get(200, 0) == len(rotas)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--medicos", type=int, default=200)
+    parser.add_argument("--dias", type=int, default=30)
+    parser.add_argument("--concorrencia", type=int, default=64, help="requisições simultâneas")
+    parser.add_argument("--memoria-mb", type=float, default=400, help="memória disponível para cada servidor")
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix="medmeet-asgi-")
+    os.chdir(diretorio)
+    os.environ["MEDMEET_DATABASE_URL"] = f"sqlite:///{os.path.join(diretorio, 'asgi.sqlite3')}"
+
+    # A aplicação é importada depois de apontar o banco para o diretório temporário
+    import app
+
+    logging.disable(logging.CRITICAL)
+    popular_banco(args.medicos, args.dias)
+
+    # Cada par de médico e dia é pedido uma única vez, sem acertos no cache de agendas
+    rotas = [
+        f"/medicos/agenda?medico_id={medico_id}&data={(DATA_BASE + timedelta(days=dia)).isoformat()}"
+        for dia in range(args.dias) for medico_id in range(1, args.medicos + 1)
+    ]
+
+    print(f"{len(rotas)} agendas, {args.concorrencia} requisições simultâneas, {args.memoria_mb:.0f} MB por servidor:")
+    completos = [medir(modo, rotas, args, diretorio) for modo in ("sync", "async")]
+    sys.exit(0 if all(completos) else 1)
+
+if __name__ == "__main__":
+    main()
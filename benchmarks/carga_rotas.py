@@ -0,0 +1,294 @@
+"""
+Mede a latência e a vazão de todas as rotas da aplicação Flask pelo cliente de testes, sem servidor e sem rede.
+
+Popula um banco temporário com o benchmarks/semear.py, ou usa uma cópia de um banco já semeado (--banco), e dispara
+as requisições de cada rota em sequência, com os parâmetros sorteados a partir de uma semente fixa. Para cada rota
+reporta a vazão, as latências p50 e p99 e os comandos SQL por requisição, lidos das métricas da aplicação
+(metricas.py). As leituras são medidas antes das escritas, que alteram os dados; as exportações recebem uma fração
+das requisições, e cada resposta é fechada como faria o servidor, o que registra a medição das respostas em
+streaming.
+
+Com --comparar, o resultado é conferido com uma referência gravada por --salvar, e o script termina com erro se:
+- alguma rota da aplicação não tiver requisições no script ou responder com um status diferente de 200;
+- alguma rota executar mais comandos SQL por requisição que na referência;
+- a referência tiver latências e o p50 ou o p99 de alguma rota passar dela além da --tolerancia.
+
+A quantidade de comandos SQL não depende da máquina, e é o que a referência do repositório guarda
+(benchmarks/referencia_rotas.json, gravada com --sem-latencias). Latências só são comparáveis com uma referência
+gravada na mesma máquina, com os mesmos volumes.
+
+Uso: python benchmarks/carga_rotas.py --comparar benchmarks/referencia_rotas.json
+     python benchmarks/carga_rotas.py --banco medmeet.sqlite3 --requisicoes 500 --salvar resultado.json
+"""
+from datetime import date, timedelta
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Fração das requisições usada nas exportações, que percorrem as tabelas inteiras
+FRACAO_EXPORTACAO = 0.02
+
+TAMANHO_LOTE = 50
+
+def segunda_feira(data):
+    """Retorna a segunda-feira da semana da data"""
+    return data - timedelta(days=data.weekday())
+
+def ler_dados(session):
+    """Lê do banco os intervalos de ids, o período dos agendamentos, as especialidades e sobrenomes para a busca"""
+    from sqlalchemy import func
+
+    from model import Agendamento, Medico, Paciente, Usuario
+
+    inicio, fim = session.query(func.min(Agendamento.inicio), func.max(Agendamento.inicio)).one()
+    if inicio is None:
+        raise ValueError("O banco não tem agendamentos; popule-o com benchmarks/semear.py.")
+    sobrenomes = {nome.split()[-1] for nome, in session.query(Usuario.nome).join(Paciente.usuario).limit(1000)}
+    return {
+        "medicos": session.query(func.max(Medico.id)).scalar(),
+        "pacientes": session.query(func.max(Paciente.id)).scalar(),
+        "agendamentos": session.query(func.max(Agendamento.id)).scalar(),
+        "data_inicio": inicio.date(),
+        "data_fim": fim.date(),
+        "especialidades": sorted(especialidade for especialidade, in session.query(Medico.especialidade).distinct()),
+        "sobrenomes": sorted(sobrenomes),
+    }
+
+def montar_rotas(dados, aleatorio):
+    """
+    Retorna as rotas medidas, com o método, o modelo do caminho, a fração das requisições e a função que monta a
+    i-ésima requisição como os argumentos do cliente de testes. As leituras vêm antes das escritas.
+    """
+    dias = (dados["data_fim"] - dados["data_inicio"]).days
+
+    def medico():
+        return aleatorio.randint(1, dados["medicos"])
+
+    def paciente():
+        return aleatorio.randint(1, dados["pacientes"])
+
+    def data():
+        return dados["data_inicio"] + timedelta(days=aleatorio.randint(0, dias))
+
+    def semana():
+        inicio = segunda_feira(data())
+        return {"data_inicio": inicio.isoformat(), "data_fim": (inicio + timedelta(days=6)).isoformat()}
+
+    # A busca de horários livres começa na próxima segunda-feira, o que mantém as mesmas consultas em qualquer dia
+    proxima_semana = segunda_feira(date.today()) + timedelta(days=7)
+
+    def horario(medico_id, dia_semana):
+        return {"medico_id": medico_id, "dia_semana": dia_semana, "hora_inicio_manha": "07:00",
+                "hora_fim_manha": "08:00", "hora_inicio_tarde": "19:00", "hora_fim_tarde": "20:00"}
+
+    def medico_novo(i, j=0):
+        return {"nome": f"Dra. Carga {i} {j}", "email": f"carga{i}.{j}@medicos.carga.com.br",
+                "especialidade": aleatorio.choice(dados["especialidades"]), "crm": f"9{i:06d}{j:03d}",
+                "duracao_consulta": 30}
+
+    def paciente_novo(i, j=0):
+        return {"nome": f"Paciente Carga {i} {j}", "email": f"carga{i}.{j}@carga.com.br", "cpf": f"C{i:06d}{j:03d}",
+                "endereco": "Rua Carga, 1, São Paulo - SP"}
+
+    def lote(registros):
+        return {"data": json.dumps(registros), "content_type": "application/json"}
+
+    def agendamento(i):
+        # Cada requisição usa um par de médico e dia próprio, depois do período semeado, e nunca conflita
+        dia = dados["data_fim"] + timedelta(days=1 + i // dados["medicos"])
+        return {"data": {"paciente_id": paciente(), "medico_id": 1 + i % dados["medicos"],
+                         "data": dia.isoformat(), "horario": "10:00"}}
+
+    return [
+        ("GET", "/medicos", 1, lambda i: ("/medicos", {"query_string": {"limit": 50, "cursor": medico()}})),
+        ("GET", "/medicos/exportar", FRACAO_EXPORTACAO, lambda i: ("/medicos/exportar", {})),
+        ("GET", "/medicos/agenda", 1,
+         lambda i: ("/medicos/agenda", {"query_string": {"medico_id": medico(), "data": data().isoformat()}})),
+        ("GET", "/medicos/agendas", 1, lambda i: ("/medicos/agendas", {"query_string": {
+            "medico_ids": ",".join(str(medico()) for _ in range(5)), **semana()}})),
+        ("GET", "/medicos/horarios-livres", 1, lambda i: ("/medicos/horarios-livres", {"query_string": {
+            "especialidade": aleatorio.choice(dados["especialidades"]), "data_inicio": proxima_semana.isoformat(),
+            "data_fim": (proxima_semana + timedelta(days=6)).isoformat(), "limit": 10}})),
+        ("GET", "/medicos/<int:medico_id>/agendamentos", 1,
+         lambda i: (f"/medicos/{medico()}/agendamentos", {"query_string": {"limit": 50, **semana()}})),
+        ("GET", "/medicos/contagem", 1, lambda i: ("/medicos/contagem", {})),
+        ("GET", "/pacientes", 1, lambda i: ("/pacientes", {"query_string": {"limit": 50, "cursor": paciente()}})),
+        ("GET", "/pacientes/exportar", FRACAO_EXPORTACAO, lambda i: ("/pacientes/exportar", {})),
+        ("GET", "/pacientes/buscar", 1,
+         lambda i: ("/pacientes/buscar", {"query_string": {"nome": aleatorio.choice(dados["sobrenomes"])}})),
+        ("GET", "/pacientes/<int:paciente_id>/agendamentos", 1,
+         lambda i: (f"/pacientes/{paciente()}/agendamentos", {"query_string": {"limit": 50}})),
+        ("GET", "/pacientes/contagem", 1, lambda i: ("/pacientes/contagem", {})),
+        ("GET", "/agendamentos/exportar", FRACAO_EXPORTACAO, lambda i: ("/agendamentos/exportar", {})),
+        ("POST", "/agendamentos/ver", 1,
+         lambda i: ("/agendamentos/ver", {"json": {"agendamento_id": aleatorio.randint(1, dados["agendamentos"])}})),
+        ("GET", "/agendamentos/hoje/contagem", 1, lambda i: ("/agendamentos/hoje/contagem", {})),
+        ("GET", "/dashboard", 1, lambda i: ("/dashboard", {})),
+        ("GET", "/metricas/pool", 1, lambda i: ("/metricas/pool", {})),
+        ("GET", "/metrics", 1, lambda i: ("/metrics", {})),
+        ("POST", "/medicos", 1, lambda i: ("/medicos", {"data": medico_novo(i)})),
+        ("POST", "/medicos/lote", 1,
+         lambda i: ("/medicos/lote", lote([medico_novo(i, j) for j in range(1, TAMANHO_LOTE + 1)]))),
+        # Os horários extras ficam no domingo, fora dos dias de atendimento do banco semeado
+        ("POST", "/medicos/horarios", 1, lambda i: ("/medicos/horarios", {"data": horario(medico(), "Domingo")})),
+        ("POST", "/medicos/horarios/lote", 1,
+         lambda i: ("/medicos/horarios/lote", lote([horario(medico(), "Domingo") for _ in range(TAMANHO_LOTE)]))),
+        ("POST", "/pacientes", 1, lambda i: ("/pacientes", {"data": paciente_novo(i)})),
+        ("POST", "/pacientes/lote", 1,
+         lambda i: ("/pacientes/lote", lote([paciente_novo(i, j) for j in range(1, TAMANHO_LOTE + 1)]))),
+        ("POST", "/agendamentos", 1, lambda i: ("/agendamentos", agendamento(i))),
+    ]
+
+def rotas_sem_cenario(app, rotas):
+    """Retorna as rotas da aplicação sem requisições no script, fora a documentação OpenAPI e os arquivos estáticos"""
+    medidas = {(metodo, rota) for metodo, rota, _, _ in rotas}
+    return sorted(
+        f"{metodo} {regra.rule}"
+        for regra in app.url_map.iter_rules()
+        if regra.endpoint != "static" and not regra.endpoint.startswith("openapi.")
+        for metodo in regra.methods - {"HEAD", "OPTIONS"} if (metodo, regra.rule) not in medidas
+    )
+
+def percentil(latencias, p):
+    return latencias[min(len(latencias) - 1, int(len(latencias) * p / 100))]
+
+def medir(cliente, rotas, requisicoes):
+    """Dispara as requisições de cada rota, retornando a vazão, as latências, os status e os comandos SQL"""
+    import metricas
+
+    resultado = {}
+    for metodo, rota, fracao, montar in rotas:
+        latencias = []
+        status = {}
+        total = max(1, int(requisicoes * fracao))
+        inicio_rota = time.perf_counter()
+        for i in range(total):
+            caminho, argumentos = montar(i)
+            inicio = time.perf_counter()
+            resposta = cliente.open(caminho, method=metodo, **argumentos)
+            resposta.get_data()
+            resposta.close()
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            status[str(resposta.status_code)] = status.get(str(resposta.status_code), 0) + 1
+        duracao = time.perf_counter() - inicio_rota
+
+        latencias.sort()
+        consultas = metricas.rotas[(metodo, rota)].consultas
+        resultado[f"{metodo} {rota}"] = {
+            "requisicoes": total,
+            "vazao": round(total / duracao, 1),
+            "p50_ms": round(percentil(latencias, 50), 3),
+            "p99_ms": round(percentil(latencias, 99), 3),
+            "consultas_media": round(consultas.soma / consultas.contagem, 2),
+            "consultas_max": int(consultas.maximo),
+            "status": status,
+        }
+    return resultado
+
+def comparar(resultado, referencia, tolerancia):
+    """Retorna as falhas do resultado em relação à referência"""
+    falhas = []
+    for nome, atual in resultado.items():
+        inesperados = {codigo: quantidade for codigo, quantidade in atual["status"].items() if codigo != "200"}
+        if inesperados:
+            falhas.append(f"{nome}: status inesperados {inesperados}")
+
+    for nome, esperado in referencia.items():
+        atual = resultado.get(nome)
+        if atual is None:
+            falhas.append(f"{nome}: rota da referência não medida")
+            continue
+        if atual["consultas_max"] > esperado["consultas_max"]:
+            falhas.append(f"{nome}: {atual['consultas_max']} comandos SQL por requisição, "
+                          f"a referência tem {esperado['consultas_max']}")
+        for chave in ("p50_ms", "p99_ms"):
+            if chave in esperado and atual[chave] > esperado[chave] * (1 + tolerancia):
+                falhas.append(f"{nome}: {chave} {atual[chave]:.1f} ms, a referência tem {esperado[chave]:.1f} ms")
+    return falhas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--banco", help="banco SQLite já semeado; as medições usam uma cópia dele")
+    parser.add_argument("--medicos", type=int, default=50, help="médicos do banco temporário, sem --banco")
+    parser.add_argument("--pacientes", type=int, default=2000)
+    parser.add_argument("--agendamentos", type=int, default=20000)
+    parser.add_argument("--dias", type=int, default=120)
+    parser.add_argument("--requisicoes", type=int, default=100, help="requisições por rota")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--salvar", help="grava o resultado em JSON, para uso como referência")
+    parser.add_argument("--sem-latencias", action="store_true",
+                        help="grava apenas os comandos SQL de cada rota, que não dependem da máquina")
+    parser.add_argument("--comparar", help="referência gravada com --salvar")
+    parser.add_argument("--tolerancia", type=float, default=0.5, help="aumento aceito nas latências da referência")
+    args = parser.parse_args()
+
+    # Os caminhos informados são relativos ao diretório de onde o script foi chamado
+    banco, salvar, referencia = (os.path.abspath(caminho) if caminho else None
+                                 for caminho in (args.banco, args.salvar, args.comparar))
+
+    diretorio = tempfile.mkdtemp(prefix="medmeet-rotas-")
+    os.chdir(diretorio)
+    arquivo = os.path.join(diretorio, "rotas.sqlite3")
+    if banco:
+        shutil.copy(banco, arquivo)
+    os.environ["MEDMEET_DATABASE_URL"] = f"sqlite:///{arquivo}"
+
+    # A aplicação é importada depois de apontar o banco para o diretório temporário
+    from app import app
+    from model import sessao
+    from semear import semear
+
+    logging.disable(logging.CRITICAL)
+    try:
+        if not banco:
+            # O período começa em uma segunda-feira, com os mesmos dias da semana em qualquer execução
+            data_inicio = segunda_feira(date.today() - timedelta(days=args.dias // 2))
+            semear(args.medicos, args.pacientes, args.agendamentos, args.dias, data_inicio, args.semente)
+
+        session = sessao()
+        dados = ler_dados(session)
+        session.close()
+    except ValueError as e:
+        sys.exit(str(e))
+
+    rotas = montar_rotas(dados, random.Random(args.semente))
+    faltantes = rotas_sem_cenario(app, rotas)
+
+    print(f"{dados['medicos']} médicos, {dados['pacientes']} pacientes e {dados['agendamentos']} agendamentos, "
+          f"{args.requisicoes} requisições por rota:")
+    inicio = time.perf_counter()
+    resultado = medir(app.test_client(), rotas, args.requisicoes)
+    duracao = time.perf_counter() - inicio
+
+    print(f"  {'rota':<50} {'req':>5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'SQL/req':>8} {'SQL máx':>8}")
+    for nome, medicao in resultado.items():
+        print(f"  {nome:<50} {medicao['requisicoes']:>5} {medicao['vazao']:>8.1f} {medicao['p50_ms']:>8.2f} "
+              f"{medicao['p99_ms']:>8.2f} {medicao['consultas_media']:>8.2f} {medicao['consultas_max']:>8}")
+    total = sum(medicao["requisicoes"] for medicao in resultado.values())
+    print(f"  {total} requisições em {duracao:.1f} s ({total / duracao:.0f} req/s)")
+
+    if salvar:
+        campos = ("consultas_max",) if args.sem_latencias else ("p50_ms", "p99_ms", "vazao", "consultas_max")
+        with open(salvar, "w") as saida:
+            json.dump({nome: {campo: medicao[campo] for campo in campos} for nome, medicao in resultado.items()},
+                      saida, indent=2, ensure_ascii=False)
+            saida.write("\n")
+
+    falhas = [f"{rota}: rota sem requisições no script" for rota in faltantes]
+    if referencia:
+        with open(referencia) as entrada:
+            falhas += comparar(resultado, json.load(entrada), args.tolerancia)
+    for falha in falhas:
+        print(f"FALHA {falha}")
+    sys.exit(1 if falhas else 0)
+
+if __name__ == "__main__":
+    main()
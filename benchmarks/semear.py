@@ -0,0 +1,255 @@
+"""
+Popula um banco vazio com volumes realistas de médicos, horários de atendimento, pacientes e agendamentos.
+
+Nomes, emails, CPFs, CRMs e endereços são gerados a partir de nomes e sobrenomes brasileiros com uma semente fixa,
+então a mesma semente e os mesmos volumes produzem sempre o mesmo banco. Médicos, pacientes e horários são
+cadastrados pela importação em lote, que mantém os contadores do painel e o índice de busca por nome. Os
+agendamentos são inseridos com executemany em lotes, nos dias de atendimento de cada médico ao longo do período,
+sem sobreposição na agenda do médico, e a contagem de agendamentos de cada dia é atualizada ao final.
+
+Por padrão o período começa na metade dos dias antes de hoje, o que deixa agendamentos passados, de hoje e futuros.
+
+Uso: python benchmarks/semear.py --banco database/med_meet.sqlite3 --medicos 500 --pacientes 100000 \
+         --agendamentos 1000000 --dias 365
+"""
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+import argparse
+import logging
+import os
+import random
+import sys
+import time as relogio
+import unicodedata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NOMES_FEMININOS = (
+    "Ana", "Maria", "Juliana", "Fernanda", "Camila", "Beatriz", "Larissa", "Mariana", "Gabriela", "Patrícia",
+    "Aline", "Letícia", "Vanessa", "Bruna", "Amanda", "Luciana", "Carolina", "Natália", "Débora", "Francisca",
+    "Antônia", "Raimunda", "Isabela", "Lívia", "Júlia", "Helena", "Alice", "Sofia", "Valentina", "Manuela",
+)
+
+NOMES_MASCULINOS = (
+    "José", "João", "Antônio", "Francisco", "Carlos", "Paulo", "Pedro", "Lucas", "Luiz", "Marcos",
+    "Gabriel", "Rafael", "Daniel", "Marcelo", "Bruno", "Eduardo", "Felipe", "Raimundo", "Rodrigo", "Thiago",
+    "Gustavo", "Leonardo", "Matheus", "Vinícius", "Otávio", "Caio", "Heitor", "Arthur", "Davi", "Bernardo",
+)
+
+SOBRENOMES = (
+    "Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+    "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes", "Soares", "Fernandes", "Vieira", "Barbosa",
+    "Rocha", "Dias", "Nascimento", "Andrade", "Moreira", "Nunes", "Marques", "Machado", "Mendes", "Freitas",
+    "Cardoso", "Ramos", "Gonçalves", "Santana", "Teixeira", "Araújo", "Brito", "Castro", "Correia", "Cavalcanti",
+    "Monteiro", "Moura", "Barros", "Pinto", "Campos", "Farias", "Batista", "Assunção", "Magalhães", "Conceição",
+)
+
+CIDADES = (
+    ("São Paulo", "SP"), ("Rio de Janeiro", "RJ"), ("Belo Horizonte", "MG"), ("Salvador", "BA"),
+    ("Fortaleza", "CE"), ("Recife", "PE"), ("Porto Alegre", "RS"), ("Curitiba", "PR"), ("Londrina", "PR"),
+    ("Manaus", "AM"), ("Belém", "PA"), ("Goiânia", "GO"), ("Florianópolis", "SC"), ("Natal", "RN"),
+    ("João Pessoa", "PB"), ("Campinas", "SP"), ("Vitória", "ES"), ("São Luís", "MA"), ("Teresina", "PI"),
+)
+
+LOGRADOUROS = ("Rua", "Avenida", "Travessa", "Alameda", "Praça")
+
+ESPECIALIDADES = (
+    "Clínica Geral", "Pediatria", "Cardiologia", "Dermatologia", "Ginecologia", "Ortopedia", "Oftalmologia",
+    "Psiquiatria", "Neurologia", "Endocrinologia", "Otorrinolaringologia", "Urologia", "Gastroenterologia",
+)
+
+# Duração das consultas, com a de 30 minutos mais frequente
+DURACOES = (20, 30, 30, 30, 40, 60)
+
+# Períodos de atendimento da manhã e da tarde
+TURNOS = (
+    (time(7, 0), time(11, 0), time(13, 0), time(17, 0)),
+    (time(8, 0), time(12, 0), time(13, 0), time(17, 0)),
+    (time(8, 0), time(12, 0), time(14, 0), time(18, 0)),
+    (time(9, 0), time(12, 0), time(13, 0), time(19, 0)),
+)
+
+TAMANHO_LOTE_AGENDAMENTOS = 50000
+
+def gerar_nome(aleatorio, nomes):
+    """Gera um nome com um ou dois prenomes da lista e dois sobrenomes, às vezes ligados por 'de'"""
+    partes = [aleatorio.choice(nomes)]
+    if aleatorio.random() < 0.2:
+        partes.append(aleatorio.choice(nomes))
+    partes.append(aleatorio.choice(SOBRENOMES))
+    if aleatorio.random() < 0.3:
+        partes.append("de")
+    partes.append(aleatorio.choice(SOBRENOMES))
+    return " ".join(partes)
+
+def gerar_email(nome, numero, dominio):
+    """Gera o email a partir do primeiro e do último nome, sem acentos, com o número que o torna único"""
+    partes = unicodedata.normalize("NFKD", nome).encode("ascii", "ignore").decode().lower().split()
+    return f"{partes[0]}.{partes[-1]}{numero}@{dominio}"
+
+def gerar_cpf(numero):
+    """Gera um CPF formatado e com os dígitos verificadores válidos, único para cada número menor que 10^9"""
+    # Espalha os números sequenciais por toda a faixa de CPFs; o multiplicador é primo com 10^9
+    digitos = [int(digito) for digito in f"{(numero * 7919 + 123456789) % 10 ** 9:09d}"]
+    for tamanho in (9, 10):
+        soma = sum(digito * peso for digito, peso in zip(digitos, range(tamanho + 1, 1, -1)))
+        digitos.append(soma * 10 % 11 % 10)
+    texto = "".join(map(str, digitos))
+    return f"{texto[:3]}.{texto[3:6]}.{texto[6:9]}-{texto[9:]}"
+
+def gerar_endereco(aleatorio):
+    """Gera um endereço no formato dos cadastros, como 'Rua Brandão Borges, 689, Londrina - PR'"""
+    cidade, uf = aleatorio.choice(CIDADES)
+    nome = aleatorio.choice(NOMES_FEMININOS + NOMES_MASCULINOS)
+    logradouro = f"{aleatorio.choice(LOGRADOUROS)} {nome} {aleatorio.choice(SOBRENOMES)}"
+    return f"{logradouro}, {aleatorio.randint(1, 3000)}, {cidade} - {uf}"
+
+def _minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+def _slots(turno, duracao):
+    # Minutos de início das consultas que cabem inteiras em cada período do turno
+    inicio_manha, fim_manha, inicio_tarde, fim_tarde = map(_minutos, turno)
+    return [minuto for inicio, fim in ((inicio_manha, fim_manha), (inicio_tarde, fim_tarde))
+            for minuto in range(inicio, fim - duracao + 1, duracao)]
+
+def _importar(funcao, registros, descricao):
+    # A importação em lote devolve os erros em vez de levantá-los; o banco semeado precisa de todos os registros
+    resultado = funcao(registros)
+    if resultado["erros"]:
+        raise RuntimeError(f"{len(resultado['erros'])} {descricao} recusados, o primeiro: {resultado['erros'][0]}")
+    return resultado["importados"]
+
+def _em_lotes(iteravel, tamanho):
+    iterador = iter(iteravel)
+    while lote := list(islice(iterador, tamanho)):
+        yield lote
+
+def semear(medicos, pacientes, agendamentos, dias, data_inicio, semente=42):
+    """
+    Popula o banco configurado, que deve estar sem médicos e pacientes, retornando as quantidades inseridas e o
+    período dos agendamentos.
+
+    Levanta ValueError se os dias de atendimento dos médicos no período não comportarem os agendamentos pedidos.
+    """
+    from sqlalchemy import func, insert
+
+    from agenda import DIAS_SEMANA
+    from importacao import importar_horarios, importar_medicos, importar_pacientes
+    from model import Agendamento, Contador, Medico, Paciente, inicializar_banco, unidade_de_trabalho
+
+    inicializar_banco()
+    with unidade_de_trabalho() as session:
+        if session.query(func.count(Medico.id)).scalar() or session.query(func.count(Paciente.id)).scalar():
+            raise ValueError("O banco já tem médicos ou pacientes; a semeadura deve partir de um banco vazio.")
+
+    aleatorio = random.Random(semente)
+
+    # Médicos com a especialidade, a duração da consulta, o turno e os dias da semana em que atendem
+    cadastros_medicos = []
+    agendas_medicos = []
+    for numero in range(1, medicos + 1):
+        feminino = aleatorio.random() < 0.5
+        nome = gerar_nome(aleatorio, NOMES_FEMININOS if feminino else NOMES_MASCULINOS)
+        duracao = aleatorio.choice(DURACOES)
+        turno = aleatorio.choice(TURNOS)
+        dias_semana = list(range(5))
+        if aleatorio.random() < 0.2:
+            dias_semana.remove(aleatorio.randrange(5))
+        if aleatorio.random() < 0.1:
+            dias_semana.append(5)
+        cadastros_medicos.append({
+            "nome": f"Dra. {nome}" if feminino else f"Dr. {nome}",
+            "email": gerar_email(nome, numero, "medicos.exemplo.com.br"),
+            "especialidade": aleatorio.choice(ESPECIALIDADES), "crm": str(100000 + numero), "duracao_consulta": duracao
+        })
+        agendas_medicos.append((numero, duracao, turno, dias_semana))
+
+    _importar(importar_medicos, cadastros_medicos, "médicos")
+    _importar(importar_horarios, [
+        {"medico_id": medico_id, "dia_semana": DIAS_SEMANA[dia_semana],
+         "hora_inicio_manha": turno[0].strftime("%H:%M"), "hora_fim_manha": turno[1].strftime("%H:%M"),
+         "hora_inicio_tarde": turno[2].strftime("%H:%M"), "hora_fim_tarde": turno[3].strftime("%H:%M")}
+        for medico_id, _, turno, dias_semana in agendas_medicos for dia_semana in dias_semana
+    ], "horários")
+
+    _importar(importar_pacientes, (
+        {"nome": nome, "email": gerar_email(nome, numero, "exemplo.com.br"), "cpf": gerar_cpf(numero),
+         "endereco": gerar_endereco(aleatorio)}
+        for numero, nome in (
+            (numero, gerar_nome(aleatorio, aleatorio.choice((NOMES_FEMININOS, NOMES_MASCULINOS))))
+            for numero in range(1, pacientes + 1)
+        )
+    ), "pacientes")
+
+    # Dias de atendimento de cada médico no período, com os horários de início das consultas
+    datas = [data_inicio + timedelta(days=dia) for dia in range(dias)]
+    dias_atendimento = [
+        (medico_id, data, duracao, slots)
+        for medico_id, duracao, turno, dias_semana in agendas_medicos
+        for slots in (_slots(turno, duracao),)
+        for data in datas if data.weekday() in dias_semana
+    ]
+    capacidade = sum(len(slots) for *_, slots in dias_atendimento)
+    if agendamentos > capacidade:
+        raise ValueError(f"Os {len(dias_atendimento)} dias de atendimento comportam até {capacidade} agendamentos; "
+                         "aumente --dias ou --medicos.")
+
+    def gerar_agendamentos():
+        # Distribui os agendamentos pelos dias em proporção aos slots, com os horários sorteados em cada dia
+        pedidos = 0.0
+        distribuidos = 0
+        for medico_id, data, duracao, slots in dias_atendimento:
+            pedidos += agendamentos * len(slots) / capacidade
+            quantidade = min(round(pedidos) - distribuidos, len(slots))
+            distribuidos += quantidade
+            meia_noite = datetime.combine(data, time.min)
+            for minuto in aleatorio.sample(slots, quantidade):
+                inicio = meia_noite + timedelta(minutes=minuto)
+                yield {"medico_id": medico_id, "paciente_id": aleatorio.randint(1, pacientes), "inicio": inicio,
+                       "fim": inicio + timedelta(minutes=duracao), "status": "confirmado"}
+
+    # Cada lote é gravado em sua própria transação, com a contagem dos dias somada ao final
+    por_dia = Counter()
+    for lote in _em_lotes(gerar_agendamentos(), TAMANHO_LOTE_AGENDAMENTOS):
+        with unidade_de_trabalho() as session:
+            session.execute(insert(Agendamento), lote)
+        por_dia.update(agendamento["inicio"].date() for agendamento in lote)
+
+    with unidade_de_trabalho() as session:
+        for data, quantidade in por_dia.items():
+            Contador.incrementar(session, Contador.chave_agendamentos(data), quantidade)
+
+    return {"medicos": medicos, "pacientes": pacientes, "agendamentos": sum(por_dia.values()),
+            "data_inicio": data_inicio, "data_fim": data_inicio + timedelta(days=dias - 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--banco", help="arquivo SQLite a popular (padrão: o banco da aplicação)")
+    parser.add_argument("--medicos", type=int, default=500)
+    parser.add_argument("--pacientes", type=int, default=100000)
+    parser.add_argument("--agendamentos", type=int, default=1000000)
+    parser.add_argument("--dias", type=int, default=365, help="dias do período dos agendamentos")
+    parser.add_argument("--data-inicio", type=date.fromisoformat,
+                        help="primeiro dia do período (padrão: metade dos dias antes de hoje)")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.banco:
+        os.environ["MEDMEET_DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.banco)}"
+    data_inicio = args.data_inicio or date.today() - timedelta(days=args.dias // 2)
+
+    logging.disable(logging.CRITICAL)
+    inicio = relogio.perf_counter()
+    try:
+        resultado = semear(args.medicos, args.pacientes, args.agendamentos, args.dias, data_inicio, args.semente)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    print(f"{resultado['medicos']} médicos, {resultado['pacientes']} pacientes e {resultado['agendamentos']} "
+          f"agendamentos de {resultado['data_inicio']} a {resultado['data_fim']} "
+          f"em {relogio.perf_counter() - inicio:.1f} s")
+
+if __name__ == "__main__":
+    main()
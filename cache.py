@@ -0,0 +1,134 @@
+from collections import OrderedDict
+import threading
+import time
+import uuid
+
+import config
+
+
+class CacheLRU:
+    """Cache em memória com tamanho máximo, que descarta a chave usada há mais tempo e as chaves expiradas"""
+
+    def __init__(self, tamanho_maximo):
+        self.tamanho_maximo = tamanho_maximo
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        """Retorna o valor da chave, ou None se não estiver no cache ou tiver expirado"""
+        with self._trava:
+            if chave not in self._itens:
+                return None
+            valor, expira_em = self._itens[chave]
+            if expira_em is not None and expira_em <= time.monotonic():
+                del self._itens[chave]
+                return None
+            # Marca a chave como usada mais recentemente
+            self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor, ttl=None):
+        """Guarda o valor da chave por `ttl` segundos, descartando a mais antiga se o cache estiver cheio"""
+        expira_em = time.monotonic() + ttl if ttl else None
+        with self._trava:
+            self._itens[chave] = (valor, expira_em)
+            self._itens.move_to_end(chave)
+            if len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+
+    def invalidar(self, chave):
+        """Remove a chave do cache"""
+        with self._trava:
+            self._itens.pop(chave, None)
+
+    def limpar(self):
+        """Remove todas as chaves do cache"""
+        with self._trava:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+class CacheRedis:
+    """
+    Cache compartilhado entre os processos, guardado em um servidor compatível com Redis.
+
+    Recebe qualquer cliente com os métodos `get`, `set` e `delete` do redis-py, o que permite usar
+    um cliente falso local no lugar do servidor.
+    """
+
+    def __init__(self, cliente, prefixo="medmeet:"):
+        self.cliente = cliente
+        self.prefixo = prefixo
+
+    def obter(self, chave):
+        """Retorna o valor da chave, ou None se não estiver no cache ou tiver expirado"""
+        valor = self.cliente.get(self.prefixo + chave)
+        return valor.decode() if isinstance(valor, bytes) else valor
+
+    def guardar(self, chave, valor, ttl=None):
+        """Guarda o valor da chave por `ttl` segundos; o servidor aplica a expiração e o descarte"""
+        self.cliente.set(self.prefixo + chave, valor, ex=ttl or None)
+
+    def invalidar(self, chave):
+        """Remove a chave do cache"""
+        self.cliente.delete(self.prefixo + chave)
+
+
+def criar_cache(url, tamanho_maximo):
+    """Cria o cache em memória do processo ou, se uma URL redis:// for informada, o cache compartilhado"""
+    if not url:
+        return CacheLRU(tamanho_maximo)
+
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("O pacote redis é necessário para usar um cache compartilhado")
+    return CacheRedis(redis.Redis.from_url(url))
+
+
+# Resolução de nome para id usada no cadastro de agendamentos
+ids_pacientes_por_nome = CacheLRU(config.CACHE_NOMES_TAMANHO)
+ids_medicos_por_nome = CacheLRU(config.CACHE_NOMES_TAMANHO)
+
+# Agendas diárias dos médicos já serializadas
+agendas = criar_cache(config.CACHE_AGENDA_URL, config.CACHE_AGENDA_TAMANHO)
+
+# Versões dos horários de cada médico e dos agendamentos de cada dia, usadas nas chaves das agendas. Ficam fora do
+# cache das agendas para que o uso das agendas não as descarte, e sobrevivem às agendas guardadas com elas
+versoes = criar_cache(config.CACHE_AGENDA_URL, config.CACHE_AGENDA_TAMANHO)
+_TTL_VERSAO = 2 * config.CACHE_AGENDA_TTL
+
+def _versao(chave):
+    # Uma versão descartada ou expirada dá lugar a uma nova; voltar a um valor fixo tornaria a ler as agendas
+    # guardadas antes da primeira alteração
+    return versoes.obter(chave) or _nova_versao(chave)
+
+def _nova_versao(chave):
+    versao = uuid.uuid4().hex
+    versoes.guardar(chave, versao, _TTL_VERSAO)
+    return versao
+
+def versoes_agenda(medico_id, data):
+    """Retorna as versões atuais dos horários do médico e dos agendamentos do dia"""
+    return _versao(f"agenda:versao:{medico_id}"), _versao(f"agenda:versao:{medico_id}:{data.isoformat()}")
+
+def chave_agenda(medico_id, data, versoes=None):
+    """
+    Monta a chave da agenda do médico no dia, com as versões atuais dos horários do médico e dos agendamentos do dia.
+
+    Cada alteração troca a versão, então a chave muda e uma agenda gerada antes da alteração não é mais lida,
+    mesmo que tenha sido guardada depois dela. `versoes` são as versões já lidas com versoes_agenda; sem elas,
+    as versões são lidas do cache.
+    """
+    versao_horarios, versao_dia = versoes or versoes_agenda(medico_id, data)
+    return f"agenda:{medico_id}:{data.isoformat()}:{versao_horarios}:{versao_dia}"
+
+def invalidar_agenda_dia(medico_id, data):
+    """Invalida a agenda do médico no dia, após uma alteração nos agendamentos do dia, e retorna a nova versão do dia"""
+    return _nova_versao(f"agenda:versao:{medico_id}:{data.isoformat()}")
+
+def invalidar_agendas_medico(medico_id):
+    """Invalida todas as agendas do médico, após uma alteração nos horários de atendimento"""
+    _nova_versao(f"agenda:versao:{medico_id}")
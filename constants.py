@@ -4,3 +4,4 @@ class ErrorMessages:
     ERRO_EMAIL_DUPLICADO = "Erro ao cadastrar, email já está em uso"
     ERRO_DADOS_INVALIDOS = "Erro ao cadastrar, dados inválidos"
     ERRO_INESPERADO = "Erro inesperado ao cadastrar"
+    ERRO_HORARIO_OCUPADO = "Erro ao agendar, o médico já possui um agendamento neste horário"
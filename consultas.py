@@ -0,0 +1,353 @@
+from datetime import datetime, timedelta
+from itertools import islice
+from sqlalchemy import Integer, and_, func, or_, text
+from sqlalchemy.orm import aliased, contains_eager
+import heapq
+import re
+import unicodedata
+
+from agenda import gerar_agendas_periodo
+from constants import ErrorMessages
+from disponibilidade import obter_disponibilidades
+from filtros import filtro_a_partir_de, filtro_ate, filtro_dia, filtro_periodo
+from logger import obter_logger
+from model import Agendamento, HorarioMedico, Medico, Paciente, Usuario
+from serializacao import linhas_para_dicionarios, serializar
+
+logger = obter_logger(__name__)
+
+# Colunas usadas na geração das agendas, carregadas como linhas em vez de instâncias do ORM
+_COLUNAS_HORARIO = (
+    HorarioMedico.medico_id,
+    HorarioMedico.dia_semana,
+    HorarioMedico.hora_inicio_manha,
+    HorarioMedico.hora_fim_manha,
+    HorarioMedico.hora_inicio_tarde,
+    HorarioMedico.hora_fim_tarde
+)
+_COLUNAS_AGENDAMENTO = (Agendamento.medico_id, Agendamento.inicio, Agendamento.fim, Agendamento.id)
+
+
+# Quantidade máxima de nomes encontrados, dos mais curtos para os mais longos, considerados na busca textual do SQLite
+CANDIDATOS_BUSCA_NOME = 500
+
+# Indica, por banco, se o índice de busca textual do SQLite foi criado
+_busca_textual_sqlite = {}
+
+def _possui_busca_textual_sqlite(session):
+    url = str(session.get_bind().url)
+    if url not in _busca_textual_sqlite:
+        _busca_textual_sqlite[url] = session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'usuario_busca'")
+        ).first() is not None
+    return _busca_textual_sqlite[url]
+
+def filtrar_por_nome(session, consulta, coluna_usuario_id, nome):
+    """
+    Filtra a consulta pelos usuários cujo nome corresponde a `nome`, dos mais relevantes para os menos relevantes.
+
+    Usa o índice FTS5 no SQLite e o índice de trigramas no PostgreSQL, ignorando acentos e maiúsculas.
+    Em outros bancos, ou se o índice não existir, recorre a um ILIKE sobre o nome.
+    """
+    dialeto = session.get_bind().dialect.name
+
+    if dialeto == 'sqlite' and _possui_busca_textual_sqlite(session):
+        # Cada palavra digitada é buscada como prefixo de uma palavra do nome
+        palavras = re.findall(r"\w+", nome)
+        if not palavras:
+            return consulta.filter(False)
+
+        # Nomes mais curtos ficam primeiro, pois as palavras digitadas cobrem mais do nome. Os candidatos já são
+        # ordenados assim antes do limite, para que os mais relevantes nunca fiquem de fora; o limite mantém
+        # pequena a junção com a consulta em termos curtos e frequentes
+        busca = text(
+            "SELECT usuario_busca.rowid AS usuario_id FROM usuario_busca "
+            "JOIN usuario ON usuario.id = usuario_busca.rowid WHERE usuario_busca MATCH :termos "
+            "ORDER BY length(usuario.nome), usuario.id LIMIT :candidatos"
+        ).bindparams(termos=" ".join(f'"{palavra}"*' for palavra in palavras), candidatos=CANDIDATOS_BUSCA_NOME) \
+            .columns(usuario_id=Integer).subquery('busca')
+
+        return consulta.join(busca, busca.c.usuario_id == coluna_usuario_id) \
+            .order_by(func.length(Usuario.nome), busca.c.usuario_id)
+
+    if dialeto == 'postgresql':
+        termo = unicodedata.normalize("NFKD", nome).encode("ascii", "ignore").decode("ascii").lower()
+        nome_normalizado = func.imutavel_unaccent(func.lower(Usuario.nome))
+        return consulta.filter(nome_normalizado.contains(termo, autoescape=True)) \
+            .order_by(func.similarity(nome_normalizado, termo).desc(), Usuario.id)
+
+    return consulta.filter(Usuario.nome.ilike(f"%{nome}%"))
+
+class AgendamentoConflitanteError(Exception):
+    """Indica que o agendamento se sobrepõe a outro agendamento confirmado do mesmo médico"""
+
+def buscar_agendamento_conflitante(session, agendamento):
+    """
+    Busca outro agendamento confirmado do mesmo médico que se sobreponha ao período do agendamento.
+
+    Considera que nenhuma consulta dura mais de um dia, o que limita a busca ao índice (medico_id, inicio).
+    """
+    return session.query(Agendamento.id).filter(
+        Agendamento.medico_id == agendamento.medico_id,
+        Agendamento.status == 'confirmado',
+        Agendamento.id != agendamento.id,
+        Agendamento.inicio > agendamento.inicio - timedelta(days=1),
+        Agendamento.inicio < agendamento.fim,
+        Agendamento.fim > agendamento.inicio
+    ).first()
+
+def resolver_id_por_nome(session, modelo, nome, cache):
+    """
+    Resolve o id do médico ou paciente com o nome informado, consultando o cache antes do banco.
+
+    Havendo homônimos, retorna o de menor id. Nomes não encontrados não são guardados, para que um cadastro
+    feito por outro processo seja encontrado na próxima tentativa.
+    """
+    id_cache = cache.obter(nome)
+    if id_cache is not None:
+        return id_cache
+
+    id_encontrado = session.query(modelo.id).join(Usuario, modelo.usuario_id == Usuario.id) \
+        .filter(Usuario.nome == nome).order_by(modelo.id).limit(1).scalar()
+    if id_encontrado is not None:
+        cache.guardar(nome, id_encontrado)
+    return id_encontrado
+
+# Colunas únicas e a mensagem de cada uma, como aparecem na violação do SQLite (tabela.coluna) e na do PostgreSQL,
+# que cita a restrição criada pelo unique=True (tabela_coluna_key)
+_MENSAGENS_UNICIDADE = (
+    (("usuario.email", "usuario_email_key"), ErrorMessages.ERRO_EMAIL_DUPLICADO),
+    (("medico.crm", "medico_crm_key"), ErrorMessages.ERRO_CRM_DUPLICADO),
+    (("paciente.cpf", "paciente_cpf_key"), ErrorMessages.ERRO_CPF_DUPLICADO),
+)
+
+def mensagem_unicidade_violada(erro):
+    """Retorna a mensagem de erro da coluna única violada em um IntegrityError do cadastro"""
+    texto = str(erro.orig)
+    for colunas, mensagem in _MENSAGENS_UNICIDADE:
+        if any(coluna in texto for coluna in colunas):
+            return mensagem
+    return ErrorMessages.ERRO_DADOS_INVALIDOS
+
+def selecionar_campos(campos_disponiveis, fields):
+    """
+    Resolve os campos pedidos em `fields` para as colunas correspondentes.
+
+    O `id` é sempre incluído, pois é a chave usada na paginação.
+    """
+    if not fields:
+        return dict(campos_disponiveis)
+
+    nomes = [nome.strip() for nome in fields.split(',') if nome.strip()]
+    invalidos = [nome for nome in nomes if nome not in campos_disponiveis]
+    if invalidos:
+        raise ValueError(f"Campos inválidos: {', '.join(invalidos)}")
+
+    if 'id' not in nomes:
+        nomes.insert(0, 'id')
+
+    return {nome: campos_disponiveis[nome] for nome in nomes}
+
+def paginar_por_id(query, coluna_id, cursor, limite):
+    """
+    Aplica paginação por chave (keyset) sobre a coluna de ID.
+
+    Retorna as linhas da página e o cursor da próxima página, ou None quando não há mais linhas.
+    """
+    if cursor is not None:
+        query = query.filter(coluna_id > cursor)
+
+    # Busca uma linha a mais para saber se existe uma próxima página
+    linhas = query.order_by(coluna_id).limit(limite + 1).all()
+    if len(linhas) <= limite:
+        return linhas, None
+
+    linhas = linhas[:limite]
+    return linhas, linhas[-1].id
+
+def listar_pagina(session, modelo, campos_disponiveis, query):
+    """
+    Lista uma página de médicos ou pacientes com os campos pedidos em `query.fields`.
+
+    Retorna as linhas convertidas para dicionários e o cursor da próxima página.
+    """
+    # Seleciona apenas as colunas pedidas
+    campos = selecionar_campos(campos_disponiveis, query.fields)
+    consulta = session.query(*[coluna.label(nome) for nome, coluna in campos.items()]) \
+        .select_from(modelo).join(modelo.usuario)
+
+    # Lista a página a partir do cursor
+    linhas, proximo_cursor = paginar_por_id(consulta, modelo.id, query.cursor, query.limit)
+    return linhas_para_dicionarios(linhas), proximo_cursor
+
+def _ler_cursor_agendamento(cursor):
+    # O cursor é o início e o id do último agendamento da página anterior, como "2024-08-25T14:30:00_15"
+    inicio, _, agendamento_id = cursor.rpartition("_")
+    try:
+        return datetime.fromisoformat(inicio), int(agendamento_id)
+    except ValueError:
+        raise ValueError("Cursor inválido.")
+
+def listar_agendamentos(session, coluna_dono, dono_id, query):
+    """
+    Lista uma página dos agendamentos de um paciente ou de um médico, em ordem de início.
+
+    `coluna_dono` é Agendamento.paciente_id ou Agendamento.medico_id. Os agendamentos vêm com os usuários do
+    paciente e do médico na mesma consulta, que percorre o índice (coluna_dono, inicio) e pagina pela chave
+    (inicio, id). Retorna os agendamentos e o cursor da próxima página, ou None quando não há mais páginas.
+    """
+    # Valida o período informado
+    data_inicio = datetime.strptime(query.data_inicio, '%Y-%m-%d').date() if query.data_inicio else None
+    data_fim = datetime.strptime(query.data_fim, '%Y-%m-%d').date() if query.data_fim else None
+    if data_inicio and data_fim and data_fim < data_inicio:
+        raise ValueError("A data final deve ser igual ou posterior à data inicial.")
+
+    # Carrega o paciente, o médico e os usuários de cada um pelos joins, sem consultas adicionais
+    usuario_paciente = aliased(Usuario)
+    usuario_medico = aliased(Usuario)
+    consulta = session.query(Agendamento) \
+        .join(Agendamento.paciente).join(Paciente.usuario.of_type(usuario_paciente)) \
+        .join(Agendamento.medico).join(Medico.usuario.of_type(usuario_medico)) \
+        .options(
+            contains_eager(Agendamento.paciente).contains_eager(Paciente.usuario.of_type(usuario_paciente)),
+            contains_eager(Agendamento.medico).contains_eager(Medico.usuario.of_type(usuario_medico))
+        ).filter(coluna_dono == dono_id)
+
+    # Aplica os filtros de período e de status
+    if data_inicio and data_fim:
+        consulta = consulta.filter(filtro_periodo(Agendamento.inicio, data_inicio, data_fim))
+    elif data_inicio:
+        consulta = consulta.filter(filtro_a_partir_de(Agendamento.inicio, data_inicio))
+    elif data_fim:
+        consulta = consulta.filter(filtro_ate(Agendamento.inicio, data_fim))
+    if query.status:
+        consulta = consulta.filter(Agendamento.status.in_([status.strip() for status in query.status.split(',') if status.strip()]))
+
+    # Continua depois do último agendamento da página anterior
+    if query.cursor:
+        inicio, agendamento_id = _ler_cursor_agendamento(query.cursor)
+        consulta = consulta.filter(or_(
+            Agendamento.inicio > inicio,
+            and_(Agendamento.inicio == inicio, Agendamento.id > agendamento_id)
+        ))
+
+    # Busca um agendamento a mais para saber se existe uma próxima página
+    agendamentos = consulta.order_by(Agendamento.inicio, Agendamento.id).limit(query.limit + 1).all()
+    if len(agendamentos) <= query.limit:
+        return agendamentos, None
+
+    agendamentos = agendamentos[:query.limit]
+    return agendamentos, f"{agendamentos[-1].inicio.isoformat()}_{agendamentos[-1].id}"
+
+def carregar_agenda_dia(session, medico_id, data, versoes=None):
+    """
+    Gera a agenda de um médico para um dia, a partir dos horários de atendimento e dos agendamentos do dia.
+
+    A disponibilidade do dia é lida da memória enquanto os horários do médico e os agendamentos do dia não mudarem.
+    `versoes` são as versões da agenda já lidas com versoes_agenda; sem elas, são lidas do cache.
+    """
+    # Verifica se o médico existe e obtém a disponibilidade do dia
+    versoes_medico = {medico_id: versoes} if versoes is not None else None
+    disponibilidade = obter_disponibilidades(session, [medico_id], data, versoes_medico).get(medico_id)
+    if disponibilidade is None:
+        raise ValueError("Médico não encontrado.")
+
+    logger.debug("Períodos de atendimento do médico %s em %s: %s", medico_id, data, disponibilidade.periodos)
+
+    # Gera a agenda completa do médico, combinando horários e agendamentos
+    return disponibilidade.agenda()
+
+def carregar_agendas_periodo(session, query):
+    """
+    Gera as agendas dos médicos de `query.medico_ids` para cada dia do período, com uma consulta por tabela.
+
+    Aceita no máximo 31 dias e 100 médicos por busca.
+    """
+    # Valida os médicos e o período informados
+    medico_ids = list(dict.fromkeys(int(medico_id) for medico_id in query.medico_ids.split(',') if medico_id.strip()))
+    data_inicio = datetime.strptime(query.data_inicio, '%Y-%m-%d').date()
+    data_fim = datetime.strptime(query.data_fim, '%Y-%m-%d').date()
+    if not medico_ids or len(medico_ids) > 100:
+        raise ValueError("Informe entre 1 e 100 médicos.")
+    if data_fim < data_inicio or (data_fim - data_inicio).days >= 31:
+        raise ValueError("O período deve ter entre 1 e 31 dias.")
+
+    datas = [data_inicio + timedelta(days=dias) for dias in range((data_fim - data_inicio).days + 1)]
+
+    # Busca os médicos, os horários e os agendamentos do período
+    medicos = session.query(Medico.id, Medico.duracao_consulta).filter(Medico.id.in_(medico_ids)).all()
+    nao_encontrados = set(medico_ids) - {medico.id for medico in medicos}
+    if nao_encontrados:
+        raise ValueError(f"Médicos não encontrados: {', '.join(str(medico_id) for medico_id in sorted(nao_encontrados))}")
+
+    horarios = session.query(*_COLUNAS_HORARIO).filter(HorarioMedico.medico_id.in_(medico_ids)).all()
+    agendamentos = session.query(*_COLUNAS_AGENDAMENTO).filter(
+        Agendamento.medico_id.in_(medico_ids),
+        filtro_periodo(Agendamento.inicio, data_inicio, data_fim)
+    ).all()
+
+    # Gera as agendas em memória, na ordem dos médicos informados
+    duracoes = {medico.id: medico.duracao_consulta for medico in medicos}
+    return gerar_agendas_periodo(
+        [(medico_id, duracoes[medico_id]) for medico_id in medico_ids],
+        horarios,
+        agendamentos,
+        datas
+    )
+
+def buscar_horarios_livres(session, query, agora):
+    """
+    Busca os primeiros horários livres dos médicos de `query.especialidade`, em ordem de início.
+
+    Os dias do período são percorridos em ordem, com a disponibilidade de cada médico no dia lida da memória ou,
+    na primeira leitura, com uma consulta de agendamentos por dia. Os slots livres dos médicos no dia são combinados
+    com heapq.merge e a busca para ao encontrar `query.limit` horários, sem gerar os demais slots nem ler os dias
+    seguintes. Horários anteriores a `agora` são ignorados.
+    """
+    # Valida o período informado; sem datas, busca nos próximos 31 dias
+    data_inicio = datetime.strptime(query.data_inicio, '%Y-%m-%d').date() if query.data_inicio else agora.date()
+    data_fim = datetime.strptime(query.data_fim, '%Y-%m-%d').date() if query.data_fim else data_inicio + timedelta(days=30)
+    if data_fim < data_inicio or (data_fim - data_inicio).days >= 31:
+        raise ValueError("O período deve ter entre 1 e 31 dias.")
+
+    # Busca os médicos da especialidade
+    medicos = session.query(Medico.id, Usuario.nome).join(Medico.usuario) \
+        .filter(Medico.especialidade == query.especialidade).all()
+    nomes = {medico.id: medico.nome for medico in medicos}
+
+    # Dias já passados não têm horários livres
+    encontrados = []
+    data = max(data_inicio, agora.date())
+    while nomes and data <= data_fim and len(encontrados) < query.limit:
+        disponibilidades = obter_disponibilidades(session, list(nomes), data)
+
+        # Combina os slots livres dos médicos em ordem de início, gerando apenas os necessários
+        livres = heapq.merge(*(
+            disponibilidade.horarios_livres(medico_id, data, agora)
+            for medico_id, disponibilidade in disponibilidades.items()
+        ))
+        encontrados += islice(livres, query.limit - len(encontrados))
+
+        data += timedelta(days=1)
+
+    return [{
+        "medico_id": medico_id,
+        "medico_nome": nomes[medico_id],
+        "data": inicio.date().isoformat(),
+        "inicio": inicio.strftime('%H:%M'),
+        "fim": fim.strftime('%H:%M')
+    } for inicio, medico_id, fim in encontrados]
+
+def exportar_ndjson(session, consulta, tamanho_lote=1000):
+    """
+    Gera as linhas da consulta no formato NDJSON, uma por linha.
+
+    As linhas são buscadas do banco e enviadas em lotes de `tamanho_lote`, mantendo o consumo de memória constante.
+    A sessão é fechada ao final da exportação.
+    """
+    try:
+        linhas = iter(consulta.yield_per(tamanho_lote))
+        while lote := list(islice(linhas, tamanho_lote)):
+            yield b"".join(serializar(registro) + b"\n" for registro in linhas_para_dicionarios(lote))
+    finally:
+        session.close()
@@ -0,0 +1,140 @@
+"""
+Disponibilidade dos médicos por dia, mantida em memória para as leituras de agenda e a busca de horários livres.
+
+Cada dia de um médico é um DisponibilidadeDia, montado uma vez a partir dos horários de atendimento e dos
+agendamentos do dia e guardado com as versões usadas nas chaves das agendas (cache.versoes_agenda). Um novo
+horário troca a versão do médico, e os dias são remontados na próxima leitura; um novo agendamento é aplicado
+ao dia já montado, sem consultar o banco.
+"""
+from datetime import datetime, time, timedelta
+import threading
+
+import config
+from agenda import DisponibilidadeDia, periodos_horario
+from cache import CacheLRU, invalidar_agenda_dia, versoes_agenda
+from filtros import filtro_dia
+from model import Agendamento, HorarioMedico, Medico
+
+_MINUTO = timedelta(minutes=1)
+
+# Dias montados, por (medico_id, data, versão dos horários, versão do dia)
+_dias = CacheLRU(config.CACHE_DISPONIBILIDADE_TAMANHO)
+
+# Duração da consulta e períodos de cada dia da semana, por (medico_id, versão dos horários)
+_semanas = CacheLRU(config.CACHE_DISPONIBILIDADE_TAMANHO)
+
+# Serializa os registros de agendamentos do processo, que leem e trocam a versão do dia
+_trava = threading.Lock()
+
+def _minutos(inicio, fim, meia_noite):
+    # Minutos desde a meia-noite, arredondando o início para baixo e o fim para cima
+    return (inicio - meia_noite) // _MINUTO, -((meia_noite - fim) // _MINUTO)
+
+def _carregar_semanas(session, medico_ids, versoes):
+    """Retorna a duração da consulta e os períodos de cada dia da semana dos médicos encontrados"""
+    semanas = {}
+    faltantes = []
+    for medico_id in medico_ids:
+        semana = _semanas.obter((medico_id, versoes[medico_id][0]))
+        if semana is None:
+            faltantes.append(medico_id)
+        else:
+            semanas[medico_id] = semana
+
+    if not faltantes:
+        return semanas
+
+    # Busca os médicos e os horários em uma única consulta, na ordem em que os horários foram cadastrados
+    linhas = session.query(
+        Medico.id, Medico.duracao_consulta, HorarioMedico.dia_semana,
+        HorarioMedico.hora_inicio_manha, HorarioMedico.hora_fim_manha,
+        HorarioMedico.hora_inicio_tarde, HorarioMedico.hora_fim_tarde
+    ).outerjoin(HorarioMedico, HorarioMedico.medico_id == Medico.id) \
+        .filter(Medico.id.in_(faltantes)).order_by(Medico.id, HorarioMedico.id).all()
+
+    periodos = {}
+    duracoes = {}
+    for linha in linhas:
+        duracoes[linha.id] = linha.duracao_consulta
+        dias = periodos.setdefault(linha.id, [[] for _ in range(7)])
+        if linha.dia_semana is None:
+            continue
+        for hora_inicio, hora_fim in periodos_horario(linha):
+            # Ignora períodos não preenchidos
+            if hora_inicio is not None and hora_fim is not None:
+                dias[linha.dia_semana].append(
+                    (hora_inicio.hour * 60 + hora_inicio.minute, hora_fim.hour * 60 + hora_fim.minute)
+                )
+
+    for medico_id, dias in periodos.items():
+        semana = (duracoes[medico_id], tuple(tuple(periodos_dia) for periodos_dia in dias))
+        _semanas.guardar((medico_id, versoes[medico_id][0]), semana, config.CACHE_AGENDA_TTL)
+        semanas[medico_id] = semana
+
+    return semanas
+
+def obter_disponibilidades(session, medico_ids, data, versoes=None):
+    """
+    Retorna a disponibilidade de cada médico no dia, indexada pelo id; médicos não encontrados ficam de fora.
+
+    Os dias ainda não montados são carregados com no máximo duas consultas: médicos e horários, se também não
+    estiverem em memória, e os agendamentos do dia. `versoes` são as versões de cada médico já lidas com
+    versoes_agenda; a sessão assíncrona as lê antes do run_sync, já que o cache compartilhado faz E/S de rede.
+    """
+    # As versões são lidas antes do banco, então um dia montado durante uma alteração nunca é lido
+    if versoes is None:
+        versoes = {medico_id: versoes_agenda(medico_id, data) for medico_id in medico_ids}
+
+    disponibilidades = {}
+    faltantes = []
+    for medico_id in medico_ids:
+        dia = _dias.obter((medico_id, data) + versoes[medico_id])
+        if dia is None:
+            faltantes.append(medico_id)
+        else:
+            disponibilidades[medico_id] = dia
+
+    if not faltantes:
+        return disponibilidades
+
+    semanas = _carregar_semanas(session, faltantes, versoes)
+
+    # Busca os agendamentos do dia apenas dos médicos que atendem no dia da semana
+    meia_noite = datetime.combine(data, time.min)
+    agendamentos = {}
+    atendem = [medico_id for medico_id, (_, periodos) in semanas.items() if periodos[data.weekday()]]
+    if atendem:
+        for agendamento in session.query(Agendamento.medico_id, Agendamento.inicio, Agendamento.fim, Agendamento.id) \
+                .filter(Agendamento.medico_id.in_(atendem), filtro_dia(Agendamento.inicio, data)):
+            agendamentos.setdefault(agendamento.medico_id, []).append(
+                _minutos(agendamento.inicio, agendamento.fim, meia_noite) + (agendamento.id,)
+            )
+
+    for medico_id, (duracao_consulta, periodos) in semanas.items():
+        dia = DisponibilidadeDia(duracao_consulta, periodos[data.weekday()], agendamentos.get(medico_id, ()))
+        _dias.guardar((medico_id, data) + versoes[medico_id], dia, config.CACHE_AGENDA_TTL)
+        disponibilidades[medico_id] = dia
+
+    return disponibilidades
+
+def registrar_agendamento(medico_id, inicio, fim, agendamento_id):
+    """
+    Registra um agendamento já confirmado no banco, invalidando a agenda do médico no dia.
+
+    Se o dia estiver montado, o agendamento é aplicado a ele e o resultado é guardado com a nova versão do dia.
+    Com o cache compartilhado, um agendamento de outro processo entre a leitura e a troca da versão pode faltar
+    no dia deste processo até o fim do TTL; o banco continua recusando o horário ocupado.
+    """
+    data = inicio.date()
+    meia_noite = datetime.combine(data, time.min)
+    with _trava:
+        versao_horarios, versao_dia = versoes_agenda(medico_id, data)
+        nova_versao = invalidar_agenda_dia(medico_id, data)
+
+        dia = _dias.obter((medico_id, data, versao_horarios, versao_dia))
+        if dia is not None:
+            _dias.guardar(
+                (medico_id, data, versao_horarios, nova_versao),
+                dia.com_agendamento(*_minutos(inicio, fim, meia_noite), agendamento_id),
+                config.CACHE_AGENDA_TTL
+            )
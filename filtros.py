@@ -0,0 +1,30 @@
+"""
+Filtros de período sobre colunas de data e hora, compartilhados pelas consultas e pela disponibilidade em memória.
+
+Todos filtram a própria coluna por intervalos de dias, sem funções sobre ela, para que o banco use o índice da coluna.
+"""
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import and_
+
+
+def filtro_periodo(coluna, data_inicio, data_fim):
+    """
+    Filtra uma coluna de data e hora pelos dias de `data_inicio` a `data_fim`, inclusive.
+
+    O filtro é um intervalo semiaberto sobre a própria coluna, [data_inicio 00:00, data_fim + 1 dia 00:00),
+    para que o banco possa usar o índice da coluna.
+    """
+    return and_(filtro_a_partir_de(coluna, data_inicio), filtro_ate(coluna, data_fim))
+
+def filtro_a_partir_de(coluna, data):
+    """Filtra uma coluna de data e hora pelos registros a partir do início de `data`, usando o índice da coluna"""
+    return coluna >= datetime.combine(data, time.min)
+
+def filtro_ate(coluna, data):
+    """Filtra uma coluna de data e hora pelos registros até o fim de `data`, inclusive, usando o índice da coluna"""
+    return coluna < datetime.combine(data + timedelta(days=1), time.min)
+
+def filtro_dia(coluna, data):
+    """Filtra uma coluna de data e hora pelos registros de um único dia, usando o índice da coluna"""
+    return filtro_periodo(coluna, data, data)
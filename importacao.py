@@ -0,0 +1,255 @@
+from email_validator import EmailNotValidError, validate_email
+from email_validator.syntax import validate_email_local_part
+from functools import lru_cache
+from itertools import islice
+from pydantic import ValidationError, validator
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+import csv
+import io
+import json
+
+import config
+from agenda import numero_dia_semana
+from cache import ids_medicos_por_nome, ids_pacientes_por_nome, invalidar_agendas_medico
+from constants import ErrorMessages
+from logger import obter_logger
+from model import Usuario, Medico, Paciente, HorarioMedico, Contador, unidade_de_trabalho
+from schema import CadastrarMedicoSchema, CadastrarPacienteSchema, CadastrarHorarioSchema
+
+logger = obter_logger(__name__)
+
+# Formatos aceitos, pelo tipo do conteúdo ou pela extensão do arquivo enviado
+FORMATOS = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+    ".json": "json",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".csv": "csv",
+}
+
+@lru_cache(maxsize=4096)
+def _validar_dominio_email(dominio):
+    # Os registros de uma importação costumam repetir poucos domínios, cuja validação é a parte cara do email
+    validate_email(f"importacao@{dominio}", check_deliverability=False)
+
+def _validar_email(email):
+    """Valida e normaliza o email como o EmailStr dos cadastros individuais, validando cada domínio uma única vez"""
+    local, separador, dominio = email.strip().rpartition("@")
+    try:
+        if not separador or len(email.strip()) > 254:
+            raise EmailNotValidError()
+        validate_email_local_part(local)
+        _validar_dominio_email(dominio.lower())
+    except EmailNotValidError:
+        raise ValueError("value is not a valid email address")
+    return f"{local}@{dominio.lower()}"
+
+class _PacienteLoteSchema(CadastrarPacienteSchema):
+    email: str
+    _email = validator("email", allow_reuse=True)(_validar_email)
+
+class _MedicoLoteSchema(CadastrarMedicoSchema):
+    email: str
+    _email = validator("email", allow_reuse=True)(_validar_email)
+
+def ler_registros(requisicao):
+    """
+    Lê os registros enviados em uma lista JSON, em NDJSON ou em CSV com cabeçalho.
+
+    Aceita o conteúdo no corpo da requisição ou como o arquivo `arquivo` de um formulário multipart.
+    NDJSON e CSV são lidos linha a linha, sem carregar o arquivo inteiro na memória.
+    """
+    arquivo = requisicao.files.get("arquivo")
+    if arquivo:
+        extensao = "." + arquivo.filename.rsplit(".", 1)[-1].lower() if "." in (arquivo.filename or "") else ""
+        formato = FORMATOS.get(extensao) or FORMATOS.get(arquivo.mimetype)
+        fluxo = arquivo.stream
+    else:
+        formato = FORMATOS.get(requisicao.mimetype)
+        fluxo = requisicao.stream
+
+    if formato is None:
+        raise ValueError("Formato não suportado, envie uma lista JSON, NDJSON ou CSV.")
+
+    texto = io.TextIOWrapper(fluxo, encoding="utf-8-sig")
+
+    if formato == "json":
+        registros = json.load(texto)
+        if not isinstance(registros, list):
+            raise ValueError("O corpo deve ser uma lista de registros.")
+        return iter(registros)
+
+    if formato == "csv":
+        return csv.DictReader(texto)
+
+    return _ler_ndjson(texto)
+
+def _ler_ndjson(texto):
+    # Linhas com JSON inválido seguem como texto e são recusadas na validação do registro
+    for linha in texto:
+        if not linha.strip():
+            continue
+        try:
+            yield json.loads(linha)
+        except json.JSONDecodeError:
+            yield linha
+
+def _em_lotes(iteravel, tamanho):
+    iterador = iter(iteravel)
+    while lote := list(islice(iterador, tamanho)):
+        yield lote
+
+def _validar(schema, registro):
+    """Valida o registro com o schema do cadastro, exigindo todos os campos"""
+    if not isinstance(registro, dict):
+        raise ValueError("Registro inválido, esperado um objeto com os campos do cadastro.")
+
+    ausentes = [campo for campo in schema.__fields__ if registro.get(campo) in (None, "")]
+    if ausentes:
+        raise ValueError(f"Campos ausentes: {', '.join(ausentes)}")
+
+    try:
+        return schema(**registro)
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, erro['loc']))}: {erro['msg']}" for erro in e.errors()))
+
+def _validar_lote(schema, lote, erros):
+    # Retorna os registros válidos do lote com o número da linha, guardando o erro dos demais
+    validos = []
+    for numero, registro in lote:
+        try:
+            validos.append((numero, _validar(schema, registro)))
+        except ValueError as e:
+            erros.append({"linha": numero, "message": str(e)})
+    return validos
+
+def _gravar_usuarios(session, validos, modelo, campo_unico, erro_duplicado, campos, chave_contador):
+    # Grava os registros válidos do lote que ainda não estão em uso, retornando os aceitos e os erros dos demais
+    coluna_unica = getattr(modelo, campo_unico)
+    emails = [form.email for _, form in validos]
+    unicos = [getattr(form, campo_unico) for _, form in validos]
+    emails_usados = {email for email, in session.query(Usuario.email).filter(Usuario.email.in_(emails))}
+    unicos_usados = {valor for valor, in session.query(coluna_unica).filter(coluna_unica.in_(unicos))}
+
+    # Descarta os já cadastrados e as repetições dentro do próprio lote
+    aceitos = []
+    erros = []
+    for numero, form in validos:
+        if form.email in emails_usados:
+            erros.append({"linha": numero, "message": ErrorMessages.ERRO_EMAIL_DUPLICADO})
+        elif getattr(form, campo_unico) in unicos_usados:
+            erros.append({"linha": numero, "message": erro_duplicado})
+        else:
+            emails_usados.add(form.email)
+            unicos_usados.add(getattr(form, campo_unico))
+            aceitos.append(form)
+
+    if aceitos:
+        session.execute(insert(Usuario), [{"nome": form.nome, "email": form.email} for form in aceitos])
+        ids = dict(session.query(Usuario.email, Usuario.id).filter(Usuario.email.in_([form.email for form in aceitos])))
+        session.execute(insert(modelo), [
+            {**{campo: getattr(form, campo) for campo in campos}, "usuario_id": ids[form.email]}
+            for form in aceitos
+        ])
+        Contador.incrementar(session, chave_contador, len(aceitos))
+
+    return aceitos, erros
+
+def _importar_usuarios(registros, schema, modelo, campo_unico, erro_duplicado, campos, chave_contador, cache_nomes):
+    """
+    Importa médicos ou pacientes em lotes, cada um em sua própria transação.
+
+    Os duplicados de email e do campo único são descartados com uma consulta por lote, e usuários e cadastros
+    são inseridos com um único executemany cada.
+    """
+    importados = 0
+    erros = []
+
+    for lote in _em_lotes(enumerate(registros, start=1), config.IMPORTACAO_TAMANHO_LOTE):
+        validos = _validar_lote(schema, lote, erros)
+
+        # Repete o lote uma vez se um cadastro simultâneo violar a unicidade depois da verificação
+        for tentativa in range(2):
+            try:
+                with unidade_de_trabalho() as session:
+                    aceitos, erros_lote = _gravar_usuarios(
+                        session, validos, modelo, campo_unico, erro_duplicado, campos, chave_contador
+                    )
+            except IntegrityError as e:
+                logger.warning("Lote recusado por violação de unicidade, tentativa %s: %s", tentativa + 1, e.orig)
+                if tentativa:
+                    erros.extend({"linha": numero, "message": ErrorMessages.ERRO_DADOS_INVALIDOS} for numero, _ in validos)
+                continue
+
+            importados += len(aceitos)
+            erros.extend(erros_lote)
+            for form in aceitos:
+                cache_nomes.invalidar(form.nome)
+            break
+
+    return {"importados": importados, "erros": sorted(erros, key=lambda erro: erro["linha"])}
+
+def importar_pacientes(registros):
+    """Importa pacientes em lote, retornando o total importado e os erros de cada linha recusada"""
+    return _importar_usuarios(
+        registros, _PacienteLoteSchema, Paciente, "cpf", ErrorMessages.ERRO_CPF_DUPLICADO,
+        ("cpf", "endereco"), "pacientes", ids_pacientes_por_nome
+    )
+
+def importar_medicos(registros):
+    """Importa médicos em lote, retornando o total importado e os erros de cada linha recusada"""
+    return _importar_usuarios(
+        registros, _MedicoLoteSchema, Medico, "crm", ErrorMessages.ERRO_CRM_DUPLICADO,
+        ("especialidade", "crm", "duracao_consulta"), "medicos", ids_medicos_por_nome
+    )
+
+def importar_horarios(registros):
+    """Importa horários de atendimento em lote, retornando o total importado e os erros de cada linha recusada"""
+    importados = 0
+    erros = []
+
+    for lote in _em_lotes(enumerate(registros, start=1), config.IMPORTACAO_TAMANHO_LOTE):
+        validos = []
+        for numero, form in _validar_lote(CadastrarHorarioSchema, lote, erros):
+            try:
+                validos.append((numero, form, numero_dia_semana(form.dia_semana)))
+            except ValueError as e:
+                erros.append({"linha": numero, "message": str(e)})
+
+        with unidade_de_trabalho() as session:
+            # Verifica a existência dos médicos do lote com uma única consulta
+            medicos = {form.medico_id for _, form, _ in validos}
+            existentes = {medico_id for medico_id, in session.query(Medico.id).filter(Medico.id.in_(medicos))}
+
+            aceitos = []
+            for numero, form, dia_semana in validos:
+                if form.medico_id not in existentes:
+                    erros.append({"linha": numero, "message": "Médico não encontrado."})
+                    continue
+                aceitos.append({
+                    "dia_semana": dia_semana,
+                    "hora_inicio_manha": form.hora_inicio_manha,
+                    "hora_fim_manha": form.hora_fim_manha,
+                    "hora_inicio_tarde": form.hora_inicio_tarde,
+                    "hora_fim_tarde": form.hora_fim_tarde,
+                    "medico_id": form.medico_id
+                })
+
+            if aceitos:
+                session.execute(insert(HorarioMedico), aceitos)
+
+        importados += len(aceitos)
+
+        # Os novos horários mudam as agendas dos médicos do lote; o lote já está gravado, então uma falha do cache
+        # é apenas registrada
+        for medico_id in {horario["medico_id"] for horario in aceitos}:
+            try:
+                invalidar_agendas_medico(medico_id)
+            except Exception as e:
+                logger.error("Erro ao invalidar as agendas do médico %s no cache: %s", medico_id, e)
+
+    return {"importados": importados, "erros": sorted(erros, key=lambda erro: erro["linha"])}
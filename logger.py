@@ -1,71 +1,166 @@
-from logging.config import dictConfig
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
+import sys
+import threading
 
+import config
 
-log_path = "log/"
-# Verifica se o diretorio para armexanar os logs não existe
-if not os.path.exists(log_path):
-   # então cria o diretorio
-   os.makedirs(log_path)
 
+# Verifica se o diretorio para armazenar os logs não existe
+if not os.path.exists(config.LOG_DIRETORIO):
+    # então cria o diretorio
+    os.makedirs(config.LOG_DIRETORIO)
 
-dictConfig({
-    "version": 1,
-    "disable_existing_loggers": True,
-    "formatters": {
-        "default": {
-            "format": "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s",
-        },
-        "detailed": {
-            "format": "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s - call_trace=%(pathname)s L%(lineno)-4d",
-        }
-    },
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-            "formatter": "default",
-            "stream": "ext://sys.stdout",
-        },
-        # "email": {
-        #     "class": "logging.handlers.SMTPHandler",
-        #     "formatter": "default",
-        #     "level": "ERROR",
-        #     "mailhost": ("smtp.example.com", 587),
-        #     "fromaddr": "devops@example.com",
-        #     "toaddrs": ["receiver@example.com", "receiver2@example.com"],
-        #     "subject": "Error Logs",
-        #     "credentials": ("username", "password"),
-        # },
-        "error_file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "detailed",
-            "filename": "log/gunicorn.error.log",
-            "maxBytes": 10000,
-            "backupCount": 10,
-            "delay": "True",
-        },
-        "detailed_file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "detailed",
-            "filename": "log/gunicorn.detailed.log",
-            "maxBytes": 10000,
-            "backupCount": 10,
-            "delay": "True",
-        }
-    },
-    "loggers": {
-        "gunicorn.error": {
-            "handlers": ["console", "error_file"],  #, email],
-            "level": "INFO",
-            "propagate": False,
+# Formatos do modo texto
+FORMATO_PADRAO = "[%(asctime)s] %(levelname)-4s %(name)s %(funcName)s() L%(lineno)-4d %(message)s"
+FORMATO_DETALHADO = FORMATO_PADRAO + " - call_trace=%(pathname)s L%(lineno)-4d"
+
+# Atributos presentes em todo registro; os demais vêm do `extra` da chamada e são incluídos no JSON
+_ATRIBUTOS_REGISTRO = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+class FormatadorJSON(logging.Formatter):
+    """Formata cada registro como um objeto JSON em uma única linha"""
+
+    def format(self, record):
+        registro = {
+            "momento": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "modulo": record.name,
+            "funcao": record.funcName,
+            "linha": record.lineno,
+            "mensagem": record.getMessage(),
         }
-    },
-    "root": {
-        "handlers": ["console", "detailed_file"],
-        "level": "INFO",
-    }
-})
+        registro.update((chave, valor) for chave, valor in vars(record).items() if chave not in _ATRIBUTOS_REGISTRO)
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            registro["excecao"] = record.exc_text
+
+        return json.dumps(registro, ensure_ascii=False, default=str)
+
+def _formatador(formato_texto):
+    if config.LOG_FORMATO == "texto":
+        return logging.Formatter(formato_texto)
+    return FormatadorJSON()
+
+def _console():
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(_formatador(FORMATO_PADRAO))
+    return handler
+
+def _arquivo(nome):
+    handler = RotatingFileHandler(
+        os.path.join(config.LOG_DIRETORIO, nome),
+        maxBytes=config.LOG_ARQUIVO_TAMANHO_MB * 1024 * 1024,
+        backupCount=config.LOG_ARQUIVO_QUANTIDADE,
+        encoding="utf-8",
+        delay=True
+    )
+    handler.setFormatter(_formatador(FORMATO_DETALHADO))
+    return handler
+
+class _HandlerFila(QueueHandler):
+    """
+    Entrega os registros a uma fila limitada, esvaziada por uma thread que repassa os registros aos handlers.
+
+    A thread é iniciada no primeiro registro de cada processo, pois os workers criados por fork (gunicorn --preload)
+    não herdam as threads do processo pai. Com a fila cheia, o registro é descartado em vez de bloquear a requisição.
+    """
+
+    def __init__(self, *handlers):
+        super().__init__(queue.Queue(maxsize=config.LOG_FILA_TAMANHO))
+        self.handlers = handlers
+        self.listener = None
+        self.pid = None
+        self.descartados = 0
+        self.trava_listener = threading.Lock()
+
+    def prepare(self, record):
+        # Resolve a mensagem e o traceback na thread que registrou, pois os argumentos podem mudar depois
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.pid != os.getpid():
+            self.iniciar()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+    def iniciar(self):
+        """Inicia a thread do listener no processo atual, com uma fila nova"""
+        with self.trava_listener:
+            if self.pid == os.getpid():
+                return
+            # A fila herdada do processo pai pode conter registros que o próprio pai ainda vai escrever
+            self.queue = queue.Queue(maxsize=config.LOG_FILA_TAMANHO)
+            self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self.listener.start()
+            self.pid = os.getpid()
+
+    def reiniciar_apos_fork(self):
+        # No processo filho, a thread do pai não existe e a trava pode ter sido copiada fechada
+        self.trava_listener = threading.Lock()
+        self.listener = None
+        self.pid = None
+
+    def parar(self):
+        """Escreve os registros que ainda estão na fila e encerra a thread do listener deste processo"""
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self.pid = None
+        if self.descartados:
+            sys.stderr.write(f"{self.descartados} registros de log descartados com a fila cheia\n")
+
+_filas = []
+
+def _enfileirar(logger, *handlers):
+    """Troca os handlers do logger por uma fila, esvaziada por uma thread que repassa os registros aos handlers"""
+    handler = _HandlerFila(*handlers)
+    _filas.append(handler)
+    logger.handlers = [handler]
+
+def _reiniciar_apos_fork():
+    for handler in _filas:
+        handler.reiniciar_apos_fork()
+
+os.register_at_fork(after_in_child=_reiniciar_apos_fork)
+
+@atexit.register
+def _encerrar():
+    # Escreve os registros que ainda estão nas filas antes de encerrar o processo
+    for handler in _filas:
+        handler.parar()
+
+# As requisições apenas enfileiram os registros; console e arquivos são escritos pelas threads dos listeners
+_enfileirar(logging.getLogger(), _console(), _arquivo("gunicorn.detailed.log"))
+
+gunicorn = logging.getLogger("gunicorn.error")
+_enfileirar(gunicorn, _console(), _arquivo("gunicorn.error.log"))
+gunicorn.setLevel(logging.INFO)
+gunicorn.propagate = False
 
+# Nível geral e níveis por módulo
+logging.getLogger().setLevel(config.LOG_NIVEL)
+for _par in config.LOG_NIVEIS.split(","):
+    if _par.strip():
+        _modulo, _, _nivel = _par.partition("=")
+        logging.getLogger(_modulo.strip()).setLevel(_nivel.strip().upper())
 
-logger = logging.getLogger(__name__)
+def obter_logger(nome):
+    """Retorna o logger do módulo, com o nível definido em MEDMEET_LOG_NIVEIS ou o nível geral"""
+    return logging.getLogger(nome)
@@ -0,0 +1,212 @@
+from collections import Counter
+from itertools import accumulate
+import bisect
+import contextvars
+import threading
+import time
+
+import config
+from logger import obter_logger
+
+logger = obter_logger(__name__)
+
+
+class Histograma:
+    """Distribuição de durações em faixas fixas, com a contagem, a soma e o maior valor registrado"""
+
+    # Limites superiores das faixas, em milissegundos
+    LIMITES_MS = (0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self, limites=LIMITES_MS):
+        self.limites = limites
+        self.faixas = [0] * (len(limites) + 1)
+        self.contagem = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+        self._trava = threading.Lock()
+
+    def registrar(self, valor):
+        """Registra um valor, em milissegundos nos histogramas de duração"""
+        with self._trava:
+            self.faixas[bisect.bisect_left(self.limites, valor)] += 1
+            self.contagem += 1
+            self.soma += valor
+            self.maximo = max(self.maximo, valor)
+
+    def acumulado(self):
+        """Retorna a contagem acumulada até cada faixa, a contagem total e a soma, lidas ao mesmo tempo"""
+        with self._trava:
+            return list(accumulate(self.faixas)), self.contagem, self.soma
+
+    def percentil(self, percentual):
+        """Retorna o limite superior da faixa que contém o percentil, ou o maior valor se passar da última faixa"""
+        with self._trava:
+            if not self.contagem:
+                return 0.0
+            alvo = self.contagem * percentual / 100
+            acumulado = 0
+            for indice, quantidade in enumerate(self.faixas):
+                acumulado += quantidade
+                if acumulado >= alvo:
+                    return min(self.limites[indice], self.maximo) if indice < len(self.limites) else self.maximo
+            return self.maximo
+
+    def resumo(self):
+        """Retorna a contagem, a média, o máximo e os percentis 50, 95 e 99"""
+        return {
+            "contagem": self.contagem,
+            "media_ms": round(self.soma / self.contagem, 3) if self.contagem else 0.0,
+            "maximo_ms": round(self.maximo, 3),
+            "p50_ms": round(self.percentil(50), 3),
+            "p95_ms": round(self.percentil(95), 3),
+            "p99_ms": round(self.percentil(99), 3),
+        }
+
+
+# Tempo de espera por uma conexão do pool, incluindo a abertura de novas conexões
+espera_checkout = Histograma()
+
+# Duração de cada comando SQL executado pelas engines da aplicação
+consultas_sql = Histograma()
+
+# Limites superiores das faixas da quantidade de comandos SQL por requisição
+LIMITES_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+
+class MetricasRota:
+    """Duração, comandos SQL e respostas por status das requisições de uma rota"""
+
+    def __init__(self):
+        self.duracao = Histograma()
+        self.consultas = Histograma(LIMITES_CONSULTAS)
+        self.duracao_sql = Histograma()
+        self.status = Counter()
+
+
+# Métricas por (método, rota); a rota é o modelo do caminho, como /pacientes/<int:paciente_id>/agendamentos
+rotas = {}
+consultas_lentas = 0
+_trava = threading.Lock()
+
+def metricas_rota(metodo, rota):
+    """Retorna as métricas da rota, criando-as no primeiro uso"""
+    with _trava:
+        return rotas.setdefault((metodo, rota), MetricasRota())
+
+# Medição da requisição atendida pela thread ou pela tarefa atual
+_medicao_atual = contextvars.ContextVar("medicao_atual", default=None)
+
+class MedicaoRequisicao:
+    """Mede a duração de uma requisição e os comandos SQL executados durante ela"""
+
+    def __init__(self, metodo, rota):
+        self.metodo = metodo
+        self.rota = rota
+        self.consultas = 0
+        self.duracao_sql_ms = 0.0
+
+    def iniciar(self):
+        """Passa a somar à medição os comandos SQL executados no contexto atual"""
+        self._token = _medicao_atual.set(self)
+        self._inicio = time.perf_counter()
+        return self
+
+    def finalizar(self, status):
+        """Registra as métricas da requisição e avisa quando ela executou comandos SQL demais"""
+        duracao_ms = (time.perf_counter() - self._inicio) * 1000
+        _medicao_atual.reset(self._token)
+
+        metricas = metricas_rota(self.metodo, self.rota)
+        metricas.duracao.registrar(duracao_ms)
+        metricas.consultas.registrar(self.consultas)
+        metricas.duracao_sql.registrar(self.duracao_sql_ms)
+        with _trava:
+            metricas.status[status] += 1
+
+        # Muitos comandos em uma requisição costumam indicar um relacionamento carregado a cada item (N+1)
+        if self.consultas >= config.REQUISICAO_CONSULTAS_ALERTA:
+            logger.warning("%s %s executou %s comandos SQL (%.1f ms de %.1f ms)",
+                           self.metodo, self.rota, self.consultas, self.duracao_sql_ms, duracao_ms)
+
+def registrar_consulta(duracao_ms, lenta=False):
+    """Registra a duração de um comando SQL, somando-a à requisição atual"""
+    global consultas_lentas
+    consultas_sql.registrar(duracao_ms)
+    if lenta:
+        with _trava:
+            consultas_lentas += 1
+
+    medicao = _medicao_atual.get()
+    if medicao is not None:
+        medicao.consultas += 1
+        medicao.duracao_sql_ms += duracao_ms
+
+def _rotulos(rotulos):
+    # Formata os rótulos de uma série, escapando os valores como o formato de texto do Prometheus exige
+    if not rotulos:
+        return ""
+    pares = []
+    for nome, valor in rotulos.items():
+        valor = str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pares.append(f'{nome}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+def _histograma(linhas, nome, histograma, rotulos=None, escala=1):
+    # Séries _bucket, _sum e _count de um histograma; `escala` converte milissegundos em segundos
+    rotulos = rotulos or {}
+    acumulado, contagem, soma = histograma.acumulado()
+    for limite, quantidade in zip(histograma.limites, acumulado):
+        linhas.append(f"{nome}_bucket{_rotulos({**rotulos, 'le': repr(limite / escala)})} {quantidade}")
+    linhas.append(f"{nome}_bucket{_rotulos({**rotulos, 'le': '+Inf'})} {contagem}")
+    linhas.append(f"{nome}_sum{_rotulos(rotulos)} {soma / escala!r}")
+    linhas.append(f"{nome}_count{_rotulos(rotulos)} {contagem}")
+
+def exportar_prometheus(estado_pool=None):
+    """
+    Retorna as métricas do processo no formato de texto do Prometheus.
+
+    `estado_pool` é o estado atual do pool de conexões, com as chaves tamanho, em_uso, disponiveis e overflow.
+    """
+    linhas = []
+    with _trava:
+        rotas_atuais = sorted(rotas.items())
+        status = {chave: dict(metricas.status) for chave, metricas in rotas_atuais}
+        lentas = consultas_lentas
+
+    linhas += ["# HELP medmeet_requisicoes_total Requisições atendidas, por rota e status.",
+               "# TYPE medmeet_requisicoes_total counter"]
+    for (metodo, rota), _ in rotas_atuais:
+        for codigo, quantidade in sorted(status[(metodo, rota)].items()):
+            linhas.append(f"medmeet_requisicoes_total{_rotulos({'metodo': metodo, 'rota': rota, 'status': codigo})} {quantidade}")
+
+    for nome, atributo, ajuda, escala in (
+        ("medmeet_requisicao_duracao_segundos", "duracao", "Duração das requisições.", 1000),
+        ("medmeet_requisicao_consultas_sql", "consultas", "Comandos SQL executados por requisição.", 1),
+        ("medmeet_requisicao_sql_duracao_segundos", "duracao_sql", "Tempo em comandos SQL por requisição.", 1000),
+    ):
+        linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} histogram"]
+        for (metodo, rota), metricas in rotas_atuais:
+            _histograma(linhas, nome, getattr(metricas, atributo), {"metodo": metodo, "rota": rota}, escala)
+
+    linhas += ["# HELP medmeet_consulta_sql_duracao_segundos Duração de cada comando SQL.",
+               "# TYPE medmeet_consulta_sql_duracao_segundos histogram"]
+    _histograma(linhas, "medmeet_consulta_sql_duracao_segundos", consultas_sql, escala=1000)
+
+    linhas += ["# HELP medmeet_consultas_lentas_total Comandos SQL acima de MEDMEET_DB_CONSULTA_LENTA_MS.",
+               "# TYPE medmeet_consultas_lentas_total counter",
+               f"medmeet_consultas_lentas_total {lentas}"]
+
+    if estado_pool:
+        linhas += ["# HELP medmeet_pool_conexoes Conexões do pool por estado.", "# TYPE medmeet_pool_conexoes gauge"]
+        # O overflow do SQLAlchemy é negativo enquanto o pool não abriu todas as conexões; o gauge conta só as extras
+        for estado, valor in (("em_uso", estado_pool["em_uso"]), ("disponiveis", estado_pool["disponiveis"]),
+                              ("overflow", max(estado_pool["overflow"], 0))):
+            linhas.append(f"medmeet_pool_conexoes{_rotulos({'estado': estado})} {valor}")
+        linhas += ["# HELP medmeet_pool_tamanho Tamanho configurado do pool.", "# TYPE medmeet_pool_tamanho gauge",
+                   f"medmeet_pool_tamanho {estado_pool['tamanho']}"]
+
+    linhas += ["# HELP medmeet_pool_espera_checkout_segundos Espera por uma conexão do pool.",
+               "# TYPE medmeet_pool_espera_checkout_segundos histogram"]
+    _histograma(linhas, "medmeet_pool_espera_checkout_segundos", espera_checkout, escala=1000)
+
+    return "\n".join(linhas) + "\n"
@@ -1,25 +1,191 @@
 from sqlalchemy_utils import database_exists, create_database
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy import create_engine, event
+from contextlib import contextmanager
+import logging
 import os
+import time
 
+import config
+import metricas
+from logger import obter_logger
 from model.base import Base
 from model.usuario import Usuario
 from model.medico import Medico
 from model.horario_medico import HorarioMedico
 from model.paciente import Paciente
 from model.agendamento import Agendamento
+from model.contador import Contador
+from model.migracoes import aplicar_migracoes
 
-db_path = "database/"
+logger = obter_logger(__name__)
 
-if not os.path.exists(db_path):
-   # Cria o diretório
-   os.makedirs(db_path)
+class PoolMedido(QueuePool):
+    """Pool de conexões que mede quanto tempo cada checkout espera por uma conexão"""
 
-db_url = 'sqlite:///%s/med_meet.sqlite3' % db_path
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            espera_ms = (time.perf_counter() - inicio) * 1000
+            metricas.espera_checkout.registrar(espera_ms)
+            if espera_ms >= config.DB_POOL_ESPERA_ALERTA_MS:
+                logger.warning("Checkout esperou %.1f ms por uma conexão: %s", espera_ms, self.status())
 
-engine = create_engine(db_url, echo=False)
+class PoolMedidoAssincrono(PoolMedido, AsyncAdaptedQueuePool):
+    """Pool de conexões da engine assíncrona, com a mesma medição de espera do PoolMedido"""
+
+# O SQLAlchemy registra os eventos de cada pool no logger da sua classe; como nos pools do próprio SQLAlchemy,
+# apenas os avisos são registrados, salvo outro nível definido em MEDMEET_LOG_NIVEIS
+for _pool in (PoolMedido, PoolMedidoAssincrono):
+    _logger_pool = logging.getLogger(f"{_pool.__module__}.{_pool.__name__}")
+    if _logger_pool.level == logging.NOTSET:
+        _logger_pool.setLevel(logging.WARNING)
+
+# Driver assíncrono usado no lugar do driver síncrono de cada banco
+DRIVERS_ASSINCRONOS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def _configurar_sqlite(engine):
+    # Aplica os ajustes de concorrência e desempenho a cada nova conexão
+    @event.listens_for(engine, "connect")
+    def aplicar_pragmas(conexao_dbapi, registro):
+        cursor = conexao_dbapi.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+        cursor.close()
+
+def _instrumentar_consultas(engine):
+    # Mede cada comando SQL, somando-o à requisição atual, e registra no log os que passam do limite
+    @event.listens_for(engine, "before_cursor_execute")
+    def iniciar_consulta(conexao, cursor, comando, parametros, contexto, executemany):
+        conexao.info.setdefault("inicio_consultas", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def finalizar_consulta(conexao, cursor, comando, parametros, contexto, executemany):
+        duracao_ms = (time.perf_counter() - conexao.info["inicio_consultas"].pop()) * 1000
+        lenta = duracao_ms >= config.DB_CONSULTA_LENTA_MS
+        metricas.registrar_consulta(duracao_ms, lenta)
+        if lenta:
+            logger.warning("Consulta lenta (%.1f ms): %s", duracao_ms, " ".join(comando.split()))
+
+    @event.listens_for(engine, "handle_error")
+    def descartar_consulta(contexto_erro):
+        # Um comando com erro não passa pelo after_cursor_execute
+        conexao = contexto_erro.connection
+        if conexao is not None and conexao.info.get("inicio_consultas"):
+            conexao.info["inicio_consultas"].pop()
+
+def criar_engine(url=config.DATABASE_URL):
+    """Cria a engine do banco configurado, com o pool de conexões e os ajustes do dialeto"""
+    url = make_url(url)
+
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            engine = create_engine(url, echo=config.DB_ECHO)
+            _instrumentar_consultas(engine)
+            return engine
+
+        # Cria o diretório do arquivo do banco
+        diretorio = os.path.dirname(url.database)
+        if diretorio and not os.path.exists(diretorio):
+            os.makedirs(diretorio)
+
+        engine = create_engine(
+            url,
+            echo=config.DB_ECHO,
+            poolclass=PoolMedido,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            connect_args={"check_same_thread": False, "timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000}
+        )
+        _configurar_sqlite(engine)
+        _instrumentar_consultas(engine)
+        return engine
+
+    engine = create_engine(
+        url,
+        echo=config.DB_ECHO,
+        poolclass=PoolMedido,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING
+    )
+    _instrumentar_consultas(engine)
+    return engine
+
+def criar_engine_assincrona(url=config.DATABASE_URL):
+    """
+    Cria a engine assíncrona do modo ASGI, apontando para o mesmo banco da engine síncrona.
+
+    Troca o driver da URL pelo aiosqlite ou pelo asyncpg, que precisam estar instalados.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in DRIVERS_ASSINCRONOS:
+        raise ValueError(f"O banco {backend} não possui um driver assíncrono configurado")
+    if backend == 'sqlite' and url.database in (None, '', ':memory:'):
+        raise ValueError("O modo assíncrono requer um banco SQLite em arquivo, compartilhado com a aplicação síncrona")
+
+    opcoes = {
+        "echo": config.DB_ECHO,
+        "poolclass": PoolMedidoAssincrono,
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+    }
+    if backend == 'sqlite':
+        opcoes["connect_args"] = {"timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000}
+    else:
+        opcoes.update(pool_recycle=config.DB_POOL_RECYCLE, pool_pre_ping=config.DB_POOL_PRE_PING)
+
+    try:
+        engine = create_async_engine(url.set(drivername=DRIVERS_ASSINCRONOS[backend]), **opcoes)
+    except ModuleNotFoundError as e:
+        raise RuntimeError(f"O pacote {e.name} é necessário para usar o modo assíncrono")
+
+    if backend == 'sqlite':
+        _configurar_sqlite(engine.sync_engine)
+    _instrumentar_consultas(engine.sync_engine)
+    return engine
+
+def inicializar_banco():
+    """Cria o banco, as tabelas que ainda não existem e aplica as migrações pendentes"""
+    # Cria o banco caso ainda não exista no servidor
+    if engine.url.get_backend_name() != 'sqlite' and not database_exists(engine.url):
+        create_database(engine.url)
+
+    # Cria as tabelas que ainda não existem e atualiza os bancos já existentes, que o create_all não altera;
+    # as duas etapas rodam sob um bloqueio, pois os workers podem iniciar ao mesmo tempo
+    aplicar_migracoes(engine)
+
+engine = criar_engine()
 
 Session = sessionmaker(bind=engine)
 
-Base.metadata.create_all(engine)
+# Sessão da requisição atual; a aplicação a remove ao final de cada requisição, devolvendo a conexão ao pool
+sessao = scoped_session(Session)
+
+@contextmanager
+def unidade_de_trabalho():
+    """
+    Entrega a sessão da requisição atual e confirma as operações ao final do bloco.
+
+    Qualquer exceção no bloco ou na confirmação desfaz as operações e é propagada para a rota tratar.
+    """
+    session = sessao()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
@@ -1,9 +1,22 @@
 from model import Base
-from sqlalchemy import Column, Integer, DateTime, String, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, String, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 
 class Agendamento(Base):
     __tablename__ = 'agendamento'
+    __table_args__ = (
+        # Agenda do médico e histórico do paciente por período
+        Index('ix_agendamento_medico_inicio', 'medico_id', 'inicio'),
+        Index('ix_agendamento_paciente_inicio', 'paciente_id', 'inicio'),
+        # Contagem de agendamentos por dia
+        Index('ix_agendamento_inicio', 'inicio'),
+        # Impede dois agendamentos confirmados do mesmo médico no mesmo horário
+        Index(
+            'uq_agendamento_medico_inicio', 'medico_id', 'inicio', unique=True,
+            sqlite_where=text("status = 'confirmado'"),
+            postgresql_where=text("status = 'confirmado'")
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     medico_id = Column(Integer, ForeignKey('medico.id'), nullable=False)
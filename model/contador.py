@@ -0,0 +1,41 @@
+from model import Base
+from sqlalchemy import Column, String, Integer
+from sqlalchemy.dialects import postgresql, sqlite
+
+class Contador(Base):
+    """Contagens do painel mantidas a cada cadastro, para não percorrer as tabelas a cada consulta"""
+    __tablename__ = 'contador'
+
+    chave = Column(String(50), primary_key=True)
+    valor = Column(Integer, nullable=False, default=0)
+
+    @staticmethod
+    def chave_agendamentos(data):
+        """Chave da contagem de agendamentos do dia"""
+        return f"agendamentos:{data.isoformat()}"
+
+    @classmethod
+    def incrementar(cls, session, chave, quantidade=1):
+        """Soma `quantidade` ao contador na transação da sessão, criando o contador se ainda não existir"""
+        dialeto = session.get_bind().dialect.name
+        if dialeto in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialeto == 'postgresql' else sqlite.insert
+            session.execute(
+                insert(cls).values(chave=chave, valor=quantidade).on_conflict_do_update(
+                    index_elements=[cls.chave], set_={"valor": cls.valor + quantidade}
+                )
+            )
+            return
+
+        # Nos demais bancos atualiza o contador e o cria caso a atualização não encontre a linha
+        atualizados = session.query(cls).filter_by(chave=chave) \
+            .update({cls.valor: cls.valor + quantidade}, synchronize_session=False)
+        if not atualizados:
+            session.add(cls(chave=chave, valor=quantidade))
+            session.flush()
+
+    @classmethod
+    def ler(cls, session, *chaves):
+        """Retorna o valor de cada chave em uma única consulta; contadores inexistentes valem zero"""
+        valores = dict(session.query(cls.chave, cls.valor).filter(cls.chave.in_(chaves)).all())
+        return {chave: valores.get(chave, 0) for chave in chaves}
@@ -1,12 +1,17 @@
 from model import Base
-from sqlalchemy import Column, Integer, String, ForeignKey, Time
+from sqlalchemy import Column, Integer, ForeignKey, Time, Index
 from sqlalchemy.orm import relationship
 
 class HorarioMedico(Base):
     __tablename__ = 'horario_medico'
+    __table_args__ = (
+        # Horários do médico em um dia da semana
+        Index('ix_horario_medico_medico_dia', 'medico_id', 'dia_semana'),
+    )
 
     id = Column(Integer, primary_key=True)
-    dia_semana = Column(String(50))
+    # Número do dia da semana, como em date.weekday() (0 = segunda-feira)
+    dia_semana = Column(Integer)
     hora_inicio_manha = Column(Time)
     hora_fim_manha = Column(Time)
     hora_inicio_tarde = Column(Time)
@@ -1,9 +1,15 @@
 from model import Base
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 class Medico(Base):
     __tablename__ = 'medico'
+    __table_args__ = (
+        # Busca do médico a partir do usuário
+        Index('ix_medico_usuario_id', 'usuario_id'),
+        # Busca de horários livres por especialidade
+        Index('ix_medico_especialidade', 'especialidade'),
+    )
 
     id = Column(Integer, primary_key=True)
     especialidade = Column(String(255), nullable=False)
@@ -0,0 +1,277 @@
+from contextlib import contextmanager
+
+from sqlalchemy import CheckConstraint, Column, Integer, Table, inspect, select, text
+from sqlalchemy.exc import OperationalError
+
+from model.base import Base
+from agenda import numero_dia_semana
+from logger import obter_logger
+
+logger = obter_logger(__name__)
+
+# Registra a versão do schema já aplicada ao banco, em uma única linha de id 1
+versao_schema = Table(
+    'versao_schema', Base.metadata,
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('versao', Integer, nullable=False),
+    CheckConstraint('id = 1', name='ck_versao_schema_linha_unica')
+)
+
+# Chave do advisory lock do PostgreSQL que serializa as migrações entre os processos
+CHAVE_BLOQUEIO_MIGRACOES = 7302115
+
+# Migrações na ordem em que devem ser aplicadas; a versão do banco é a quantidade já aplicada
+MIGRACOES = []
+
+def migracao(funcao):
+    """Registra uma função como a próxima migração do schema"""
+    MIGRACOES.append(funcao)
+    return funcao
+
+def _criar_indices(conexao, tabela, *nomes):
+    # Cria os índices declarados no modelo que ainda não existem no banco
+    for indice in Base.metadata.tables[tabela].indexes:
+        if indice.name in nomes:
+            indice.create(conexao, checkfirst=True)
+
+def _dias_citados(dia_semana):
+    # Dias citados no texto, na ordem em que aparecem; antes cada texto valia para todos os dias que continha
+    try:
+        return [numero_dia_semana(dia_semana)]
+    except ValueError:
+        pass
+
+    dias = []
+    for palavra in str(dia_semana).replace('-', ' ').split():
+        try:
+            numero = numero_dia_semana(palavra)
+        except ValueError:
+            continue
+        if numero not in dias:
+            dias.append(numero)
+    return dias
+
+@migracao
+def normalizar_dia_semana(conexao):
+    """
+    Converte o dia da semana dos horários, antes gravado como texto, para o número do dia.
+
+    Um texto que cita vários dias, como "terça-feira e quarta-feira", dava o horário em todos eles; o horário passa
+    a ser gravado uma vez para cada dia citado.
+    """
+    horarios = conexao.execute(text("SELECT id, dia_semana FROM horario_medico")).all()
+
+    numeros = {}
+    for horario_id, dia_semana in horarios:
+        if dia_semana is None or isinstance(dia_semana, int):
+            numeros[horario_id] = [dia_semana]
+            continue
+
+        numeros[horario_id] = _dias_citados(dia_semana) or [None]
+        if numeros[horario_id] == [None]:
+            logger.warning("Dia da semana '%s' do horário %s não reconhecido.", dia_semana, horario_id)
+        elif len(numeros[horario_id]) > 1:
+            logger.warning("O horário %s cita %s dias em '%s' e será gravado uma vez para cada dia.",
+                           horario_id, len(numeros[horario_id]), dia_semana)
+
+    # Bancos antigos declaram a coluna como texto; ela é recriada como inteiro
+    coluna = next(coluna for coluna in inspect(conexao).get_columns('horario_medico') if coluna['name'] == 'dia_semana')
+    if not isinstance(coluna['type'], Integer):
+        if conexao.dialect.name == 'sqlite':
+            # O SQLite não altera o tipo de uma coluna, então a tabela é recriada com os dados convertidos
+            conexao.execute(text("ALTER TABLE horario_medico RENAME TO horario_medico_antigo"))
+            Base.metadata.tables['horario_medico'].create(conexao)
+            conexao.execute(text(
+                "INSERT INTO horario_medico (id, dia_semana, hora_inicio_manha, hora_fim_manha, hora_inicio_tarde, hora_fim_tarde, medico_id) "
+                "SELECT id, NULL, hora_inicio_manha, hora_fim_manha, hora_inicio_tarde, hora_fim_tarde, medico_id FROM horario_medico_antigo"
+            ))
+            conexao.execute(text("DROP TABLE horario_medico_antigo"))
+        else:
+            conexao.execute(text("ALTER TABLE horario_medico ALTER COLUMN dia_semana TYPE INTEGER USING NULL"))
+
+    # O primeiro dia fica no próprio horário e cada dia seguinte recebe uma cópia dele
+    for horario_id, (numero, *outros) in numeros.items():
+        conexao.execute(
+            text("UPDATE horario_medico SET dia_semana = :numero WHERE id = :id"),
+            {"numero": numero, "id": horario_id}
+        )
+        for outro in outros:
+            conexao.execute(text(
+                "INSERT INTO horario_medico (dia_semana, hora_inicio_manha, hora_fim_manha, hora_inicio_tarde, hora_fim_tarde, medico_id) "
+                "SELECT :numero, hora_inicio_manha, hora_fim_manha, hora_inicio_tarde, hora_fim_tarde, medico_id "
+                "FROM horario_medico WHERE id = :id"
+            ), {"numero": outro, "id": horario_id})
+
+@migracao
+def criar_indices_consultas(conexao):
+    """Cria os índices das colunas usadas nas consultas de agenda, agendamento e busca"""
+    _criar_indices(conexao, 'agendamento', 'ix_agendamento_medico_inicio', 'ix_agendamento_paciente_inicio', 'ix_agendamento_inicio')
+    _criar_indices(conexao, 'horario_medico', 'ix_horario_medico_medico_dia')
+    _criar_indices(conexao, 'usuario', 'ix_usuario_nome')
+    _criar_indices(conexao, 'medico', 'ix_medico_usuario_id')
+    _criar_indices(conexao, 'paciente', 'ix_paciente_usuario_id')
+
+@migracao
+def criar_indice_busca_nome(conexao):
+    """Cria o índice de busca textual, sem acentos e sem diferenciar maiúsculas, pelo nome dos usuários"""
+    if conexao.dialect.name == 'sqlite':
+        try:
+            conexao.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS usuario_busca USING fts5("
+                "nome, content='usuario', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')"
+            ))
+        except OperationalError as e:
+            logger.warning("Busca textual indisponível, a busca por nome usará ILIKE: %s", e)
+            return
+
+        # Gatilhos mantêm o índice sincronizado com a tabela de usuários
+        conexao.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS usuario_busca_insert AFTER INSERT ON usuario BEGIN "
+            "INSERT INTO usuario_busca (rowid, nome) VALUES (new.id, new.nome); END"
+        ))
+        conexao.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS usuario_busca_delete AFTER DELETE ON usuario BEGIN "
+            "INSERT INTO usuario_busca (usuario_busca, rowid, nome) VALUES ('delete', old.id, old.nome); END"
+        ))
+        conexao.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS usuario_busca_update AFTER UPDATE OF nome ON usuario BEGIN "
+            "INSERT INTO usuario_busca (usuario_busca, rowid, nome) VALUES ('delete', old.id, old.nome); "
+            "INSERT INTO usuario_busca (rowid, nome) VALUES (new.id, new.nome); END"
+        ))
+
+        # Indexa os usuários já cadastrados
+        conexao.execute(text("INSERT INTO usuario_busca (usuario_busca) VALUES ('rebuild')"))
+
+    elif conexao.dialect.name == 'postgresql':
+        conexao.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conexao.execute(text("CREATE EXTENSION IF NOT EXISTS unaccent"))
+
+        # O unaccent não é imutável e por isso não pode ser usado diretamente em um índice
+        conexao.execute(text(
+            "CREATE OR REPLACE FUNCTION imutavel_unaccent(texto text) RETURNS text AS "
+            "$$ SELECT public.unaccent('public.unaccent', texto) $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT"
+        ))
+        conexao.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_usuario_nome_trgm ON usuario "
+            "USING gin (imutavel_unaccent(lower(nome)) gin_trgm_ops)"
+        ))
+
+@migracao
+def impedir_agendamentos_conflitantes(conexao):
+    """Impede no banco que um médico tenha dois agendamentos confirmados no mesmo horário"""
+    if conexao.dialect.name == 'postgresql':
+        # Agendamentos antigos que se sobrepõem a um anterior deixam de ser confirmados
+        conflitos = conexao.execute(text(
+            "UPDATE agendamento SET status = 'conflito' WHERE status = 'confirmado' AND EXISTS ("
+            "SELECT 1 FROM agendamento anterior WHERE anterior.medico_id = agendamento.medico_id "
+            "AND anterior.status = 'confirmado' AND anterior.id < agendamento.id "
+            "AND anterior.inicio < agendamento.fim AND anterior.fim > agendamento.inicio)"
+        )).rowcount
+    else:
+        # Agendamentos antigos no mesmo início de um anterior deixam de ser confirmados
+        conflitos = conexao.execute(text(
+            "UPDATE agendamento SET status = 'conflito' WHERE status = 'confirmado' AND EXISTS ("
+            "SELECT 1 FROM agendamento anterior WHERE anterior.medico_id = agendamento.medico_id "
+            "AND anterior.inicio = agendamento.inicio AND anterior.status = 'confirmado' "
+            "AND anterior.id < agendamento.id)"
+        )).rowcount
+
+    if conflitos:
+        logger.warning("%s agendamentos em conflito marcados com o status 'conflito'.", conflitos)
+
+    _criar_indices(conexao, 'agendamento', 'uq_agendamento_medico_inicio')
+
+    if conexao.dialect.name == 'postgresql':
+        # Além do mesmo início, impede qualquer sobreposição entre os períodos dos agendamentos
+        conexao.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+        existe = conexao.execute(text(
+            "SELECT 1 FROM pg_constraint WHERE conname = 'ex_agendamento_medico_periodo'"
+        )).scalar()
+        if not existe:
+            conexao.execute(text(
+                    "ALTER TABLE agendamento ADD CONSTRAINT ex_agendamento_medico_periodo "
+                "EXCLUDE USING gist (medico_id WITH =, tsrange(inicio, fim) WITH &&) WHERE (status = 'confirmado')"
+            ))
+
+@migracao
+def preencher_contadores(conexao):
+    """Preenche os contadores do painel com as contagens atuais, a partir das quais passam a ser mantidos"""
+    conexao.execute(text("DELETE FROM contador"))
+    conexao.execute(text("INSERT INTO contador (chave, valor) SELECT 'medicos', count(*) FROM medico"))
+    conexao.execute(text("INSERT INTO contador (chave, valor) SELECT 'pacientes', count(*) FROM paciente"))
+    conexao.execute(text(
+        "INSERT INTO contador (chave, valor) "
+        "SELECT 'agendamentos:' || date(inicio), count(*) FROM agendamento GROUP BY date(inicio)"
+    ))
+
+@migracao
+def criar_indice_especialidade(conexao):
+    """Cria o índice da especialidade dos médicos, usado na busca de horários livres"""
+    _criar_indices(conexao, 'medico', 'ix_medico_especialidade')
+
+@contextmanager
+def _transacao_exclusiva(conexao):
+    """
+    Abre uma transação que só um processo por vez mantém aberta no banco.
+
+    No SQLite, o BEGIN IMMEDIATE reserva a escrita no início da transação; no PostgreSQL, um advisory lock é
+    mantido até o fim da transação. A conexão do SQLite deve estar em modo AUTOCOMMIT, para que o driver não abra
+    a transação por conta própria antes do BEGIN IMMEDIATE.
+    """
+    with conexao.begin():
+        if conexao.dialect.name == 'sqlite':
+            conexao.exec_driver_sql("BEGIN IMMEDIATE")
+        elif conexao.dialect.name == 'postgresql':
+            conexao.execute(text("SELECT pg_advisory_xact_lock(:chave)"), {"chave": CHAVE_BLOQUEIO_MIGRACOES})
+        yield conexao
+
+def _preparar_versao_schema(conexao):
+    """
+    Cria a tabela da versão do schema ou converte a antiga, sem chave, para a linha única de id 1.
+
+    A tabela antiga podia receber uma linha por processo iniciado ao mesmo tempo; vale a maior versão registrada.
+    """
+    inspetor = inspect(conexao)
+    if inspetor.has_table('versao_schema'):
+        colunas = [coluna['name'] for coluna in inspetor.get_columns('versao_schema')]
+        if 'id' in colunas:
+            # Tabela já no formato atual, criada agora pelo create_all ou em uma inicialização anterior
+            if conexao.execute(select(versao_schema.c.id)).first() is None:
+                conexao.execute(versao_schema.insert().values(id=1, versao=0))
+            return
+
+        versao = conexao.execute(text("SELECT max(versao) FROM versao_schema")).scalar()
+        conexao.execute(text("DROP TABLE versao_schema"))
+    else:
+        versao = 0
+
+    versao_schema.create(conexao)
+    conexao.execute(versao_schema.insert().values(id=1, versao=versao or 0))
+
+def aplicar_migracoes(engine):
+    """
+    Aplica ao banco as migrações ainda pendentes.
+
+    Cada migração roda em sua própria transação exclusiva junto com a atualização da versão do schema. A versão é
+    relida dentro de cada transação, para que processos iniciados ao mesmo tempo apliquem cada migração uma única
+    vez: quem espera pelo bloqueio encontra a migração já aplicada e segue para a próxima.
+    """
+    if engine.dialect.name == 'sqlite':
+        engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+
+    with engine.connect() as conexao:
+        # Cria as tabelas que ainda não existem e a versão do schema, se necessário
+        with _transacao_exclusiva(conexao):
+            Base.metadata.create_all(conexao)
+            _preparar_versao_schema(conexao)
+
+        while True:
+            with _transacao_exclusiva(conexao):
+                versao = conexao.execute(select(versao_schema.c.versao).where(versao_schema.c.id == 1)).scalar()
+                if versao >= len(MIGRACOES):
+                    break
+
+                numero, funcao = versao + 1, MIGRACOES[versao]
+                logger.info("Aplicando migração %s: %s", numero, funcao.__name__)
+                funcao(conexao)
+                conexao.execute(versao_schema.update().where(versao_schema.c.id == 1).values(versao=numero))
@@ -1,9 +1,13 @@
 from model import Base
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 class Paciente(Base):
     __tablename__ = 'paciente'
+    __table_args__ = (
+        # Busca do paciente a partir do usuário
+        Index('ix_paciente_usuario_id', 'usuario_id'),
+    )
 
     id = Column(Integer, primary_key=True)
     cpf = Column(String(255), nullable=False, unique=True)
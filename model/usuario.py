@@ -1,9 +1,13 @@
 from model import Base
-from sqlalchemy import Column, String, Integer, DateTime
+from sqlalchemy import Column, String, Integer, DateTime, Index
 from sqlalchemy.sql import func
 
 class Usuario(Base):
     __tablename__ = 'usuario'
+    __table_args__ = (
+        # Busca de pacientes e médicos pelo nome
+        Index('ix_usuario_nome', 'nome'),
+    )
 
     id = Column(Integer, primary_key=True)
     nome = Column(String(255), nullable=False)
@@ -1,4 +1,7 @@
-from schema.medico import CadastrarHorarioSchema, CadastrarMedicoSchema, MedicoBuscaSchema, VisualizarMedicoSchema, ListagemMedicosSchema, VisualizarHorarioSchema, VisualizarContagemMedicosSchema, retornar_medico, retornar_horario, retornar_agendamento
-from schema.paciente import CadastrarPacienteSchema, VisualizarPacienteSchema, ListagemPacientesSchema, VisualizarContagemPacientesSchema, retornar_paciente
-from schema.agendamento import CadastrarAgendamentoSchema, VisualizarAgendamentoSchema, ListagemAgendamentosSchema, VisualizarContagemAgendamentosSchema, retornar_agendamento
+from schema.medico import CadastrarHorarioSchema, CadastrarMedicoSchema, MedicoBuscaSchema, MedicoIdSchema, AgendaPeriodoBuscaSchema, HorariosLivresBuscaSchema, HorarioLivreSchema, ListagemHorariosLivresSchema, VisualizarMedicoSchema, ListagemMedicosSchema, VisualizarHorarioSchema, VisualizarContagemMedicosSchema, CAMPOS_MEDICO, retornar_medico, retornar_horario, retornar_agendamento
+from schema.paciente import CadastrarPacienteSchema, PacienteIdSchema, VisualizarPacienteSchema, ListagemPacientesSchema, VisualizarContagemPacientesSchema, CAMPOS_PACIENTE, retornar_paciente
+from schema.agendamento import CadastrarAgendamentoSchema, VisualizarAgendamentoSchema, ListagemAgendamentosSchema, AgendamentosBuscaSchema, VisualizarContagemAgendamentosSchema, CAMPOS_AGENDAMENTO, retornar_agendamento
+from schema.paginacao import PaginacaoBuscaSchema
+from schema.dashboard import VisualizarDashboardSchema
+from schema.importacao import ErroImportacaoSchema, ResultadoImportacaoSchema
 from schema.error import ErrorSchema
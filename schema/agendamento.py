@@ -1,12 +1,14 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from model.agendamento import Agendamento
 
 class CadastrarAgendamentoSchema(BaseModel):
-    """Define como um novo agendamento deve ser cadastrado"""
-    paciente_nome: str = "Rodrigo Thales de Brito"
-    medico_nome: str = "Hillary Lopez Stafford"
+    """Define como um novo agendamento deve ser cadastrado; o paciente e o médico são informados pelo id ou pelo nome"""
+    paciente_id: Optional[int] = Field(None, example=1)
+    paciente_nome: Optional[str] = Field(None, example="Rodrigo Thales de Brito")
+    medico_id: Optional[int] = Field(None, example=1)
+    medico_nome: Optional[str] = Field(None, example="Hillary Lopez Stafford")
     data: str = "2024-08-25"
     horario: str = "14:30"
 
@@ -17,15 +19,35 @@ class VisualizarAgendamentoSchema(BaseModel):
     medico_nome: str = "Hillary Lopez Stafford"
     inicio: datetime = "2024-08-25T14:30:00"
     fim: datetime = "2024-08-25T15:00:00"
+    status: str = "confirmado"
 
 class ListagemAgendamentosSchema(BaseModel):
     """Define como uma listagem de agendamentos será retornada"""
     agendamentos: List[VisualizarAgendamentoSchema]
+    proximo_cursor: Optional[str] = None
+
+class AgendamentosBuscaSchema(BaseModel):
+    """Define os filtros e a paginação dos agendamentos de um paciente ou de um médico; `status` aceita valores separados por vírgula"""
+    data_inicio: Optional[str] = Field(None, example="2024-08-01")
+    data_fim: Optional[str] = Field(None, example="2024-08-31")
+    status: Optional[str] = Field(None, example="confirmado")
+    limit: int = Field(50, ge=1, le=500)
+    cursor: Optional[str] = None
 
 class VisualizarContagemAgendamentosSchema(BaseModel):
     """Define como a contagem de agendamentos será retornada."""
     contagem: int = 0
 
+# Colunas exportadas na exportação de agendamentos
+CAMPOS_AGENDAMENTO = {
+    "id": Agendamento.id,
+    "medico_id": Agendamento.medico_id,
+    "paciente_id": Agendamento.paciente_id,
+    "inicio": Agendamento.inicio,
+    "fim": Agendamento.fim,
+    "status": Agendamento.status
+}
+
 def retornar_agendamento(agendamento: Agendamento):
     """Retorna uma representação do agendamento seguindo o schema definido"""
     return {
@@ -34,4 +56,5 @@ def retornar_agendamento(agendamento: Agendamento):
         "medico_nome": agendamento.medico.usuario.nome,
         "inicio": agendamento.inicio,
         "fim": agendamento.fim,
+        "status": agendamento.status,
     }
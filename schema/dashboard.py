@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+class VisualizarDashboardSchema(BaseModel):
+    """Define como as contagens do painel serão retornadas"""
+    medicos: int = 0
+    pacientes: int = 0
+    agendamentos_hoje: int = 0
@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from typing import List
+
+class ErroImportacaoSchema(BaseModel):
+    """Define como o erro de uma linha recusada na importação será retornado"""
+    linha: int = 2
+    message: str = "Erro ao cadastrar, email já está em uso"
+
+class ResultadoImportacaoSchema(BaseModel):
+    """Define como o resultado de uma importação em lote será retornado"""
+    importados: int = 1
+    erros: List[ErroImportacaoSchema]
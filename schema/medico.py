@@ -1,7 +1,9 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import time
-from typing import List
+from typing import List, Optional
 from model.medico import Medico
+from model.usuario import Usuario
+from agenda import nome_dia_semana
 from model.horario_medico import HorarioMedico
 
 class CadastrarMedicoSchema(BaseModel):
@@ -26,9 +28,39 @@ class MedicoBuscaSchema(BaseModel):
     medico_id: str = "1"
     data: str = "2024-08-25"
 
+class MedicoIdSchema(BaseModel):
+    """Define o médico informado no caminho da rota"""
+    medico_id: int = 1
+
+class AgendaPeriodoBuscaSchema(BaseModel):
+    """Define a busca das agendas de vários médicos em um período"""
+    medico_ids: str = "1,2"
+    data_inicio: str = "2024-08-26"
+    data_fim: str = "2024-08-30"
+
+class HorariosLivresBuscaSchema(BaseModel):
+    """Define a busca dos primeiros horários livres de uma especialidade; sem datas, busca nos próximos 31 dias"""
+    especialidade: str = "Dermatologia"
+    data_inicio: Optional[str] = Field(None, example="2024-08-26")
+    data_fim: Optional[str] = Field(None, example="2024-08-30")
+    limit: int = Field(10, ge=1, le=100)
+
+class HorarioLivreSchema(BaseModel):
+    """Define como um horário livre será retornado"""
+    medico_id: int = 1
+    medico_nome: str = "Hillary Lopez Stafford"
+    data: str = "2024-08-26"
+    inicio: str = "08:00"
+    fim: str = "08:30"
+
+class ListagemHorariosLivresSchema(BaseModel):
+    """Define como a listagem de horários livres será retornada"""
+    horarios: List[HorarioLivreSchema]
+
 class ListagemMedicosSchema(BaseModel):
     """Define como uma listagem de médicos será retornada"""
     medicos:List[CadastrarMedicoSchema]
+    proximo_cursor: Optional[int] = None
 
 class VisualizarMedicoSchema(BaseModel):
     """Define como um médico será retornado"""
@@ -51,6 +83,15 @@ class VisualizarContagemMedicosSchema(BaseModel):
     """Define como a contagem de médicos será retornada"""
     contagem: int = 0 
 
+# Colunas que podem ser projetadas na listagem de médicos
+CAMPOS_MEDICO = {
+    "id": Medico.id,
+    "nome": Usuario.nome,
+    "email": Usuario.email,
+    "especialidade": Medico.especialidade,
+    "crm": Medico.crm
+}
+
 def retornar_medico(medico: Medico):
     """Retorna uma representação do médico seguindo o schema definido"""
     return {
@@ -64,7 +105,7 @@ def retornar_medico(medico: Medico):
 def retornar_horario(horario: HorarioMedico):
     """Retorna uma representação do horário do médico"""
     return {
-        "dia_semana": horario.dia_semana,
+        "dia_semana": nome_dia_semana(horario.dia_semana),
         "hora_inicio_manha": horario.hora_inicio_manha.strftime('%H:%M'),
         "hora_fim_manha": horario.hora_fim_manha.strftime('%H:%M'),
         "hora_inicio_tarde": horario.hora_inicio_tarde.strftime('%H:%M'),
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, EmailStr
-from typing import List
+from typing import List, Optional
 from model.paciente import Paciente
+from model.usuario import Usuario
 
 class CadastrarPacienteSchema(BaseModel):
     """Define os dados necessários para cadastrar um novo paciente"""
@@ -12,6 +13,11 @@ class CadastrarPacienteSchema(BaseModel):
 class ListagemPacientesSchema(BaseModel):
     """Define como uma listagem de pacientes será retornada"""
     pacientes:List[CadastrarPacienteSchema]
+    proximo_cursor: Optional[int] = None
+
+class PacienteIdSchema(BaseModel):
+    """Define o paciente informado no caminho da rota"""
+    paciente_id: int = 1
 
 class VisualizarPacienteSchema(BaseModel):
     """Define como um paciente será retornado"""
@@ -25,6 +31,15 @@ class VisualizarContagemPacientesSchema(BaseModel):
     """Define como a contagem de pacientes será retornada."""
     contagem: int = 0
 
+# Colunas que podem ser projetadas na listagem de pacientes
+CAMPOS_PACIENTE = {
+    "id": Paciente.id,
+    "nome": Usuario.nome,
+    "email": Usuario.email,
+    "cpf": Paciente.cpf,
+    "endereco": Paciente.endereco
+}
+
 def retornar_paciente(paciente: Paciente):
     """Retorna uma representação do paciente seguindo o schema definido"""
     return {
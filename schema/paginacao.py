@@ -0,0 +1,8 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class PaginacaoBuscaSchema(BaseModel):
+    """Define os parâmetros de paginação e projeção de uma listagem"""
+    limit: int = Field(50, ge=1, le=500)
+    cursor: Optional[int] = None
+    fields: Optional[str] = None
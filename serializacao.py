@@ -0,0 +1,52 @@
+from datetime import date, datetime, time
+from flask import Response
+import json
+
+import config
+from logger import obter_logger
+
+logger = obter_logger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _serializar_valor(valor):
+    # Datas e horários no formato ISO 8601, o mesmo usado pelo orjson
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo {type(valor).__name__} não serializável em JSON")
+
+def _serializar_orjson(dados):
+    return orjson.dumps(dados, option=orjson.OPT_NON_STR_KEYS)
+
+def _serializar_json(dados):
+    return json.dumps(dados, ensure_ascii=False, separators=(",", ":"), default=_serializar_valor).encode()
+
+def _escolher_serializador():
+    """Retorna o serializador da biblioteca configurada, recorrendo ao módulo json se o orjson não estiver instalado"""
+    if config.JSON_BIBLIOTECA == "orjson":
+        if orjson is not None:
+            return _serializar_orjson
+        logger.warning("O pacote orjson não está instalado, as respostas serão serializadas com o módulo json")
+    return _serializar_json
+
+# Converte os dados da resposta em JSON compacto, codificado em UTF-8
+serializar = _escolher_serializador()
+
+def jsonify(dados):
+    """Substitui o flask.jsonify, serializando os dados com o serializador configurado"""
+    return Response(serializar(dados), mimetype="application/json")
+
+def linhas_para_dicionarios(linhas):
+    """
+    Converte as linhas de uma consulta em dicionários indexados pelos nomes das colunas.
+
+    Os nomes são lidos uma única vez, o que evita montar um mapeamento para cada linha como `Row._mapping`.
+    """
+    if not linhas:
+        return []
+    colunas = linhas[0]._fields
+    return [dict(zip(colunas, linha)) for linha in linhas]
@@ -0,0 +1,13 @@
+"""
+Testes da aplicação, executados com: python -m nose2 -v
+
+O banco e os logs dos testes ficam em um diretório temporário, configurado antes de qualquer módulo de teste
+importar a aplicação. Os módulos compartilham esse banco, então cada um cadastra os próprios dados e usa os ids
+retornados pela API.
+"""
+import os
+import tempfile
+
+DIRETORIO = tempfile.mkdtemp(prefix="medmeet-testes-")
+os.environ["MEDMEET_DATABASE_URL"] = f"sqlite:///{os.path.join(DIRETORIO, 'testes.sqlite3')}"
+os.environ["MEDMEET_LOG_DIRETORIO"] = os.path.join(DIRETORIO, "log")
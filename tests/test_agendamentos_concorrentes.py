@@ -0,0 +1,72 @@
+"""
+Confere que agendamentos simultâneos nunca ocupam duas vezes o mesmo período de um médico.
+
+Os agendamentos são disparados ao mesmo tempo por várias threads contra o banco SQLite em arquivo dos testes;
+apenas um deve ser aceito e os demais recusados com 409, sem falhas "database is locked". O teste de carga em
+benchmarks/carga_agendamentos.py repete o cenário com processos e em maior volume.
+"""
+from datetime import datetime, timedelta
+import threading
+import unittest
+
+from app import app
+
+CONCORRENTES = 20
+
+
+class AgendamentosConcorrentesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cliente = app.test_client()
+        cls.medico_id = cliente.post('/medicos', data={
+            "nome": "Médico Concorrência", "email": "medico@concorrencia.com", "especialidade": "Clínica",
+            "crm": "CONC1", "duracao_consulta": 30
+        }).get_json()["id"]
+        cls.pacientes = [
+            cliente.post('/pacientes', data={
+                "nome": f"Paciente Concorrência {i}", "email": f"paciente{i}@concorrencia.com", "cpf": f"CONC{i}",
+                "endereco": "Rua A"
+            }).get_json()["id"]
+            for i in range(CONCORRENTES)
+        ]
+
+    def _agendar_ao_mesmo_tempo(self, inicios):
+        """Dispara um agendamento por início, cada um em uma thread, e retorna as respostas"""
+        barreira = threading.Barrier(len(inicios))
+        respostas = [None] * len(inicios)
+
+        def agendar(indice, inicio):
+            cliente = app.test_client()
+            barreira.wait()
+            resposta = cliente.post('/agendamentos', data={
+                "paciente_id": self.pacientes[indice], "medico_id": self.medico_id,
+                "data": inicio.strftime("%Y-%m-%d"), "horario": inicio.strftime("%H:%M")
+            })
+            respostas[indice] = (resposta.status_code, resposta.get_json().get("message", ""))
+
+        threads = [threading.Thread(target=agendar, args=(indice, inicio)) for indice, inicio in enumerate(inicios)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return respostas
+
+    def _conferir_um_aceito(self, respostas):
+        status = sorted(status for status, _ in respostas)
+        self.assertFalse([mensagem for _, mensagem in respostas if "locked" in mensagem], respostas)
+        self.assertEqual(status, [200] + [409] * (len(respostas) - 1), respostas)
+
+    def test_mesmo_horario(self):
+        inicio = datetime(2030, 2, 4, 8, 0)
+        self._conferir_um_aceito(self._agendar_ao_mesmo_tempo([inicio] * CONCORRENTES))
+
+    def test_sobreposicao_parcial(self):
+        # Inícios um minuto depois do outro, todos dentro da mesma consulta de 30 minutos
+        inicio = datetime(2030, 2, 5, 8, 0)
+        inicios = [inicio + timedelta(minutes=minuto) for minuto in range(CONCORRENTES)]
+        self._conferir_um_aceito(self._agendar_ao_mesmo_tempo(inicios))
+
+
+if __name__ == "__main__":
+    unittest.main()
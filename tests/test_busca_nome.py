@@ -0,0 +1,33 @@
+"""
+Confere a ordem dos resultados da busca de pacientes por nome.
+"""
+import unittest
+
+from app import app
+from consultas import CANDIDATOS_BUSCA_NOME
+from model import Paciente, Usuario, unidade_de_trabalho
+
+
+class BuscaPorNomeTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Mais nomes longos que o limite de candidatos, cadastrados antes do nome mais curto
+        with unidade_de_trabalho() as session:
+            for i in range(CANDIDATOS_BUSCA_NOME + 100):
+                session.add(Paciente(cpf=f"BUSCA{i}", endereco="Rua A", usuario=Usuario(
+                    nome=f"Zuleica Albuquerque Vasconcelos {i}", email=f"zuleica{i}@busca.com"
+                )))
+            session.add(Paciente(cpf="BUSCA-CURTO", endereco="Rua A",
+                                 usuario=Usuario(nome="Zuleica", email="zuleica@busca.com")))
+
+    def test_nome_mais_curto_vem_primeiro(self):
+        resposta = app.test_client().get("/pacientes/buscar?nome=zule")
+        self.assertEqual(resposta.status_code, 200)
+        nomes = [paciente["nome"] for paciente in resposta.get_json()]
+        self.assertEqual(nomes[0], "Zuleica")
+        self.assertEqual(nomes[1:], sorted(nomes[1:], key=len))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,255 @@
+"""
+Testes dos caches em memória e compartilhado e das versões que invalidam as agendas guardadas.
+"""
+from datetime import date
+import unittest
+from unittest import mock
+
+import app as modulo_app
+import cache
+from app import app
+from cache import CacheLRU, CacheRedis, chave_agenda, invalidar_agenda_dia, invalidar_agendas_medico, versoes_agenda
+
+# Uma segunda-feira
+DIA = date(2030, 1, 7)
+
+
+class ClienteFalso:
+    """Cliente com os métodos get, set e delete do redis-py, guardando os valores em um dicionário"""
+
+    def __init__(self):
+        self.valores = {}
+        self.agora = 0
+
+    def get(self, chave):
+        valor, expira_em = self.valores.get(chave, (None, None))
+        if expira_em is not None and expira_em <= self.agora:
+            del self.valores[chave]
+            return None
+        return valor
+
+    def set(self, chave, valor, ex=None):
+        self.valores[chave] = (valor.encode() if isinstance(valor, str) else valor,
+                               self.agora + ex if ex else None)
+
+    def delete(self, chave):
+        self.valores.pop(chave, None)
+
+
+class ClienteIndisponivel:
+    """Cliente cujo servidor não responde, como em um timeout do Redis"""
+
+    def _falhar(self, *args, **kwargs):
+        raise TimeoutError("Timeout reading from socket")
+
+    get = set = delete = _falhar
+
+
+class CacheLRUTest(unittest.TestCase):
+
+    def test_guarda_e_obtem(self):
+        lru = CacheLRU(2)
+        lru.guardar("a", 1)
+        self.assertEqual(lru.obter("a"), 1)
+        self.assertIsNone(lru.obter("b"))
+
+    def test_descarta_a_chave_usada_ha_mais_tempo(self):
+        lru = CacheLRU(2)
+        lru.guardar("a", 1)
+        lru.guardar("b", 2)
+        lru.obter("a")
+        lru.guardar("c", 3)
+        self.assertIsNone(lru.obter("b"))
+        self.assertEqual(lru.obter("a"), 1)
+        self.assertEqual(len(lru), 2)
+
+    def test_expira_apos_o_ttl(self):
+        lru = CacheLRU(2)
+        with mock.patch("cache.time.monotonic", return_value=100):
+            lru.guardar("a", 1, ttl=10)
+        with mock.patch("cache.time.monotonic", return_value=109):
+            self.assertEqual(lru.obter("a"), 1)
+        with mock.patch("cache.time.monotonic", return_value=110):
+            self.assertIsNone(lru.obter("a"))
+
+    def test_invalidar(self):
+        lru = CacheLRU(2)
+        lru.guardar("a", 1)
+        lru.invalidar("a")
+        self.assertIsNone(lru.obter("a"))
+
+
+class CacheRedisTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cliente = ClienteFalso()
+        self.cache = CacheRedis(self.cliente)
+
+    def test_guarda_com_prefixo_e_obtem_texto(self):
+        self.cache.guardar("a", "valor")
+        self.assertIn("medmeet:a", self.cliente.valores)
+        self.assertEqual(self.cache.obter("a"), "valor")
+        self.assertIsNone(self.cache.obter("b"))
+
+    def test_expira_apos_o_ttl(self):
+        self.cache.guardar("a", "valor", ttl=10)
+        self.cliente.agora = 9
+        self.assertEqual(self.cache.obter("a"), "valor")
+        self.cliente.agora = 10
+        self.assertIsNone(self.cache.obter("a"))
+
+    def test_invalidar(self):
+        self.cache.guardar("a", "valor")
+        self.cache.invalidar("a")
+        self.assertIsNone(self.cache.obter("a"))
+
+
+class VersoesAgendaTest(unittest.TestCase):
+    """Confere que uma alteração nunca deixa voltar a ser lida uma agenda guardada antes dela"""
+
+    def setUp(self):
+        self.versoes = CacheLRU(2)
+        self.agendas = CacheLRU(2)
+        patches = [mock.patch.object(cache, "versoes", self.versoes), mock.patch.object(cache, "agendas", self.agendas)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_alteracao_do_dia_troca_a_chave(self):
+        chave = chave_agenda(1, DIA)
+        self.assertEqual(chave_agenda(1, DIA), chave)
+        invalidar_agenda_dia(1, DIA)
+        self.assertNotEqual(chave_agenda(1, DIA), chave)
+
+    def test_alteracao_dos_horarios_troca_a_chave(self):
+        chave = chave_agenda(1, DIA)
+        invalidar_agendas_medico(1)
+        self.assertNotEqual(chave_agenda(1, DIA), chave)
+
+    def test_versao_descartada_nao_volta_a_agenda_anterior(self):
+        # Agenda guardada antes do agendamento, que troca a versão do dia
+        chave_anterior = chave_agenda(1, DIA)
+        invalidar_agenda_dia(1, DIA)
+        chave_atual = chave_agenda(1, DIA)
+
+        # Versões de outros médicos descartam as do médico 1 do cache de versões, que tem duas posições
+        versoes_agenda(2, DIA)
+        versoes_agenda(3, DIA)
+        self.assertIsNone(self.versoes.obter(f"agenda:versao:1:{DIA.isoformat()}"))
+
+        chave = chave_agenda(1, DIA)
+        self.assertNotEqual(chave, chave_anterior)
+        self.assertNotEqual(chave, chave_atual)
+
+    def test_uso_das_agendas_nao_descarta_as_versoes(self):
+        chave = chave_agenda(1, DIA)
+        for medico_id in range(2, 10):
+            self.agendas.guardar(f"agenda:{medico_id}", "[]")
+        self.assertEqual(chave_agenda(1, DIA), chave)
+
+
+class AgendaEmCacheTest(unittest.TestCase):
+    """Percorre as rotas com o cache compartilhado, usando o cliente falso no lugar do servidor"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cliente = app.test_client()
+        cls.medico_id = cls.cliente.post('/medicos', data={
+            "nome": "Médico Cache", "email": "medico@cache.com", "especialidade": "Clínica", "crm": "CACHE1",
+            "duracao_consulta": 30
+        }).get_json()["id"]
+        cls.paciente_id = cls.cliente.post('/pacientes', data={
+            "nome": "Paciente Cache", "email": "paciente@cache.com", "cpf": "CACHE1", "endereco": "Rua A"
+        }).get_json()["id"]
+        cls.cliente.post('/medicos/horarios', data={"medico_id": cls.medico_id, "dia_semana": "Segunda-feira"})
+
+    def setUp(self):
+        self.redis = ClienteFalso()
+        agendas = CacheRedis(self.redis)
+        patches = [
+            mock.patch.object(cache, "agendas", agendas),
+            mock.patch.object(modulo_app, "agendas", agendas),
+            mock.patch.object(cache, "versoes", CacheRedis(self.redis))
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _agenda(self, data, etag=None):
+        cabecalhos = {"If-None-Match": etag} if etag else {}
+        return self.cliente.get(f"/medicos/agenda?medico_id={self.medico_id}&data={data.isoformat()}",
+                                headers=cabecalhos)
+
+    def test_etag_igual_responde_304(self):
+        resposta = self._agenda(DIA)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue([chave for chave in self.redis.valores if chave.startswith("medmeet:agenda:")])
+
+        repetida = self._agenda(DIA, resposta.headers["ETag"])
+        self.assertEqual(repetida.status_code, 304)
+        self.assertEqual(repetida.get_data(), b"")
+
+    def test_agendamento_invalida_a_agenda_do_dia(self):
+        data = date(2030, 1, 14)
+        anterior = self._agenda(data)
+        self.assertFalse([horario for horario in anterior.get_json() if horario["ocupado"]])
+
+        agendamento = self.cliente.post('/agendamentos', data={"paciente_id": self.paciente_id,
+                                                               "medico_id": self.medico_id,
+                                                               "data": data.isoformat(), "horario": "08:00"})
+        self.assertEqual(agendamento.status_code, 200)
+
+        atual = self._agenda(data, anterior.headers["ETag"])
+        self.assertEqual(atual.status_code, 200)
+        self.assertEqual([horario["inicio"] for horario in atual.get_json() if horario["ocupado"]], ["08:00"])
+
+    def test_novo_horario_invalida_as_agendas_do_medico(self):
+        # Uma terça-feira, sem horário de atendimento até o cadastro abaixo
+        data = date(2030, 1, 8)
+        anterior = self._agenda(data)
+        self.assertEqual(anterior.get_json(), [])
+
+        horario = self.cliente.post('/medicos/horarios', data={"medico_id": self.medico_id,
+                                                                "dia_semana": "Terça-feira"})
+        self.assertEqual(horario.status_code, 200)
+
+        atual = self._agenda(data, anterior.headers["ETag"])
+        self.assertEqual(atual.status_code, 200)
+        self.assertTrue(atual.get_json())
+
+
+class CacheIndisponivelTest(unittest.TestCase):
+    """Uma falha do cache depois da confirmação não transforma em erro uma operação já gravada"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cliente = app.test_client()
+        cls.medico_id = cls.cliente.post('/medicos', data={
+            "nome": "Médico Sem Cache", "email": "medico@semcache.com", "especialidade": "Clínica",
+            "crm": "CACHE2", "duracao_consulta": 30
+        }).get_json()["id"]
+        cls.paciente_id = cls.cliente.post('/pacientes', data={
+            "nome": "Paciente Sem Cache", "email": "paciente@semcache.com", "cpf": "CACHE2", "endereco": "Rua A"
+        }).get_json()["id"]
+
+    def setUp(self):
+        patch = mock.patch.object(cache, "versoes", CacheRedis(ClienteIndisponivel()))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_agendamento_confirmado_responde_200(self):
+        dados = {"paciente_id": self.paciente_id, "medico_id": self.medico_id, "data": "2030-01-07",
+                 "horario": "10:00"}
+        with self.assertLogs("app", "ERROR"):
+            self.assertEqual(self.cliente.post('/agendamentos', data=dados).status_code, 200)
+        self.assertEqual(self.cliente.post('/agendamentos', data=dados).status_code, 409)
+
+    def test_horario_cadastrado_responde_200(self):
+        with self.assertLogs("app", "ERROR"):
+            resposta = self.cliente.post('/medicos/horarios', data={"medico_id": self.medico_id,
+                                                                     "dia_semana": "Quarta-feira"})
+        self.assertEqual(resposta.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
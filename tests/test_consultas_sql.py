@@ -0,0 +1,101 @@
+"""
+Confere a quantidade de comandos SQL das leituras que retornam médicos, pacientes e agendamentos com os usuários.
+
+As rotas devem carregar os usuários na mesma consulta, sem uma consulta por linha, qualquer que seja a quantidade
+de linhas.
+"""
+import unittest
+
+from sqlalchemy import event
+
+import metricas
+from app import app
+from model import engine
+
+QUANTIDADE = 20
+
+
+class ConsultasPorRequisicaoTest(unittest.TestCase):
+    """Conta os comandos SQL executados por requisição com um listener before_cursor_execute"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cliente = app.test_client()
+        cls.medicos, cls.pacientes = [], []
+        for i in range(1, QUANTIDADE + 1):
+            medico = cls.cliente.post('/medicos', data={"nome": f"Médico SQL {i}", "email": f"medico{i}@sql.com",
+                                                        "especialidade": "Clínica", "crm": f"SQL{i}",
+                                                        "duracao_consulta": 30}).get_json()
+            paciente = cls.cliente.post('/pacientes', data={"nome": f"Paciente SQL {i}", "email": f"paciente{i}@sql.com",
+                                                            "cpf": f"SQL{i}", "endereco": "Rua A"}).get_json()
+            cls.medicos.append(medico["id"])
+            cls.pacientes.append(paciente["id"])
+            cls.cliente.post('/agendamentos', data={"paciente_id": paciente["id"], "medico_id": medico["id"],
+                                                    "data": "2030-01-07", "horario": "08:00"})
+
+    def setUp(self):
+        self.comandos = []
+        event.listen(engine, "before_cursor_execute", self._registrar)
+
+    def tearDown(self):
+        event.remove(engine, "before_cursor_execute", self._registrar)
+
+    def _registrar(self, conexao, cursor, comando, parametros, contexto, executemany):
+        self.comandos.append(comando)
+
+    def _requisitar(self, metodo, caminho, **argumentos):
+        # Retorna os comandos executados pela requisição, que deve ter sido atendida com sucesso
+        self.comandos.clear()
+        resposta = self.cliente.open(caminho, method=metodo, **argumentos)
+        self.assertEqual(resposta.status_code, 200, resposta.get_data(as_text=True))
+        return list(self.comandos)
+
+    def test_listagem_de_medicos(self):
+        comandos = self._requisitar("GET", f"/medicos?limit={QUANTIDADE}")
+        self.assertEqual(len(comandos), 1, comandos)
+
+    def test_listagem_de_pacientes(self):
+        comandos = self._requisitar("GET", f"/pacientes?limit={QUANTIDADE}")
+        self.assertEqual(len(comandos), 1, comandos)
+
+    def test_busca_de_pacientes_por_nome(self):
+        # A primeira busca verifica uma única vez se o índice de texto existe
+        self._requisitar("GET", "/pacientes/buscar?nome=Paciente SQL")
+        comandos = self._requisitar("GET", "/pacientes/buscar?nome=Paciente SQL")
+        self.assertEqual(len(comandos), 1, comandos)
+
+    def test_detalhes_do_agendamento(self):
+        agendamentos = self.cliente.get(f"/medicos/{self.medicos[0]}/agendamentos").get_json()["agendamentos"]
+        comandos = self._requisitar("POST", "/agendamentos/ver", json={"agendamento_id": agendamentos[0]["id"]})
+        self.assertEqual(len(comandos), 1, comandos)
+
+    def test_historico_de_agendamentos_do_medico(self):
+        comandos = self._requisitar("GET", f"/medicos/{self.medicos[0]}/agendamentos")
+        self.assertEqual(len(comandos), 1, comandos)
+
+    def test_exportacao_mede_os_comandos_do_streaming(self):
+        # O corpo é gerado depois do after_request; a medição é registrada quando a resposta é fechada
+        rota = metricas.metricas_rota("GET", "/agendamentos/exportar")
+        requisicoes, comandos_medidos = rota.consultas.contagem, rota.consultas.soma
+
+        resposta = self.cliente.get("/agendamentos/exportar")
+        self.assertTrue(resposta.get_data())
+        self.assertEqual(rota.consultas.contagem, requisicoes)
+        resposta.close()
+
+        self.assertEqual(rota.consultas.contagem, requisicoes + 1)
+        self.assertEqual(rota.consultas.soma - comandos_medidos, 1)
+
+    def test_agendamento_nao_carrega_usuarios(self):
+        # O cadastro só verifica a existência do paciente e do médico, sem ler os usuários
+        comandos = self._requisitar("POST", "/agendamentos", data={"paciente_id": self.pacientes[0], "medico_id": self.medicos[1],
+                                                                   "data": "2030-01-08", "horario": "09:00"})
+        self.assertFalse([comando for comando in comandos if "JOIN usuario" in comando], comandos)
+
+    def test_cadastro_de_horario_nao_carrega_usuarios(self):
+        comandos = self._requisitar("POST", "/medicos/horarios", data={"medico_id": self.medicos[2], "dia_semana": "Segunda-feira"})
+        self.assertFalse([comando for comando in comandos if "JOIN usuario" in comando], comandos)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Confere que as consultas de agendamentos por dia e por período usam os índices criados pelas migrações.
+
+O banco SQLite é criado sem os índices secundários, como um banco antigo, e recebe os índices pelas migrações.
+O benchmarks/bench_indices.py repete a verificação com um volume grande de agendamentos e mede os tempos.
+"""
+from datetime import date
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import func, select, text
+
+from consultas import filtro_dia, filtro_periodo
+from model import Agendamento, Base, criar_engine
+from model.migracoes import aplicar_migracoes
+
+DIA = date(2030, 1, 7)
+
+# Consultas conferidas, com o índice que cada uma deve usar
+CONSULTAS = {
+    "agenda do médico no dia": (
+        select(Agendamento.id).where(Agendamento.medico_id == 7, filtro_dia(Agendamento.inicio, DIA)),
+        "ix_agendamento_medico_inicio"
+    ),
+    "agendas dos médicos no período": (
+        select(Agendamento.id).where(Agendamento.medico_id.in_([7, 8]),
+                                     filtro_periodo(Agendamento.inicio, DIA, date(2030, 1, 13))),
+        "ix_agendamento_medico_inicio"
+    ),
+    "agendamentos do dia": (
+        select(func.count()).select_from(Agendamento).where(filtro_dia(Agendamento.inicio, DIA)),
+        "ix_agendamento_inicio"
+    ),
+    "agendamentos do período": (
+        select(Agendamento.id).where(filtro_periodo(Agendamento.inicio, DIA, date(2030, 1, 13))),
+        "ix_agendamento_inicio"
+    ),
+}
+
+
+class IndicesConsultasTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.diretorio = tempfile.TemporaryDirectory()
+        cls.engine = criar_engine(f"sqlite:///{os.path.join(cls.diretorio.name, 'indices.sqlite3')}")
+
+        # Cria as tabelas sem os índices secundários e aplica as migrações, que devem criá-los
+        Base.metadata.create_all(cls.engine)
+        with cls.engine.begin() as conexao:
+            for tabela in Base.metadata.sorted_tables:
+                for indice in tabela.indexes:
+                    indice.drop(conexao, checkfirst=True)
+        aplicar_migracoes(cls.engine)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+        cls.diretorio.cleanup()
+
+    def _plano(self, consulta):
+        sql = str(consulta.compile(self.engine, compile_kwargs={"literal_binds": True}))
+        with self.engine.connect() as conexao:
+            return [linha[-1] for linha in conexao.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+    def test_consultas_usam_os_indices(self):
+        for nome, (consulta, indice) in CONSULTAS.items():
+            with self.subTest(nome):
+                plano = self._plano(consulta)
+                self.assertTrue([passo for passo in plano if indice in passo], plano)
+                self.assertFalse([passo for passo in plano if passo.startswith("SCAN agendamento")], plano)
+
+
+if __name__ == "__main__":
+    unittest.main()